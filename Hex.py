@@ -23,6 +23,19 @@ It will record all moves and the end state of the game. Check
 the documentation pdf for more details.
 * "-switch" or "-s" will invert the order of agents playing. Use
 this argument to quickly test your agent as Blue instead of Red.
+* "port=p" hosts the match on TCP port p instead of 1234. Agents
+are told the port through the HEX_PORT environment variable.
+* "-async" runs the match on the asyncio engine. Logs and results are
+the same as with the default engine.
+* "record=file" appends a compact binary record of the match to file.
+See src/Record.py for the format and for tools to read it.
+* "-delta" offers the agents delta mode in the START message. Agents
+that accept it by sending "DELTA" before their first move get CHANGE
+messages with "<turn>:<checksum>" in place of the board; the others
+keep getting the full board. Agents can send "BOARD" on their turn to
+get the full board.
+* "resync=k" sends the full board in every k-th CHANGE message in
+delta mode.
 """
 import shlex
 import subprocess
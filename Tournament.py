@@ -0,0 +1,477 @@
+"""This script runs a tournament of Hex between many agents.
+
+Agents are collected from every directory under agents/ that contains
+a cmd.txt file, as described in the submission guidelines; the name of
+the directory is the name of the agent. Further agents can be added
+with the same "a=name;command" strings that Hex.py accepts.
+
+Every match is played by its own engine process (src/main.py), and
+several matches run at the same time. Each running match gets a port
+from a pool so that concurrent engines do not collide; agents are told
+their port through the HEX_PORT environment variable.
+
+Possible arguments:
+* "agent=name;command" or "a=name;command" adds one agent.
+* "agents_dir=path" collects agents from path instead of agents/.
+* "-noscan" does not collect agents from directories at all.
+* "swiss=r" plays r rounds of a Swiss system instead of a round-robin.
+In a round-robin, every pair of agents plays once with each colour.
+* "rounds=r" repeats the round-robin r times.
+* "workers=w" runs at most w matches at once. Defaults to the number
+of CPUs.
+* "port=p" is the first port of the pool; workers use p to p+w-1.
+* "board_size=n" or "b=n" plays on an nxn board.
+* "timeout=s" kills a match that has not finished after s seconds,
+together with its agents. The engine is sent SIGTERM first so that it
+can save its log. It does not apply to matches hosted with -inprocess
+or -async.
+* "out=file" also writes the standings to a CSV file.
+* "-inprocess" hosts all matches in this process, sharing one port,
+instead of starting an engine process per match. Agents must then send
+the token they are given in the HEX_TOKEN environment variable as their
+first line, so that each connection reaches the right match.
+* "-async" also hosts all matches in this process and port, but plays
+them on one asyncio event loop instead of one thread per match.
+* "-log" or "-l" saves a log of every match, as in Hex.py.
+* "record=file" appends a binary record of every match to file (see
+src/Record.py).
+* "-delta" plays every match in delta mode, as in Hex.py.
+* "-verbose" or "-v" prints every match result as it comes in.
+"""
+import asyncio
+import os
+import shlex
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import combinations
+from queue import Queue
+from random import shuffle
+from sys import argv, platform
+from os.path import realpath, sep, isdir, isfile, join
+
+from Hex import get_main_cmd
+
+# seconds a timed-out engine is given to exit before it is killed
+TERM_GRACE = 2
+
+
+def find_agents(agents_dir):
+    """Returns a list of (name, command) for every subdirectory of
+    agents_dir that holds a cmd.txt file.
+    """
+
+    agents = []
+    if (not isdir(agents_dir)):
+        return agents
+
+    for name in sorted(os.listdir(agents_dir)):
+        cmd_path = join(agents_dir, name, "cmd.txt")
+        if (isfile(cmd_path)):
+            with open(cmd_path) as f:
+                cmd = f.read().strip()
+            if (cmd != ""):
+                agents.append((name, cmd))
+
+    return agents
+
+
+def round_robin(agents, rounds=1):
+    """Returns the matches of a round-robin where every pair plays once
+    with each colour, repeated the given number of times.
+    """
+
+    matches = []
+    for _ in range(rounds):
+        for a, b in combinations(agents, 2):
+            matches.append((a, b))
+            matches.append((b, a))
+    return matches
+
+
+def swiss_pairings(agents, standings, played):
+    """Pairs agents of similar score that have not met yet. Returns a
+    list of (red, blue) matches and the agent that sits out, if any.
+    The agent that has played Red less often gets Red.
+    """
+
+    order = list(agents)
+    shuffle(order)  # random tie-breaks
+    order.sort(key=lambda a: standings[a[0]]['wins'], reverse=True)
+
+    bye = None
+    if (len(order) % 2 == 1):
+        # the lowest-ranked agent without a bye sits out
+        for agent in reversed(order):
+            if (not standings[agent[0]]['bye']):
+                bye = agent
+                break
+        if (bye is None):
+            bye = order[-1]
+        order.remove(bye)
+
+    matches = []
+    while (order):
+        a = order.pop(0)
+        # the best-ranked opponent not met yet, or the next one if all were
+        opponent = next(
+            (b for b in order if frozenset((a[0], b[0])) not in played),
+            order[0]
+        )
+        order.remove(opponent)
+        played.add(frozenset((a[0], opponent[0])))
+
+        if (standings[a[0]]['red'] > standings[opponent[0]]['red']):
+            a, opponent = opponent, a
+        matches.append((a, opponent))
+
+    return matches, bye
+
+
+def play_match(red, blue, ports, options):
+    """Runs one match in its own engine process on a port taken from the
+    pool. Returns a dictionary with the result, or None as the end state
+    if the engine did not report one.
+    """
+
+    port = ports.get()
+    try:
+        cmd = (
+            get_main_cmd() + f" port={port} b={options['board_size']}" +
+            " -k -sb" + (" -l" if options['log'] else "") +
+            (" -delta" if options['delta'] else "")
+        )
+        if (options['record'] is not None):
+            cmd += f" record={options['record']}"
+        agent_args = [f"a={red[0]};{red[1]}", f"a={blue[0]};{blue[1]}"]
+        if (platform != "win32"):
+            cmd = shlex.split(cmd) + agent_args
+        else:
+            cmd += " " + " ".join(f'"{x}"' for x in agent_args)
+
+        # the engine leads its own process group, which its agents join
+        p = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True, start_new_session=(platform != "win32")
+        )
+        try:
+            output = p.communicate(timeout=options['timeout'])[1]
+        except subprocess.TimeoutExpired:
+            stop_match(p)
+            output = ""
+    finally:
+        # only once nothing of the match can still be using it
+        ports.put(port)
+
+    return parse_result(red[0], blue[0], output)
+
+
+def stop_match(p):
+    """Stops a timed-out engine process and the agents it started. The
+    whole process group is sent SIGTERM, so that the engine can save its
+    log, and SIGKILL after TERM_GRACE seconds. Returns once the engine
+    has exited.
+    """
+
+    if (platform == "win32"):
+        # /T also ends the agents started by the engine
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(p.pid)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        p.communicate()
+        return
+
+    try:
+        os.killpg(p.pid, signal.SIGTERM)
+        p.communicate(timeout=TERM_GRACE)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        pass
+
+    # agents that ignored SIGTERM are still in the group
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    p.communicate()
+
+
+def play_match_inprocess(red, blue, listener, options):
+    """Runs one match as a Game in this process, connecting its agents
+    through the shared listener.
+    """
+
+    from Game import Game
+
+    g = Game(
+        board_size=options['board_size'],
+        player1={"name": red[0], "run string": red[1]},
+        player2={"name": blue[0], "run string": blue[1]},
+        log=options['log'],
+        kill_bots=True,
+        silent_bots=True,
+        listener=listener,
+        print_summary=False,
+        record=options['record'],
+        delta=options['delta']
+    )
+    return parse_result(red[0], blue[0], g.run() or "")
+
+
+async def play_matches_async(matches, options, report):
+    """Plays all given matches as AsyncGames on the running event loop,
+    at most options['workers'] at a time, and reports each result as
+    soon as its match ends.
+    """
+
+    from AsyncGame import AsyncGame
+    from AsyncProtocol import AsyncListener
+    from Protocol import Protocol
+
+    listener = AsyncListener(
+        port=options['port'], tokens=True,
+        limit=Protocol.message_limit(options['board_size'])
+    )
+    await listener.start()
+    slots = asyncio.Semaphore(options['workers'])
+
+    async def play(red, blue):
+        async with slots:
+            g = AsyncGame(
+                board_size=options['board_size'],
+                player1={"name": red[0], "run string": red[1]},
+                player2={"name": blue[0], "run string": blue[1]},
+                log=options['log'],
+                kill_bots=True,
+                silent_bots=True,
+                listener=listener,
+                print_summary=False,
+                record=options['record'],
+                delta=options['delta']
+            )
+            return parse_result(red[0], blue[0], await g.run() or "")
+
+    for match in asyncio.as_completed([play(*m) for m in matches]):
+        report(await match)
+
+    await listener.close()
+
+
+def parse_result(red, blue, output):
+    """Reads the short-form results that the engine prints to stderr:
+    the end state, then "won time turns" for Red and Blue.
+    """
+
+    result = {'red': red, 'blue': blue, 'state': None, 'winner': None}
+
+    lines = [line.split() for line in output.strip().split("\n")]
+    try:
+        state = " ".join(lines[-3])
+        red_s, blue_s = lines[-2], lines[-1]
+        result[red] = {'time': int(red_s[1]), 'turns': int(red_s[2])}
+        result[blue] = {'time': int(blue_s[1]), 'turns': int(blue_s[2])}
+        if (red_s[0] == "True"):
+            result['winner'] = red
+        elif (blue_s[0] == "True"):
+            result['winner'] = blue
+        result['state'] = state
+    except (IndexError, ValueError):
+        pass
+
+    return result
+
+
+def record(standings, result):
+    """Adds the result of one match to the standings."""
+
+    red, blue = result['red'], result['blue']
+    standings[red]['red'] += 1
+
+    for name in (red, blue):
+        s = standings[name]
+        s['played'] += 1
+        if (result['state'] is None):
+            s['errors'] += 1
+            continue
+
+        s['time'] += result[name]['time']
+        s['turns'] += result[name]['turns']
+        if (result['winner'] == name):
+            s['wins'] += 1
+        else:
+            s['losses'] += 1
+            if (result['state'] == "Timeout"):
+                s['timeouts'] += 1
+            elif (result['state'] == "Illegal move"):
+                s['illegal'] += 1
+
+
+def run_matches(matches, standings, pool, ports, options):
+    """Plays all given matches concurrently and records their results.
+    ports is either the port pool or a listener shared by all matches.
+    """
+
+    def report(result):
+        record(standings, result)
+        if (options['verbose']):
+            print(
+                f"{result['red']} (R) vs {result['blue']} (B): " +
+                f"{result['state'] or 'No result'}, " +
+                f"winner {result['winner']}"
+            )
+
+    if (options['async']):
+        asyncio.run(play_matches_async(matches, options, report))
+        return
+
+    play = play_match
+    if (options['listener'] is not None):
+        play, ports = play_match_inprocess, options['listener']
+
+    futures = [
+        pool.submit(play, red, blue, ports, options)
+        for red, blue in matches
+    ]
+    for future in as_completed(futures):
+        report(future.result())
+
+
+def print_standings(standings, out=None):
+    """Prints the standings table, best agent first, and optionally
+    writes it to a CSV file.
+    """
+
+    header = [
+        "Agent", "Played", "Wins", "Losses", "Timeouts", "Illegal",
+        "Errors", "Mean move time (s)"
+    ]
+    rows = []
+    for name, s in standings.items():
+        mean = 0 if s['turns'] == 0 else int(s['time'] / s['turns'])
+        rows.append([
+            name, s['played'], s['wins'], s['losses'], s['timeouts'],
+            s['illegal'], s['errors'], int(mean/10**6)/10**3
+        ])
+    rows.sort(key=lambda r: (-r[2], r[7]))
+
+    widths = [
+        max(len(str(row[i])) for row in rows + [header])
+        for i in range(len(header))
+    ]
+    for row in [header] + rows:
+        print("  ".join(
+            str(x).ljust(widths[i]) for i, x in enumerate(row)
+        ))
+
+    if (out is not None):
+        with open(out, "w") as f:
+            for row in [header] + rows:
+                f.write(",".join(str(x) for x in row) + "\n")
+        print(f"Saved standings to {out}")
+
+
+def main():
+    options = {
+        'board_size': 11,
+        'log': ("-l" in argv or "-log" in argv),
+        'verbose': ("-v" in argv or "-verbose" in argv),
+        'timeout': None,
+        'listener': None,
+        'async': ("-async" in argv),
+        'record': None,
+        'delta': ("-delta" in argv)
+    }
+    agents_dir = sep.join(realpath(__file__).split(sep)[:-1]) + \
+        f"{sep}agents"
+    scan = not ("-noscan" in argv)
+    workers = os.cpu_count() or 1
+    base_port = 1234
+    swiss = 0
+    rounds = 1
+    out = None
+    agents = []
+
+    try:
+        for argument in argv[1:]:
+            key, _, value = argument.partition("=")
+            if (key in ("a", "agent")):
+                name, cmd = value.split(";")
+                agents.append((name, cmd))
+            elif (key in ("b", "board_size")):
+                options['board_size'] = int(value)
+            elif (key == "agents_dir"):
+                agents_dir = value
+            elif (key == "workers"):
+                workers = int(value)
+            elif (key == "port"):
+                base_port = int(value)
+            elif (key == "swiss"):
+                swiss = int(value)
+            elif (key == "rounds"):
+                rounds = int(value)
+            elif (key == "timeout"):
+                options['timeout'] = float(value)
+            elif (key == "out"):
+                out = value
+            elif (key == "record"):
+                options['record'] = os.path.abspath(value)
+    except ValueError:
+        print(f"ERROR: Argument '{argument}' is not in valid format. Aborted.")
+        return
+
+    if (scan):
+        agents = find_agents(agents_dir) + agents
+    if (len({name for name, _ in agents}) != len(agents)):
+        print("ERROR: Agent names must be unique. Aborted.")
+        return
+    if (len(agents) < 2):
+        print("ERROR: A tournament needs at least two agents. Aborted.")
+        return
+
+    standings = {
+        name: {
+            'played': 0, 'wins': 0, 'losses': 0, 'timeouts': 0,
+            'illegal': 0, 'errors': 0, 'time': 0, 'turns': 0,
+            'red': 0, 'bye': False
+        }
+        for name, _ in agents
+    }
+
+    # each worker holds one port while its match is running
+    ports = Queue()
+    for port in range(base_port, base_port + workers):
+        ports.put(port)
+
+    options['workers'] = workers
+    options['port'] = base_port
+    if ("-inprocess" in argv or options['async']):
+        # the engine modules import each other by their bare names
+        sys.path.insert(0, sep.join(realpath(__file__).split(sep)[:-1]) +
+                        f"{sep}src")
+    if ("-inprocess" in argv and not options['async']):
+        from Protocol import Listener
+        options['listener'] = Listener(port=base_port, tokens=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if (swiss > 0):
+            played = set()
+            for r in range(swiss):
+                matches, bye = swiss_pairings(agents, standings, played)
+                if (bye is not None):
+                    standings[bye[0]]['bye'] = True
+                    standings[bye[0]]['wins'] += 1
+                print(f"Round {r+1}: {len(matches)} matches")
+                run_matches(matches, standings, pool, ports, options)
+        else:
+            matches = round_robin(agents, rounds)
+            print(f"Round-robin: {len(matches)} matches")
+            run_matches(matches, standings, pool, ports, options)
+
+    if (options['listener'] is not None):
+        options['listener'].close()
+    print_standings(standings, out)
+
+
+if __name__ == "__main__":
+    main()
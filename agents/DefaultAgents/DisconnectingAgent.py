@@ -1,13 +1,18 @@
+import os
 import socket
 from time import sleep
 
 
 def main():
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.connect((HOST, PORT))
+        # a shared engine tells its agents apart by this token
+        token = os.environ.get("HEX_TOKEN")
+        if (token):
+            s.sendall(bytes(token + "\n", "utf-8"))
         sleep(0.5)
 
 
@@ -0,0 +1,340 @@
+from sys import argv
+from time import perf_counter
+
+import numpy as np
+
+from NaiveAgent import NaiveAgent
+
+
+# cell codes of the search board
+EMPTY = 0
+RED = 1
+BLUE = 2
+
+# relative positions of neighbours, as in Tile
+I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
+J_DISPLACEMENTS = [0, 1, 1, 0, -1, -1]
+
+
+def opponent(colour):
+    return RED + BLUE - colour
+
+
+class Node:
+    """A position in the search tree. The statistics of the moves from the
+    position are kept in NumPy arrays indexed by cell, so that picking a
+    move is a single vectorised operation.
+    """
+
+    __slots__ = ("colour", "N", "W", "AN", "AW", "n", "children")
+
+    def __init__(self, colour, cells):
+        self.colour = colour  # colour to move
+        self.N = np.zeros(cells)  # playouts through each move
+        self.W = np.zeros(cells)  # of which won by colour
+        self.AN = np.zeros(cells)  # playouts where colour took the cell later (AMAF)
+        self.AW = np.zeros(cells)  # of which won by colour
+        self.n = 0  # playouts through the position
+        self.children = {}  # cell -> Node, filled in as moves are taken
+
+
+class RolloutSearch:
+    """Monte Carlo tree search with random playouts and RAVE, needing no
+    network.
+
+    A playout fills every empty cell at once, the two colours alternating
+    over a random order of the cells. Hex has no draws and a chain never
+    breaks, so the winner of the full board is the winner of the game and
+    is found with a single search for a red chain. Every cell of the full
+    board then counts as a move of its colour for the all-moves-as-first
+    statistics.
+    """
+
+    # RAVE statistics count as much as real ones after this many playouts
+    RAVE_EQUIVALENCE = 1000
+    EXPLORATION = 0.1
+
+    def __init__(self, board_size, seed=None):
+        n = board_size
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+
+        self.neighbours = []
+        for x in range(n):
+            for y in range(n):
+                self.neighbours.append(tuple(
+                    (x + di) * n + (y + dj)
+                    for di, dj in zip(I_DISPLACEMENTS, J_DISPLACEMENTS)
+                    if 0 <= x + di < n and 0 <= y + dj < n
+                ))
+
+        self.cells = np.zeros(n * n, dtype=np.int8)
+        self.root = Node(RED, n * n)
+
+    def play(self, idx):
+        """Plays the move of the side to move on cell idx, keeping the
+        subtree of the move.
+        """
+
+        colour = self.root.colour
+        self.cells[idx] = colour
+        child = self.root.children.get(idx)
+        self.root = child if child is not None else Node(opponent(colour), len(self.cells))
+
+    def red_wins(self, cells):
+        """Returns whether a red chain joins the top and bottom rows, by an
+        iterative search from the top row.
+        """
+
+        n = self.n
+        goal = n * (n - 1)
+        neighbours = self.neighbours
+
+        visited = bytearray(n * n)
+        stack = [idx for idx in range(n) if cells[idx] == RED]
+        for idx in stack:
+            visited[idx] = 1
+
+        while stack:
+            idx = stack.pop()
+            if idx >= goal:
+                return True
+            for nb in neighbours[idx]:
+                if not visited[nb] and cells[nb] == RED:
+                    visited[nb] = 1
+                    stack.append(nb)
+        return False
+
+    def select(self, node, board):
+        """Returns the empty cell with the highest value at node, or None
+        if the board is full.
+        """
+
+        empty = board == EMPTY
+        if not empty.any():
+            return None
+
+        N, AN = node.N, node.AN
+        q = np.where(N > 0, node.W / np.maximum(N, 1), 0.5)
+        amaf = np.where(AN > 0, node.AW / np.maximum(AN, 1), 0.5)
+        beta = AN / (N + AN + N * AN / self.RAVE_EQUIVALENCE + 1e-9)
+        value = (
+            (1 - beta) * q + beta * amaf +
+            self.EXPLORATION * np.sqrt(np.log(node.n + 1) / (N + 1)) +
+            self.rng.random(len(board)) * 1e-6  # random tie break
+        )
+        value[~empty] = -np.inf
+
+        return int(np.argmax(value))
+
+    def playout(self):
+        """Runs one playout from the root: walks down the tree, adds the
+        first new position, fills the rest of the board at random and
+        updates the statistics on the way.
+
+        Returns:
+            winner: RED or BLUE
+        """
+
+        node = self.root
+        board = self.cells.copy()
+        # depth at which each cell was taken, the tree moves first
+        taken = np.where(board == EMPTY, len(board), -1)
+        path = []
+
+        while True:
+            idx = self.select(node, board)
+            if idx is None:
+                break
+            board[idx] = node.colour
+            taken[idx] = len(path)
+            path.append((node, idx))
+
+            child = node.children.get(idx)
+            if child is None:
+                node.children[idx] = Node(opponent(node.colour), len(board))
+                break
+            node = child
+
+        colour = opponent(path[-1][0].colour) if path else node.colour
+        empty = np.flatnonzero(board == EMPTY)
+        self.rng.shuffle(empty)
+        board[empty[0::2]] = colour
+        board[empty[1::2]] = opponent(colour)
+        taken[empty] = len(path)
+
+        winner = RED if self.red_wins(board.tolist()) else BLUE
+
+        for depth, (node, idx) in enumerate(path):
+            won = (winner == node.colour)
+            node.n += 1
+            node.N[idx] += 1
+            node.W[idx] += won
+            amaf = (board == node.colour) & (taken >= depth)
+            node.AN[amaf] += 1
+            if won:
+                node.AW[amaf] += 1
+
+        return winner
+
+    def search(self, deadline=None, playouts=None):
+        """Runs playouts from the root until the deadline (in perf_counter()
+        seconds) passes or the number of playouts is reached.
+
+        Returns:
+            count: the number of playouts run
+        """
+
+        count = 0
+        while ((playouts is None or count < playouts) and
+                (deadline is None or perf_counter() < deadline)):
+            self.playout()
+            count += 1
+        return count
+
+    def best_move(self):
+        """Returns the most played move from the root, and the rate at
+        which the side to move won through it.
+        """
+
+        N = np.where(self.cells == EMPTY, self.root.N, -1)
+        idx = int(np.argmax(N))
+        return idx, self.root.W[idx] / max(self.root.N[idx], 1)
+
+
+class MCTSAgent(NaiveAgent):
+    """This class describes a Hex agent searching with RolloutSearch. It
+    keeps its search tree between turns, and swaps if the opening move
+    leaves Blue less than an even chance.
+
+    Arguments, all optional: playouts=k searches for k playouts per move
+    instead of on the clock; seed=s seeds the playouts; time=t sets the
+    total thinking time in seconds.
+    """
+
+    # the engine's time limit per player (Game.MAXIMUM_TIME), in seconds
+    MAXIMUM_TIME = 300
+    RESERVE = 0.1  # part of the time never planned for
+    EXPECTED_FILL = 0.6  # part of the board filled by the end of a game
+    MIN_MOVES_LEFT = 10
+
+    def __init__(self, playouts=None, seed=None, total_time=MAXIMUM_TIME):
+        super().__init__()
+
+        self._playouts = playouts
+        self._seed = seed
+        self._total_time = total_time
+
+    def _connect(self):
+        """Connects to the socket, reading from it line by line."""
+
+        super()._connect()
+        self._f = self._s.makefile("r", encoding="utf-8")
+
+        return 2
+
+    def _read_message(self):
+        """Returns the next message from the engine split into its fields.
+        Messages are read line by line, so ones that arrive together are
+        handled one at a time.
+        """
+
+        return self._f.readline().strip().split(";")
+
+    def _wait_start(self):
+        """Initialises itself when receiving the start message, then
+        answers if it is Red or waits if it is Blue.
+        """
+
+        data = self._read_message()
+        if (data[0] == "START"):
+            self._board_size = int(data[1])
+            self._colour = data[2]
+            self._search = RolloutSearch(self._board_size, self._seed)
+            self._moves = 0
+            self._time_used = 0
+            self._turn_start = perf_counter()
+
+            if (self._colour == "R"):
+                return 3
+            else:
+                return 4
+
+        else:
+            print("ERROR: No START message received.")
+            return 0
+
+    def _move_time(self):
+        """Returns the time to search for this move: an even share of the
+        time left over the moves expected to be left.
+        """
+
+        empty = np.count_nonzero(self._search.cells == EMPTY)
+        moves_left = max(empty * self.EXPECTED_FILL / 2, self.MIN_MOVES_LEFT)
+        time_left = self._total_time * (1 - self.RESERVE) - self._time_used
+
+        return max(time_left, 0) / moves_left
+
+    def _make_move(self):
+        """Sends the most played move after searching, or swaps as Blue on
+        the second turn if the best answer to the opening wins less than
+        half of its playouts.
+        """
+
+        search = self._search
+        if (self._playouts is not None):
+            search.search(playouts=self._playouts)
+        else:
+            search.search(deadline=self._turn_start + self._move_time())
+
+        idx, win_rate = search.best_move()
+        if (self._moves == 1 and win_rate < 0.5):
+            msg = "SWAP\n"
+        else:
+            msg = f"{idx // self._board_size},{idx % self._board_size}\n"
+
+        self._s.sendall(bytes(msg, "utf-8"))
+        self._time_used += perf_counter() - self._turn_start
+
+        return 4
+
+    def _wait_message(self):
+        """Waits for a new change message. Both players' moves are played
+        on the search board when the engine reports them.
+        """
+
+        data = self._read_message()
+        received = perf_counter()
+        if (data[0] == "END" or data[-1] == "END" or data[0] == ""):
+            return 5
+        else:
+
+            self._moves += 1
+            if (data[1] == "SWAP"):
+                # the stones stay, only the players change colour
+                self._colour = self.opp_colour()
+            else:
+                x, y = data[1].split(",")
+                self._search.play(int(x) * self._board_size + int(y))
+
+            if (data[-1] == self._colour):
+                self._turn_start = received
+                return 3
+
+        return 4
+
+    def _close(self):
+        """Closes the socket."""
+
+        self._f.close()
+        return super()._close()
+
+
+if (__name__ == "__main__"):
+    options = dict(arg.split("=", 1) for arg in argv[1:] if "=" in arg)
+    agent = MCTSAgent(
+        playouts=int(options["playouts"]) if "playouts" in options else None,
+        seed=int(options["seed"]) if "seed" in options else None,
+        total_time=float(options.get("time", MCTSAgent.MAXIMUM_TIME))
+    )
+    agent.run()
@@ -5,7 +5,8 @@ import java.io.*;
 
 class NaiveAgent{
     public static String HOST = "127.0.0.1";
-    public static int PORT = 1234;
+    public static int PORT = System.getenv("HEX_PORT") != null ?
+        Integer.parseInt(System.getenv("HEX_PORT")) : 1234;
 
     private Socket s;
     private PrintWriter out;
@@ -19,6 +20,12 @@ class NaiveAgent{
         s = new Socket(HOST, PORT);
         out = new PrintWriter(s.getOutputStream(), true);
         in = new BufferedReader(new InputStreamReader(s.getInputStream()));
+
+        // a shared engine tells its agents apart by this token
+        String token = System.getenv("HEX_TOKEN");
+        if (token != null && !token.isEmpty()){
+            sendMessage(token + "\n");
+        }
     }
 
     private String getMessage() throws IOException{
@@ -1,3 +1,4 @@
+import os
 import socket
 from random import choice
 from time import sleep
@@ -6,10 +7,14 @@ from time import sleep
 class NaiveAgent():
     """This class describes the default Hex agent. It will randomly send a
     valid move at each turn, and it will choose to swap with a 50% chance.
+
+    It accepts delta mode when the engine offers it: it then keeps the
+    board checksum itself from the moves in CHANGE messages, and asks for
+    the board with BOARD on its next turn if the checksum disagrees.
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     def run(self):
         """A finite-state machine that cycles through waiting for input
@@ -21,13 +26,21 @@ class NaiveAgent():
         self._colour = ""
         self._turn_count = 1
         self._choices = []
+        self._buffer = b""  # received data not yet read as a message
+        self._delta = False  # whether delta mode was accepted
+        self._checksum = 0  # see Board.checksum() in the engine
+        self._moves = 0  # moves announced so far, swaps included
+        self._stale = False  # whether the board must be asked for
         
+        # looked up on the instance's class, so subclasses can replace
+        # single states
+        agent = type(self)
         states = {
-            1: NaiveAgent._connect,
-            2: NaiveAgent._wait_start,
-            3: NaiveAgent._make_move,
-            4: NaiveAgent._wait_message,
-            5: NaiveAgent._close
+            1: agent._connect,
+            2: agent._wait_start,
+            3: agent._make_move,
+            4: agent._wait_message,
+            5: agent._close
         }
 
         res = states[1](self)
@@ -42,6 +55,11 @@ class NaiveAgent():
         self._s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._s.connect((NaiveAgent.HOST, NaiveAgent.PORT))
 
+        # a shared engine tells its agents apart by this token
+        token = os.environ.get("HEX_TOKEN")
+        if (token):
+            self._s.sendall(bytes(token + "\n", "utf-8"))
+
         return 2
 
     def _wait_start(self):
@@ -49,7 +67,7 @@ class NaiveAgent():
         answers if it is Red or waits if it is Blue.
         """
         
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._read_message().split(";")
         if (data[0] == "START"):
             self._board_size = int(data[1])
             for i in range(self._board_size):
@@ -57,6 +75,11 @@ class NaiveAgent():
                     self._choices.append((i, j))
             self._colour = data[2]
 
+            if (data[-1] == "DELTA"):
+                # accepted before the first move, as the engine expects
+                self._delta = True
+                self._s.sendall(b"DELTA\n")
+
             if (self._colour == "R"):
                 return 3
             else:
@@ -71,6 +94,9 @@ class NaiveAgent():
         a coinflip.
         """
         
+        if (self._stale):
+            self._resync()
+
         if (self._turn_count == 2 and choice([0, 1]) == 1):
             msg = "SWAP\n"
         else:
@@ -86,22 +112,89 @@ class NaiveAgent():
 
         self._turn_count += 1
 
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._read_message().split(";")
         if (data[0] == "END" or data[-1] == "END"):
             return 5
         else:
+            self._moves += 1
 
             if (data[1] == "SWAP"):
                 self._colour = self.opp_colour()
             else:
                 x, y = data[1].split(",")
                 self._choices.remove((int(x), int(y)))
+                # the stone has the colour of the side that did not move next
+                c = 2 if data[-1] == "R" else 1
+                self._add_stone(int(x), int(y), c)
+
+            if (self._delta):
+                self._check_board(data[2])
 
             if (data[-1] == self._colour):
                 return 3
 
         return 4
 
+    def _read_message(self):
+        """Returns the next newline-terminated message from the engine,
+        without the newline. Messages can arrive in pieces or several at
+        once, so whatever follows the newline is kept for the next call.
+        Returns an empty string if the connection is closed.
+        """
+
+        while (b"\n" not in self._buffer):
+            data = self._s.recv(1024)
+            if (not data):
+                message, self._buffer = self._buffer, b""
+                return message.decode("utf-8").strip()
+            self._buffer += data
+
+        message, self._buffer = self._buffer.split(b"\n", 1)
+        return message.decode("utf-8").strip()
+
+    def _add_stone(self, x, y, c):
+        """Adds a stone of colour code c (1 Red, 2 Blue) to the checksum."""
+
+        n = self._board_size
+        self._checksum = (self._checksum + (x*n + y + 1) * c) % 2**32
+
+    def _check_board(self, state):
+        """Checks the board field of a CHANGE message in delta mode: either
+        <turn>:<checksum>, compared with the agent's own, or the full board
+        on resync turns, which replaces the agent's copy.
+        """
+
+        if (":" not in state):
+            self._load_board(state)
+            return
+
+        turn, checksum = state.split(":")
+        if (int(turn) != self._moves or int(checksum) != self._checksum):
+            self._stale = True
+
+    def _resync(self):
+        """Asks the engine for the board, which is answered with
+        BOARD;<board>;<turn>:<checksum>, and replaces the agent's copy.
+        """
+
+        self._s.sendall(b"BOARD\n")
+        data = self._read_message().split(";")
+        self._load_board(data[1])
+        self._moves = int(data[2].split(":")[0])
+
+    def _load_board(self, board):
+        """Rebuilds the free tiles and checksum from a board string."""
+
+        self._choices = []
+        self._checksum = 0
+        for x, line in enumerate(board.split(",")):
+            for y, tile in enumerate(line):
+                if (tile == "0"):
+                    self._choices.append((x, y))
+                else:
+                    self._add_stone(x, y, 1 if tile == "R" else 2)
+        self._stale = False
+
     def _close(self):
         """Closes the socket."""
 
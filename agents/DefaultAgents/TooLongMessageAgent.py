@@ -1,18 +1,33 @@
+import os
 import socket
 from time import sleep
 
 
 def main():
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     MAX_SIZE_MESSAGE_B = 1024
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.connect((HOST, PORT))
+        # a shared engine tells its agents apart by this token
+        token = os.environ.get("HEX_TOKEN")
+        if (token):
+            s.sendall(bytes(token + "\n", "utf-8"))
+
+        # the limit grows with the board, so read its size from START
+        start = b""
+        while (b"\n" not in start):
+            data = s.recv(1024)
+            if (not data):
+                return
+            start += data
+        n = int(start.split(b";")[1])
+        limit = max(MAX_SIZE_MESSAGE_B, n*(n+1) + 64)
 
         too_long_message = bytes("".join(
-            ["X" for i in range(MAX_SIZE_MESSAGE_B * 2)]
+            ["X" for i in range(limit * 2)]
         ), "utf-8")
 
         s.sendall(too_long_message)
@@ -0,0 +1,104 @@
+"""Tests for NaiveAgent's message reading and delta mode, talking to it
+through a socket pair instead of an engine.
+
+Run from the repository root with:
+python -m unittest discover -s agents/DefaultAgents
+"""
+import socket
+import unittest
+
+from NaiveAgent import NaiveAgent
+
+
+class TestNaiveAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.engine, s = socket.socketpair()
+        self.engine.settimeout(5)
+        s.settimeout(5)
+        self.agent = NaiveAgent()
+        # the state run() sets up before connecting
+        self.agent._board_size = 0
+        self.agent._board = []
+        self.agent._colour = ""
+        self.agent._turn_count = 1
+        self.agent._choices = []
+        self.agent._buffer = b""
+        self.agent._delta = False
+        self.agent._checksum = 0
+        self.agent._moves = 0
+        self.agent._stale = False
+        self.agent._s = s
+
+    def tearDown(self):
+        self.engine.close()
+        self.agent._s.close()
+
+    def read(self):
+        """Returns what the agent sent, once it has sent a move."""
+
+        data = b""
+        while (not data.endswith(b"\n") or data.endswith(b"BOARD\n")):
+            data += self.engine.recv(1024)
+        return data.decode("utf-8")
+
+    def test_messages_sent_together(self):
+        self.engine.sendall(b"START;3;B\nCHANGE;1,1;000,0R0,000;B\n")
+
+        self.assertEqual(self.agent._wait_start(), 4)
+        self.assertEqual(self.agent._wait_message(), 3)
+        self.assertNotIn((1, 1), self.agent._choices)
+
+    def test_message_sent_in_pieces(self):
+        self.engine.sendall(b"STA")
+        self.engine.sendall(b"RT;3;R\n")
+
+        self.assertEqual(self.agent._wait_start(), 3)
+        self.assertEqual(len(self.agent._choices), 9)
+
+    def test_accepts_delta_and_keeps_the_checksum(self):
+        self.engine.sendall(b"START;3;B;DELTA\nCHANGE;1,1;1:5;B\n")
+
+        self.agent._wait_start()
+        self.assertEqual(self.engine.recv(1024), b"DELTA\n")
+        self.assertEqual(self.agent._wait_message(), 3)
+        self.assertEqual(self.agent._checksum, 5)
+        self.assertFalse(self.agent._stale)
+
+    def test_asks_for_the_board_when_the_checksum_differs(self):
+        self.engine.sendall(b"START;3;B;DELTA\nCHANGE;1,1;1:6;B\n")
+        self.agent._wait_start()
+        self.engine.recv(1024)
+
+        self.assertEqual(self.agent._wait_message(), 3)
+        self.assertTrue(self.agent._stale)
+
+        # the engine's copy has a second stone the agent missed
+        self.engine.sendall(b"BOARD;000,0R0,B00;2:19\n")
+        self.agent._turn_count = 1  # no swap
+        self.agent._make_move()
+
+        request, move = self.read().split("\n")[:2]
+        self.assertEqual(request, "BOARD")
+        self.assertNotIn(move, ("1,1", "2,0"))
+        self.assertEqual(self.agent._checksum, 19)
+        self.assertEqual(self.agent._moves, 2)
+        self.assertEqual(len(self.agent._choices), 7)
+        self.assertFalse(self.agent._stale)
+
+    def test_resync_turn_replaces_the_board(self):
+        self.engine.sendall(
+            b"START;3;B;DELTA\nCHANGE;1,1;1:5;B\n" +
+            b"CHANGE;0,0;B00,0R0,00R;R\n"
+        )
+        self.agent._wait_start()
+        self.agent._wait_message()
+        self.agent._wait_message()
+
+        # the board has a stone at 2,2 that the agent did not know of
+        self.assertEqual(self.agent._checksum, 5 + 1*2 + 9)
+        self.assertEqual(len(self.agent._choices), 6)
+
+
+if (__name__ == "__main__"):
+    unittest.main()
@@ -1,32 +1,62 @@
+from time import perf_counter
+
+STARTED = perf_counter()
+
+import os
 import socket
-from random import choice
-from time import sleep
+import sys
+import threading
 
-from src14.Game import Game
-from src14.Board import Board
+# the src14 modules import each other by their bare names; they are only
+# imported once connected, see _load
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src14")
+sys.path.insert(0, SRC_DIR)
 
 
 class AlphaZeroAgent():
-    """This class describes the default Hex agent. It will randomly send a
-    valid move at each turn, and it will choose to swap with a 50% chance.
+    """This class describes the AlphaZero Hex agent. It plays the moves
+    chosen by MCTS guided by the trained network, and keeps its search tree
+    between turns: after every move, its own or the opponent's, the tree is
+    re-rooted at the new board.
+
+    It connects before importing anything heavy, then loads the network in
+    the background while the engine starts the other agent, so that little
+    of the loading happens on the clock.
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
+
+    # the best network saved by Coach (see args in src14/main.py), and the
+    # folder of NetServer's socket (NetServer.MODEL_FOLDER)
+    MODEL_FOLDER = os.path.join(os.path.dirname(SRC_DIR), "temp")
+    MODEL_FILE = "best.pth.tar"
+
+    # board size the network is loaded for before START gives the real one
+    EXPECTED_BOARD_SIZE = 11
+
+    # searches run on a clock, so numMCTSSims is not needed
+    args = {
+        'mctsBatchSize': 8,
+        'mctsMaxNodes': 200000,
+        'cpuct': 1,
+    }
 
     def run(self):
         """A finite-state machine that cycles through waiting for input
         and sending moves.
         """
-        
+
         self._board_size = 0
         self._board = None
         self._game = None
-        self._curPlayer = 1
+        self._mcts = None
+        self._clock = None
         self._colour = ""
-        self._turn_count = 1
-        self._choices = []
-        
+        self._loader = None
+        self._nnet = None
+        self._nnet_size = 0
+
         states = {
             1: AlphaZeroAgent._connect,
             2: AlphaZeroAgent._wait_start,
@@ -43,70 +73,171 @@ class AlphaZeroAgent():
         """Connects to the socket and jumps to waiting for the start
         message.
         """
-        
+
         self._s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._s.connect((AlphaZeroAgent.HOST, AlphaZeroAgent.PORT))
 
+        # a shared engine tells its agents apart by this token
+        token = os.environ.get("HEX_TOKEN")
+        if (token):
+            self._s.sendall(bytes(token + "\n", "utf-8"))
+        self._f = self._s.makefile("r", encoding="utf-8")
+        self._connected = perf_counter()
+
+        self._loader = threading.Thread(
+            target=self._load, args=(self.EXPECTED_BOARD_SIZE,), daemon=True
+        )
+        self._loader.start()
+
         return 2
 
+    def _load(self, board_size):
+        """Imports the search modules and loads the network for
+        board_size.
+        """
+
+        import MCTS  # noqa: F401, loaded here to be ready at START
+
+        self._nnet = self._load_model(board_size)
+        self._nnet_size = board_size
+
+    def _read_message(self):
+        """Returns the next message from the engine split into its fields.
+        Messages are read line by line, so ones that arrive together are
+        handled one at a time.
+        """
+
+        return self._f.readline().strip().split(";")
+
     def _wait_start(self):
         """Initialises itself when receiving the start message, then
         answers if it is Red or waits if it is Blue.
         """
-        
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+
+        data = self._read_message()
+        received = perf_counter()
         if (data[0] == "START"):
             self._board_size = int(data[1])
-            for i in range(self._board_size):
-                for j in range(self._board_size):
-                    self._choices.append((i, j))
             self._colour = data[2]
-            
-            self._game = Game(self._board_size)
-            self._board = self._game.getInitBoard()
-            self._curPlayer = 1
 
             if (self._colour == "R"):
+                # Red's clock is running from now on
+                self._prepare(received)
                 return 3
             else:
+                # Blue's clock only starts with Red's first move, so
+                # loading goes on until then
                 return 4
 
         else:
             print("ERROR: No START message received.")
             return 0
 
+    def _prepare(self, received):
+        """Waits for the network, loading it again if START gave another
+        board size, then sets up the board, the search and the clock of the
+        turn whose message arrived at received.
+        """
+
+        self._loader.join()
+        if (self._nnet_size != self._board_size):
+            self._nnet = self._load_model(self._board_size)
+
+        from Clock import Clock
+        from Game import Game
+        from MCTS import MCTS
+        self._clock = Clock(self._board_size)
+        self._clock.startTurn(received)
+        self._game = Game(self._board_size)
+        self._board = self._game.getInitBoard()
+        self._mcts = MCTS(self._game, self._nnet, self.args)
+
+        ready = perf_counter()
+        print(
+            f"Cold start: connected after {self._connected - STARTED:.2f}s,",
+            f"ready after {ready - STARTED:.2f}s,",
+            f"{ready - received:.2f}s of it on the clock."
+        )
+
+    def _load_model(self, board_size):
+        """Returns the network for board_size: a client of the NetServer
+        serving the best weights if one is running for this board size,
+        else an inference-only network of its own, with the best saved
+        weights if there are any.
+        """
+
+        from NetServer import SOCKET_FILE, NetClient
+
+        address = os.path.join(self.MODEL_FOLDER, SOCKET_FILE)
+        if os.path.exists(address):
+            try:
+                client = NetClient(address)
+                if client.n == board_size:
+                    return client
+                client.close()
+            except (OSError, EOFError):
+                pass  # not running, e.g. a socket left behind
+
+        from Game import Game
+        from NeuralNet import NeuralNet
+
+        nnet = NeuralNet(Game(board_size), inference=True)
+        try:
+            nnet.load_checkpoint(self.MODEL_FOLDER, self.MODEL_FILE)
+        except Exception:
+            print("WARNING: No saved model found, playing untrained.")
+        return nnet
+
     def _make_move(self):
-        """Makes a random valid move. It will choose to swap with
-        a coinflip.
+        """Sends the move with the most visits after searching from the
+        current board for as long as the clock allows.
         """
-        
-        if (self._turn_count == 2 and choice([0, 1]) == 1):
+
+        probs = self._mcts.getActionProb(
+            self._board, temp=0, deadline=self._clock.deadline()
+        )
+        action = probs.index(max(probs))
+        n = self._board_size
+        if (action == n * n):
             msg = "SWAP\n"
         else:
-            move = choice(self._choices)
-            msg = f"{move[0]},{move[1]}\n"
-        
+            msg = f"{action // n},{action % n}\n"
+
         self._s.sendall(bytes(msg, "utf-8"))
+        self._clock.endTurn()
 
         return 4
 
     def _wait_message(self):
-        """Waits for a new change message when it is not its turn."""
-
-        self._turn_count += 1
+        """Waits for a new change message. Both players' moves are applied
+        to the board and the search tree when the engine reports them.
+        """
 
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
-        if (data[0] == "END" or data[-1] == "END"):
+        data = self._read_message()
+        received = perf_counter()
+        if (data[0] == "END" or data[-1] == "END" or data[0] == ""):
             return 5
         else:
 
+            if (self._mcts is None):
+                self._prepare(received)
+
+            n = self._board_size
             if (data[1] == "SWAP"):
                 self._colour = self.opp_colour()
+                action = n * n
             else:
                 x, y = data[1].split(",")
-                self._choices.remove((int(x), int(y)))
+                action = int(x) * n + int(y)
+
+            self._board, player = self._game.getNextState(
+                self._board, 1, action
+            )
+            self._board = self._game.getCanonicalForm(self._board, player)
+            self._mcts.reroot(self._board)
 
             if (data[-1] == self._colour):
+                self._clock.startTurn(received)
                 return 3
 
         return 4
@@ -114,6 +245,7 @@ class AlphaZeroAgent():
     def _close(self):
         """Closes the socket."""
 
+        self._f.close()
         self._s.close()
         return 0
 
@@ -121,7 +253,7 @@ class AlphaZeroAgent():
         """Returns the char representation of the colour opposite to the
         current one.
         """
-        
+
         if self._colour == "R":
             return "B"
         elif self._colour == "B":
@@ -1,7 +1,16 @@
 import logging
+import math
+import multiprocessing as mp
+import traceback
+from time import perf_counter
 
+import numpy as np
 from tqdm import tqdm
 
+from Game import Game
+from MCTS import MCTS
+from SelfPlay import InferenceServer, RemoteNet, getResult
+
 log = logging.getLogger(__name__)
 
 
@@ -41,6 +50,7 @@ class Arena():
         curPlayer = 1
         board = self.game.getInitBoard()
         it = 0
+        self.gameMoves = 0
         while self.game.getGameEnded(board, curPlayer) == 0:
             it += 1
             if verbose:
@@ -56,6 +66,7 @@ class Arena():
                 log.debug(f'valids = {valids}')
                 assert valids[action] > 0
             board, curPlayer = self.game.getNextState(board, curPlayer, action)
+            self.gameMoves = it
         if verbose:
             assert self.display
             print("Game over: Turn ", str(it), "Result ", str(self.game.getGameEnded(board, 1)))
@@ -97,4 +108,153 @@ class Arena():
             else:
                 draws += 1
 
-        return oneWon, twoWon, draws
\ No newline at end of file
+        return oneWon, twoWon, draws
+
+
+def sprt(wins, losses, p0, p1, alpha=0.05, beta=0.05):
+    """
+    Sequential probability ratio test of H0: the win rate is p0 against
+    H1: the win rate is p1, after wins and losses.
+
+    Returns:
+        1 if H1 is accepted, -1 if H0 is accepted, 0 if more games are needed
+    """
+    llr = wins * math.log(p1 / p0) + losses * math.log((1 - p1) / (1 - p0))
+    if llr >= math.log((1 - beta) / alpha):
+        return 1
+    if llr <= math.log(beta / (1 - alpha)):
+        return -1
+    return 0
+
+
+def arenaWorker(workerId, n, args, tasks, requests1, responses1, requests2, responses2, results):
+    """
+    Main function of an arena worker process. Plays the game of every task,
+    (gameId, first) where first is the network that moves first, with fresh
+    MCTS instances for both players, until it is sent None. Results are
+    sent as SelfPlay.getResult expects.
+    """
+    game = Game(n)
+    nets = (RemoteNet(workerId, requests1, responses1), RemoteNet(workerId, requests2, responses2))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        gameId, first = task
+
+        mcts = [MCTS(game, net, args) for net in nets]
+        players = [lambda x, m=m: np.argmax(m.getActionProb(x, temp=0)) for m in mcts]
+        if first == 2:
+            players.reverse()
+
+        arena = Arena(players[0], players[1], game)
+        start = perf_counter()
+        try:
+            result = arena.playGame()
+        except Exception:
+            results.put((None, traceback.format_exc()))
+            return
+        seconds = perf_counter() - start
+
+        # result of the game for the first network
+        if result not in (1, -1):
+            result = 0
+        elif first == 2:
+            result = -result
+
+        results.put(({'game': gameId, 'first': first, 'result': result, 'moves': arena.gameMoves, 'time': seconds}, None))
+
+
+class ParallelArena():
+    """
+    Pits two networks against each other like Arena, playing the games on
+    numArenaWorkers processes. Each worker plays with its own MCTS instances
+    for both players, and their leaves are evaluated by one InferenceServer
+    per network in this process.
+    """
+
+    def __init__(self, game, nnet1, nnet2, args):
+        self.game = game
+        self.nnet1 = nnet1
+        self.nnet2 = nnet2
+        self.args = args
+
+    def playGames(self, num, threshold=None):
+        """
+        Plays num games, half of them with each network moving first. If a
+        threshold is given, games stop as soon as a sequential probability
+        ratio test settles whether nnet2 wins more or less than threshold of
+        its games (within arenaSPRTDelta, see sprt); self.decision is then
+        the result of the test.
+
+        Returns:
+            oneWon: games won by nnet1
+            twoWon: games won by nnet2
+            draws:  games won by nobody
+            games:  one dict per game played, with the network that moved
+                    first, the result for nnet1, the number of moves and the
+                    time taken in seconds
+        """
+        ctx = mp.get_context("spawn")
+        numWorkers = self.args["numArenaWorkers"]
+
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        requests = [ctx.Queue(), ctx.Queue()]
+        responses = [[ctx.Queue() for _ in range(numWorkers)] for _ in range(2)]
+        servers = [InferenceServer(nnet, requests[i], responses[i], self.args)
+                   for i, nnet in enumerate((self.nnet1, self.nnet2))]
+        for server in servers:
+            server.start()
+
+        # alternate the colour orders so that stopping early stays fair
+        num = int(num / 2) * 2
+        for gameId in range(num):
+            tasks.put((gameId, 1 + gameId % 2))
+
+        workers = [
+            ctx.Process(
+                target=arenaWorker,
+                args=(i, self.game.n, self.args, tasks, requests[0], responses[0][i],
+                      requests[1], responses[1][i], results),
+                daemon=True
+            )
+            for i in range(numWorkers)
+        ]
+        for w in workers:
+            w.start()
+
+        delta = self.args.get("arenaSPRTDelta", 0.1)
+        self.decision = 0  # result of sprt if the games stopped early
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        games = []
+        try:
+            for _ in tqdm(range(num), desc="Arena.playGames"):
+                games.append(getResult(results, workers))
+                if games[-1]['result'] == 1:
+                    oneWon += 1
+                elif games[-1]['result'] == -1:
+                    twoWon += 1
+                else:
+                    draws += 1
+
+                if threshold is not None:
+                    p0 = max(threshold - delta, 0.01)
+                    p1 = min(threshold + delta, 0.99)
+                    self.decision = sprt(twoWon, oneWon, p0, p1)
+                    if self.decision != 0:
+                        log.info(f'Arena stopped early after {len(games)} games.')
+                        break
+        finally:
+            # games still being played are abandoned
+            for w in workers:
+                w.terminate()
+            for w in workers:
+                w.join()
+            for server in servers:
+                server.stop()
+
+        return oneWon, twoWon, draws, games
@@ -1,80 +1,85 @@
+import numpy as np
+
+# the same Zobrist keys as the engine's board
+from Zobrist import zobrist_table
+
+# places in the rows below the n x n cells, read through info(board); the
+# swap flag is in [-1][-1]. One row holds them all for n >= 5, smaller boards
+# get more rows so that no place shares its cell with the swap flag
+HASH = 0  # Zobrist key of the board
+TURNED_HASH = 1  # Zobrist key of the board turned by 180 degrees
+PLACED = 2  # number of stones on the board
+NEXT_PIECE = 3  # value of the next stone placed, 1 or -1
+INFO_SIZE = NEXT_PIECE + 2  # the places above and the swap flag
+
+
+def infoRows(n):
+    # number of rows below the cells of an n x n board
+    return -(-INFO_SIZE // n)
+
+
+def info(board, n):
+    # the rows below the cells as one flat view; boards are always
+    # contiguous arrays, so writing to it writes to the board
+    return board[n:].reshape(-1)
+
+
 class Board():
-    def __init__(self, n):
-        "Set up initial board configuration."
+    def __init__(self, n, pieces=None):
+        "Set up initial board configuration, or wrap the numpy board pieces."
         self.n = n
+        self.zobrist = zobrist_table(n)
         # self.legal_moves = set()
         self.can_swap = True
 
-        # Create the empty board array.
-        self.pieces = [None] * (self.n + 1)
-        for i in range(self.n + 1):
-            self.pieces[i] = [0] * self.n
+        if pieces is None:
+            # Create the empty board array.
+            pieces = np.zeros((self.n + infoRows(self.n), self.n), dtype=np.int64)
+            info(pieces, self.n)[NEXT_PIECE] = 1
+        self.pieces = pieces
+        self.info = info(pieces, self.n)
 
     # add [][] indexer syntax to the Board
     def __getitem__(self, index):
         return self.pieces[index]
 
+    def hash(self):
+        # Zobrist key of the board as stored: stones of value 1 use the red
+        # keys, stones of value -1 the blue keys (see Zobrist.py)
+        return int(self.info[HASH])
+
+    def turnedHash(self):
+        return int(self.info[TURNED_HASH])
+
+    def cellKey(self, idx, piece):
+        return self.zobrist.red[idx] if piece == 1 else self.zobrist.blue[idx]
+
     def getNPlacedC(self, colour):
         swap = self[-1][-1]
-        
+
         if swap: colour *= -1
-        
-        count = 0
-        # Get all empty locations.
-        for y in range(self.n):
-            for x in range(self.n):
-                if self[x][y] == colour:
-                    count += 1
-        return count
-    
+
+        return int(np.count_nonzero(np.asarray(self.pieces[:self.n]) == colour))
+
     def getNPlaced(self):
-        count = 0
-        # Get all empty locations.
-        for y in range(self.n):
-            for x in range(self.n):
-                if self[x][y] != 0:
-                    count += 1
-        return count
-    
+        return int(self.info[PLACED])
+
     def getNextPlayer(self):
-        swap = self[-1][-1]
-        
-        redPieces = self.getNPlacedC(1)
-        bluePieces = self.getNPlacedC(-1)
-        
-        if swap == 0:
-            if redPieces > bluePieces:
-                return -1
-            else:
-                return 1
-        else:
-            if redPieces > bluePieces:
-                return 1
-            else:
-                return -1
+        # red moves first; after a swap the stones are stored negated, so
+        # the value of red's stones changes along with the swap flag
+        return int(self.info[NEXT_PIECE])
 
     def get_legal_moves(self, _):
         """Returns all the legal moves for the given color.
         (1 for white, -1 for black
         """
-        moves = set()  # stores the legal moves.
-
         # Get all empty locations.
-        for y in range(self.n):
-            for x in range(self.n):
-                if self[x][y] == 0:
-                    moves.add((x, y))
-        return list(moves)
+        return [tuple(move) for move in np.argwhere(np.asarray(self.pieces[:self.n]) == 0).tolist()]
 
     def has_legal_moves(self):
         """Returns True if has legal move else False
         """
-        # Get all empty locations.
-        for y in range(self.n):
-            for x in range(self.n):
-                if self[x][y] == 0:
-                    return True
-        return False
+        return self.getNPlaced() < self.n * self.n
 
     def execute_move(self, move, nextPiece):
         """Perform the given move on the board; flips pieces as necessary.
@@ -84,7 +89,32 @@ class Board():
         try:
             assert self[x][y] == 0
         except AssertionError:
-            print(move, color, self.pieces)
+            print(move, nextPiece, self.pieces)
             raise AssertionError
         self[x][y] = nextPiece
         # self.legal_moves.remove(move)
+
+        idx = x * self.n + y
+        self.info[HASH] ^= self.cellKey(idx, nextPiece)
+        self.info[TURNED_HASH] ^= self.cellKey(self.n * self.n - 1 - idx, nextPiece)
+        self.info[PLACED] += 1
+        self.info[NEXT_PIECE] = -nextPiece
+
+    def swap(self):
+        """Applies the swap: the stones are stored negated from now on and
+        the swap flag is set.
+        """
+        key = self.hash() ^ self.zobrist.swap
+        turned = self.turnedHash() ^ self.zobrist.swap
+        last = self.n * self.n - 1
+        for x, y in np.argwhere(self.pieces[:self.n] != 0).tolist():
+            # the stone changes from one colour's key to the other's
+            idx = x * self.n + y
+            key ^= self.zobrist.red[idx] ^ self.zobrist.blue[idx]
+            turned ^= self.zobrist.red[last - idx] ^ self.zobrist.blue[last - idx]
+
+        self.pieces[:self.n] *= -1
+        self[-1][-1] = 1
+        self.info[HASH] = key
+        self.info[TURNED_HASH] = turned
+        self.info[NEXT_PIECE] *= -1
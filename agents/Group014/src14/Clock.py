@@ -0,0 +1,87 @@
+from time import perf_counter
+
+
+class Clock():
+    """
+    Keeps track of an agent's share of the engine clock and decides how long
+    each of its moves may take.
+
+    The engine gives each player MAXIMUM_TIME for the whole match (see
+    src/Game.py). The clock measures the time from being told it is our turn
+    to sending the move, and splits what is left over the moves we still
+    expect to play, estimated from the turn counter. Moves in the middle of
+    the game, where most games are decided, get a larger share than the
+    opening and the endgame.
+    """
+
+    MAXIMUM_TIME = 5 * 60  # seconds per player, as in src/Game.py
+
+    # fraction of the board expected to be filled when a game ends
+    EXPECTED_FILL = 0.6
+    # never plan for fewer moves than this, in case the game goes long
+    MIN_MOVES_LEFT = 10
+    # time kept back for latency and for the moves we did not plan for
+    RESERVE = 0.1
+    # weights of the time per move by game phase
+    OPENING_WEIGHT = 0.5
+    MIDDLE_WEIGHT = 1.5
+    ENDGAME_WEIGHT = 0.75
+    # shortest and longest share of the time left for one move
+    MIN_MOVE_TIME = 0.05
+    MAX_MOVE_SHARE = 0.25
+
+    def __init__(self, boardSize, totalTime=MAXIMUM_TIME):
+        self.boardSize = boardSize
+        self.totalTime = totalTime
+        self.used = 0  # seconds spent on our moves so far
+        self.turns = 0  # moves we have made
+        self.turnStart = None
+
+    def startTurn(self, start=None):
+        """
+        Starts timing our move; call when the engine says it is our turn,
+        or pass the perf_counter() time at which it said so.
+        """
+        self.turnStart = perf_counter() if start is None else start
+
+    def endTurn(self):
+        """
+        Stops timing our move; call when the move has been sent.
+        """
+        self.used += perf_counter() - self.turnStart
+        self.turns += 1
+
+    def remaining(self):
+        return self.totalTime - self.used
+
+    def movesLeft(self):
+        """
+        Returns the number of moves we still expect to make.
+        """
+        expected = int(self.EXPECTED_FILL * self.boardSize ** 2 / 2)
+        return max(expected - self.turns, self.MIN_MOVES_LEFT)
+
+    def phaseWeight(self):
+        expected = self.EXPECTED_FILL * self.boardSize ** 2 / 2
+        progress = self.turns / expected
+        if progress < 0.1:
+            return self.OPENING_WEIGHT
+        elif progress < 0.7:
+            return self.MIDDLE_WEIGHT
+        return self.ENDGAME_WEIGHT
+
+    def moveTime(self):
+        """
+        Returns the number of seconds the current move may take.
+        """
+        left = self.remaining() - self.RESERVE * self.totalTime
+        budget = left / self.movesLeft() * self.phaseWeight()
+        budget = min(budget, self.MAX_MOVE_SHARE * left)
+        return max(budget, self.MIN_MOVE_TIME)
+
+    def deadline(self):
+        """
+        Returns the perf_counter() time by which the current move should be
+        chosen.
+        """
+        return self.turnStart + self.moveTime()
@@ -2,14 +2,15 @@ import logging
 import os
 import sys
 from collections import deque
-from pickle import Pickler, Unpickler
-from random import shuffle
+from pickle import Unpickler
 
 import numpy as np
 from tqdm import tqdm
 
-from Arena import Arena
+from Arena import Arena, ParallelArena
 from MCTS import MCTS
+from ReplayBuffer import ReplayBuffer
+from SelfPlay import SelfPlayPool, playEpisode
 
 log = logging.getLogger(__name__)
 
@@ -26,47 +27,22 @@ class Coach():
         self.pnet = self.nnet.__class__(self.game)  # the competitor network
         self.args = args
         self.mcts = MCTS(self.game, self.nnet, self.args)
-        self.trainExamplesHistory = []  # history of examples from args["numItersForTrainExamplesHistory"] latest iterations
+        # examples from the args["numItersForTrainExamplesHistory"] latest iterations, on disk
+        self.replayBuffer = ReplayBuffer(os.path.join(self.args["checkpoint"], "replay"),
+                                         self.args["numItersForTrainExamplesHistory"])
+        if not self.args["load_model"] and self.replayBuffer.iterations():
+            # a new run starts from no examples, see loadTrainExamples to resume
+            log.warning(f'Removing the training examples of an earlier run from "{self.replayBuffer.folder}"')
+            self.replayBuffer.clear()
         self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
+        self.selfPlayPool = None  # started on the first parallel self-play
 
     def executeEpisode(self):
         """
-        This function executes one episode of self-play, starting with player 1.
-        As the game is played, each turn is added as a training example to
-        trainExamples. The game is played till the game ends. After the game
-        ends, the outcome of the game is used to assign values to each example
-        in trainExamples.
-
-        It uses a temp=1 if episodeStep < tempThreshold, and thereafter
-        uses temp=0.
-
-        Returns:
-            trainExamples: a list of examples of the form (canonicalBoard, currPlayer, pi,v)
-                           pi is the MCTS informed policy vector, v is +1 if
-                           the player eventually won the game, else -1.
+        This function executes one episode of self-play with self.mcts. See
+        SelfPlay.playEpisode.
         """
-        trainExamples = []
-        board = self.game.getInitBoard()
-        self.curPlayer = 1
-        episodeStep = 0
-
-        while True:
-            episodeStep += 1
-            canonicalBoard = self.game.getCanonicalForm(board, self.curPlayer)
-            temp = int(episodeStep < self.args["tempThreshold"])
-
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
-            for b, p in sym:
-                trainExamples.append([b, self.curPlayer, p, None])
-
-            action = np.random.choice(len(pi), p=pi)
-            board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
-
-            r = self.game.getGameEnded(board, self.curPlayer)
-
-            if r != 0:
-                return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
+        return playEpisode(self.game, self.mcts, self.args)
 
     def learn(self):
         """
@@ -84,42 +60,44 @@ class Coach():
             if not self.skipFirstSelfPlay or i > 1:
                 iterationTrainExamples = deque([], maxlen=self.args["maxlenOfQueue"])
 
-                for _ in tqdm(range(self.args["numEps"]), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                if self.args.get("numSelfPlayWorkers", 1) > 1:
+                    if self.selfPlayPool is None:
+                        self.selfPlayPool = SelfPlayPool(self.game, self.nnet, self.args)
+                    episodes = self.selfPlayPool.playEpisodes(self.args["numEps"])
+                    for examples in tqdm(episodes, total=self.args["numEps"], desc="Self Play"):
+                        iterationTrainExamples += examples
+                else:
+                    for _ in tqdm(range(self.args["numEps"]), desc="Self Play"):
+                        self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
+                        iterationTrainExamples += self.executeEpisode()
 
-                # save the iteration examples to the history 
-                self.trainExamplesHistory.append(iterationTrainExamples)
-
-            if len(self.trainExamplesHistory) > self.args["numItersForTrainExamplesHistory"]:
-                log.warning(
-                    f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
-                self.trainExamplesHistory.pop(0)
-            # backup history to a file
-            # NB! the examples were collected using the model from the previous iteration, so (i-1)  
-            self.saveTrainExamples(i - 1)
-
-            # shuffle examples before training
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
+                # save the iteration examples to the history, evicting the oldest
+                self.replayBuffer.add(iterationTrainExamples)
 
             # training new network, keeping a copy of the old one
             self.nnet.save_checkpoint(folder=self.args["checkpoint"], filename='temp.pth.tar')
             self.pnet.load_checkpoint(folder=self.args["checkpoint"], filename='temp.pth.tar')
-            pmcts = MCTS(self.game, self.pnet, self.args)
 
-            self.nnet.train(trainExamples)
-            nmcts = MCTS(self.game, self.nnet, self.args)
+            self.nnet.trainBuffer(self.replayBuffer)
 
             log.info('PITTING AGAINST PREVIOUS VERSION')
-            arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
-                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args["arenaCompare"])
+            decision = 0
+            if self.args.get("numArenaWorkers", 1) > 1:
+                arena = ParallelArena(self.game, self.pnet, self.nnet, self.args)
+                pwins, nwins, draws, games = arena.playGames(self.args["arenaCompare"], self.args["updateThreshold"])
+                decision = arena.decision
+                log.info('ARENA GAMES : %d, MEAN MOVES : %.1f, MEAN TIME : %.1fs' % (
+                    len(games), np.mean([g['moves'] for g in games]), np.mean([g['time'] for g in games])))
+            else:
+                # only the sequential arena searches in this process
+                pmcts = MCTS(self.game, self.pnet, self.args)
+                nmcts = MCTS(self.game, self.nnet, self.args)
+                arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
+                              lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
+                pwins, nwins, draws = arena.playGames(self.args["arenaCompare"])
 
             log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
-            if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args["updateThreshold"]:
+            if decision == -1 or (decision == 0 and (pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args["updateThreshold"])):
                 log.info('REJECTING NEW MODEL')
                 self.nnet.load_checkpoint(folder=self.args["checkpoint"], filename='temp.pth.tar')
             else:
@@ -127,19 +105,26 @@ class Coach():
                 self.nnet.save_checkpoint(folder=self.args["checkpoint"], filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args["checkpoint"], filename='best.pth.tar')
 
+        if self.selfPlayPool is not None:
+            self.selfPlayPool.close()
+            self.selfPlayPool = None
+
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
-    def saveTrainExamples(self, iteration):
-        folder = self.args["checkpoint"]
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        filename = os.path.join(folder, self.getCheckpointFile(iteration) + ".examples")
-        with open(filename, "wb+") as f:
-            Pickler(f).dump(self.trainExamplesHistory)
-        f.closed
-
     def loadTrainExamples(self):
+        shape = self.replayBuffer.boardShape()
+        if shape is not None and shape != tuple(self.game.getBoardSize()):
+            log.warning(f"The replay buffer holds {shape} boards, not {self.game.getBoardSize()}; removing them.")
+            self.replayBuffer.clear()
+
+        if self.replayBuffer.iterations():
+            log.info("Training examples found in the replay buffer.")
+            # examples based on the model were already collected
+            self.skipFirstSelfPlay = True
+            return
+
+        # examples saved as a single pickle by earlier versions
         modelFile = os.path.join(self.args["load_folder_file"][0], self.args["load_folder_file"][1])
         examplesFile = modelFile + ".examples"
         if not os.path.isfile(examplesFile):
@@ -148,10 +133,11 @@ class Coach():
             if r != "y":
                 sys.exit()
         else:
-            log.info("File with trainExamples found. Loading it...")
+            log.info("File with trainExamples found. Moving it to the replay buffer...")
             with open(examplesFile, "rb") as f:
-                self.trainExamplesHistory = Unpickler(f).load()
+                for examples in Unpickler(f).load():
+                    self.replayBuffer.add(list(examples))
             log.info('Loading done!')
 
             # examples based on the model were already collected (loaded)
-            self.skipFirstSelfPlay = True
\ No newline at end of file
+            self.skipFirstSelfPlay = True
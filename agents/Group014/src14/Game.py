@@ -1,7 +1,7 @@
 from __future__ import print_function
 import sys
 sys.path.append('..')
-from Board import Board
+from Board import Board, HASH, TURNED_HASH, PLACED, info
 import numpy as np
 
 I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
@@ -11,6 +11,19 @@ class Game():
     def __init__(self, n=15):
         self.n = n
 
+        # flat neighbour table and a visited buffer shared by all searches;
+        # a cell counts as visited when it holds the current search stamp
+        self.neighbours = []
+        for x in range(n):
+            for y in range(n):
+                self.neighbours.append(tuple(
+                    (x + di) * n + (y + dj)
+                    for di, dj in zip(I_DISPLACEMENTS, J_DISPLACEMENTS)
+                    if 0 <= x + di < n and 0 <= y + dj < n
+                ))
+        self.visited = [0] * (n * n)
+        self.visitMark = 0
+
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
@@ -27,12 +40,10 @@ class Game():
     def getNextState(self, board, player, action):
         # if player takes action on board, return next (board,player)
         # action must be a valid move
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        
+        b = Board(self.n, np.copy(board))
+
         if action == self.n * self.n:
-            b.pieces *= -1
-            b.pieces[-1] = 1
+            b.swap()
         else:
             move = (int(action / self.n), action % self.n)
             b.execute_move(move, b.getNextPlayer())
@@ -41,53 +52,67 @@ class Game():
 
     # modified
     def getValidMoves(self, board, _):
-        # return a fixed size binary vector
-        valids = [0] * self.getActionSize()
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        legalMoves = b.get_legal_moves(1)
-        if not b[-1][-1] and b.getNPlaced() == 1:
+        # return a fixed size binary vector: the empty cells, and swap as
+        # the second move
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        valids[:-1] = board[:self.n].ravel() == 0
+        if not board[-1][-1] and info(board, self.n)[PLACED] == 1:
             valids[-1] = 1
-        for x, y in legalMoves:
-            valids[self.n * x + y] = 1
-        return np.array(valids)
-
-    def DFS(self, board, player, x, y, visited):
-        if x < 0 or x >= self.n or y < 0 or y >= self.n:
-            return False
-        if board[x][y] != player:
-            return False
-        if visited[x][y]:
-            return False
-        visited[x][y] = True
-        if (player == 1 and x == self.n - 1) or (player == -1 and y == self.n - 1):
-            return True
-        return any(self.DFS(board, player, x + I_DISPLACEMENTS[i], y + J_DISPLACEMENTS[i], visited) for i in range(6))
+        return valids
+
+    def DFS(self, cells, stone, vertical):
+        """Iterative search for a chain of stone joining top to bottom if
+        vertical, else left to right. cells is the playing area flattened
+        to a list of length n*n.
+        """
+        n = self.n
+        self.visitMark += 1
+        mark = self.visitMark
+        visited = self.visited
+        neighbours = self.neighbours
+
+        if vertical:
+            starts = range(n)
+        else:
+            starts = range(0, n * n, n)
+
+        stack = []
+        for idx in starts:
+            if cells[idx] == stone:
+                visited[idx] = mark
+                stack.append(idx)
+
+        while stack:
+            idx = stack.pop()
+            if (idx >= n * (n - 1)) if vertical else (idx % n == n - 1):
+                return True
+            for nb in neighbours[idx]:
+                if visited[nb] != mark and cells[nb] == stone:
+                    visited[nb] = mark
+                    stack.append(nb)
+        return False
 
     # modified
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
         swap = board[-1][-1]
-        
-        board = np.copy(board)
-        
+
+        # after a swap the stones are stored negated, so look for the
+        # other sign rather than copying and flipping the board
+        red = -1 if swap else 1
         if swap:
-            board *= -1
             player *= -1
-        
-        board = np.delete(board, self.n, 0)
-        # n = self.n_in_row
+
+        cells = board[:self.n].ravel().tolist()
 
         # Check if player 1 has a winning path from top to bottom
-        for i in range(self.n):
-            if self.DFS(board, 1, 0, i, [[False] * self.n for _ in range(self.n)]):
-                return player
-                
+        if self.DFS(cells, red, True):
+            return player
+
         # Check if player 2 has a winning path from left to right
-        for i in range(self.n):
-            if self.DFS(board, -1, i, 0, [[False] * self.n for _ in range(self.n)]):
-                return player * -1
+        if self.DFS(cells, -red, False):
+            return player * -1
 
         return 0
     
@@ -112,7 +137,7 @@ class Game():
             board *= -1
             
         #print(last_row, "L")
-        board = np.delete(board, self.n, 0)
+        board = np.delete(board, np.s_[self.n:], 0)
         
         l += [(board, pi)]
         l += [(np.fliplr(board), list(np.fliplr(pi_board).ravel()) + [pi[-1]])]
@@ -121,13 +146,41 @@ class Game():
         #print(l)
         return l
 
+    def rotateBoard(self, board):
+        # the board turned by 180 degrees, which keeps every edge with its
+        # colour, so the position is the same for both players
+        b = board.copy()
+        b[:self.n] = board[:self.n][::-1, ::-1]
+        turnedInfo, boardInfo = info(b, self.n), info(board, self.n)
+        turnedInfo[HASH], turnedInfo[TURNED_HASH] = boardInfo[TURNED_HASH], boardInfo[HASH]
+        return b
+
+    def rotatePolicy(self, pi):
+        # a policy vector of a board for the board turned by 180 degrees
+        pi = np.asarray(pi)
+        return np.concatenate((pi[-2::-1], pi[-1:]))
+
+    def getCanonicalKey(self, board):
+        """Returns the Zobrist key of board, the same for board and for
+        board turned by 180 degrees, and whether it is the key of the turned
+        board, i.e. whether rotateBoard(board) is the canonical orientation.
+        Both keys are carried in the board, see Board.hash.
+        """
+        boardInfo = info(board, self.n)
+        key = int(boardInfo[HASH])
+        turned = int(boardInfo[TURNED_HASH])
+
+        if turned < key:
+            return turned, True
+        return key, False
+
     def stringRepresentation(self, board):
         # 8x8 numpy array (canonical board)
-        return board.tostring()
+        return board.tobytes()
 
     @staticmethod
     def display(board):
-        n = board.shape[0]-1
+        n = board.shape[1]
         
         board = np.copy(board)
         
@@ -154,4 +207,4 @@ class Game():
                         print("- ", end="")
             print("|")
         print("   -----------------------")
-        print("TURN: ", board[n][n-1])
+        print("TURN: ", board[-1][-1])
@@ -1,5 +1,6 @@
 import logging
-import math
+from collections import OrderedDict
+from time import perf_counter
 
 import numpy as np
 
@@ -8,37 +9,159 @@ EPS = 1e-8
 log = logging.getLogger(__name__)
 
 
+class Node():
+    """
+    A board in the MCTS tree. The statistics of all edges leaving the board
+    are kept in NumPy arrays indexed by action, so that picking an action is
+    a single vectorised operation.
+
+    A node stands for a board and for the board turned by 180 degrees, which
+    is the same position. Its board and statistics are in the orientation
+    given by Game.getCanonicalKey.
+    """
+    __slots__ = ("key", "board", "ended", "P", "valids", "N", "Q", "VL", "n", "vl", "children")
+
+    def __init__(self, key, board, ended):
+        self.key = key
+        self.board = board
+        self.ended = ended  # game.getGameEnded for the board
+        self.P = None  # initial policy (returned by neural net), None until expanded
+        self.valids = None  # game.getValidMoves as a boolean mask
+        self.N = None  # #times each edge was visited
+        self.Q = None  # Q value of each edge (as defined in the paper)
+        self.VL = None  # virtual losses on each edge of pending searches
+        self.n = 0  # #times the board was visited
+        self.vl = 0  # virtual losses on the board of pending searches
+        self.children = {}  # action -> key of the child node, filled in as edges are taken
+
+    def expand(self, pi, valids):
+        """
+        Stores the policy of a newly evaluated node and sets up its edges.
+        """
+        self.valids = valids.astype(bool)
+        self.P = pi * valids  # masking invalid moves
+        sum_Ps_s = np.sum(self.P)
+        if sum_Ps_s > 0:
+            self.P /= sum_Ps_s  # renormalize
+        else:
+            # if all valid moves were masked make all valid moves equally probable
+
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.
+            log.error("All valid moves were masked, doing a workaround.")
+            self.P = self.P + valids
+            self.P /= np.sum(self.P)
+
+        self.N = np.zeros(len(valids), dtype=np.int32)
+        self.Q = np.zeros(len(valids))
+        self.VL = np.zeros(len(valids), dtype=np.int32)
+
+
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    Nodes are kept in a transposition table keyed by Zobrist key, so a board
+    reached by different move orders, or its 180 degree turn, is searched and
+    evaluated once. With mctsMaxNodes set, the table holds at most that many
+    nodes between batches of simulations: the least recently used ones are
+    evicted once a batch is backed up, never while a search path still
+    holds them, and the root is kept. An evicted node is created afresh the
+    next time it is reached.
     """
 
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}  # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}  # stores #times edge s,a was visited
-        self.Ns = {}  # stores #times board s was visited
-        self.Ps = {}  # stores initial policy (returned by neural net)
+        self.maxNodes = args.get("mctsMaxNodes")
+        self.nodes = OrderedDict()  # key -> Node of each board seen so far, least recently used first
 
-        self.Es = {}  # stores game.getGameEnded ended for board s
-        self.Vs = {}  # stores game.getValidMoves for board s
+    def getNode(self, board):
+        """
+        Returns the node of the given canonical board, creating it if needed.
+        """
+        key, turned = self.game.getCanonicalKey(board)
+        node = self.nodes.get(key)
+        if node is None:
+            if turned:
+                board = self.game.rotateBoard(board)
+            node = Node(key, board, self.game.getGameEnded(board, 1))
+            self.nodes[key] = node
+        else:
+            self.nodes.move_to_end(key)
+        return node
 
-    def getActionProb(self, canonicalBoard, temp=1):
+    def evict(self, root):
+        """
+        Evicts the least recently used nodes until at most maxNodes are left,
+        keeping root. Only called between batches, when no search path holds
+        a node.
+        """
+        if self.maxNodes is None:
+            return
+        self.nodes.move_to_end(root.key)
+        while len(self.nodes) > max(self.maxNodes, 1):
+            self.nodes.popitem(last=False)
+
+    def reroot(self, canonicalBoard):
+        """
+        Makes canonicalBoard the root of the tree after a move was played,
+        whoever played it (a swap included). The subtree under the new root
+        is kept with its visits and everything else is pruned, so searching
+        from the new root builds on the searches of earlier turns.
+
+        Returns:
+            root: the node of canonicalBoard
+        """
+        root = self.getNode(canonicalBoard)
+
+        keep = {root.key}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for key in node.children.values():
+                if key not in keep and key in self.nodes:
+                    keep.add(key)
+                    stack.append(self.nodes[key])
+
+        self.nodes = OrderedDict((key, node) for key, node in self.nodes.items() if key in keep)
+        return root
+
+    def getActionProb(self, canonicalBoard, temp=1, deadline=None):
         """
         This function performs numMCTSSims simulations of MCTS starting from
-        canonicalBoard.
+        canonicalBoard, mctsBatchSize of them at a time. If a deadline is
+        given (in perf_counter() seconds), it searches until then instead,
+        see searchUntil.
 
         Returns:
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args["numMCTSSims"]):
-            self.search(canonicalBoard)
+        batchSize = max(1, self.args.get("mctsBatchSize", 1))
+        if deadline is not None:
+            self.searchUntil(canonicalBoard, deadline)
+        else:
+            sims = self.args["numMCTSSims"]
+            while sims > 0:
+                self.searchBatch(canonicalBoard, min(batchSize, sims))
+                sims -= batchSize
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        root = self.getNode(canonicalBoard)
+        if root.N is None:
+            counts = np.zeros(self.game.getActionSize())
+        else:
+            counts = root.N.astype(np.float64)
+        if self.game.getCanonicalKey(canonicalBoard)[1]:
+            # the root is stored turned, turn the counts back
+            counts = self.game.rotatePolicy(counts)
+
+        # never pick an invalid move, even if the root was not searched
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        counts = counts * valids
+        if not counts.any():
+            counts = valids.astype(np.float64)
 
         if temp == 0:
             bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
@@ -47,90 +170,148 @@ class MCTS():
             probs[bestA] = 1
             return probs
 
-        counts = [x ** (1. / temp) for x in counts]
-        counts_sum = float(sum(counts))
-        probs = [x / counts_sum for x in counts]
+        counts = counts ** (1. / temp)
+        probs = list(counts / float(np.sum(counts)))
         return probs
 
+    def searchUntil(self, canonicalBoard, deadline):
+        """
+        Anytime search: runs batches of simulations from canonicalBoard until
+        the deadline (in perf_counter() seconds) passes, at least one batch
+        even if it has passed already. It stops early once
+        the most visited action can no longer be overtaken, i.e. when its
+        lead over the runner-up is larger than the number of simulations
+        that fit in the time left at the rate seen so far.
+
+        Returns:
+            sims: the number of simulations run
+        """
+        batchSize = max(1, self.args.get("mctsBatchSize", 1))
+        root = self.getNode(canonicalBoard)
+        start = perf_counter()
+        sims = 0
+
+        while True:
+            self.searchBatch(canonicalBoard, batchSize)
+            sims += batchSize
+
+            if root.ended != 0 or np.count_nonzero(root.valids) == 1:
+                break
+            now = perf_counter()
+            if now >= deadline:
+                break
+            second, best = np.partition(root.N, -2)[-2:]
+            if best - second > sims / max(now - start, EPS) * (deadline - now):
+                break
+
+        return sims
+
     def search(self, canonicalBoard):
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
-        has the maximum upper confidence bound as in the paper.
+        This function performs one iteration of MCTS. See searchBatch.
+        """
+        self.searchBatch(canonicalBoard, 1)
 
-        Once a leaf node is found, the neural network is called to return an
-        initial policy P and a value v for the state. This value is propagated
-        up the search path. In case the leaf node is a terminal state, the
-        outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
-        updated.
+    def searchBatch(self, canonicalBoard, batchSize):
+        """
+        This function performs batchSize iterations of MCTS, evaluating the
+        leaf nodes they reach with a single call to the neural network.
 
-        NOTE: the return values are the negative of the value of the current
-        state. This is done since v is in [-1,1] and if v is the value of a
-        state for the current player, then its value is -v for the other player.
+        Each iteration walks down the tree from canonicalBoard, picking the
+        action with the maximum upper confidence bound as in the paper, until
+        it finds a leaf or a terminal node. A terminal outcome is propagated
+        up the search path at once. A leaf is put aside for evaluation, and
+        every edge on its path gets a virtual loss, i.e. counts as a visit
+        that lost, so that the next iterations of the batch spread out over
+        other leaves. An iteration that reaches a leaf already put aside is
+        dropped.
 
-        Returns:
-            v: the negative of the value of the current canonicalBoard
-        """
-
-        s = self.game.stringRepresentation(canonicalBoard)
-
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s] != 0:
-            # terminal node
-            return -self.Es[s]
-
-        if s not in self.Ps:
-            # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
-
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
-
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
-
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
+        Once all iterations are done, the leaves are evaluated together, and
+        each value v is propagated up its search path while the virtual
+        losses are removed. The visit counts and Q values are updated, and
+        only then are nodes over mctsMaxNodes evicted.
 
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args["cpuct"] * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
+        NOTE: values alternate sign along a path. This is done since v is in
+        [-1,1] and if v is the value of a state for the current player, then
+        its value is -v for the other player.
+        """
+        root = self.getNode(canonicalBoard)
+        leaves = {}  # node -> path of the leaves to evaluate
+
+        for _ in range(batchSize):
+            node = root
+            path = []
+            while True:
+                if node.ended != 0:
+                    # terminal node
+                    self.removeVirtualLoss(path)
+                    self.backup(path, -node.ended)
+                    break
+
+                if node.P is None:
+                    # leaf node
+                    if node not in leaves:
+                        leaves[node] = path
+                    else:
+                        self.removeVirtualLoss(path)
+                    break
+
+                a = self.selectAction(node)
+                node.VL[a] += 1
+                node.vl += 1
+                path.append((node, a))
+
+                child = self.nodes.get(node.children.get(a))
+                if child is None:
+                    next_s, next_player = self.game.getNextState(node.board, 1, a)
+                    child = self.getNode(self.game.getCanonicalForm(next_s, next_player))
+                    node.children[a] = child.key
                 else:
-                    u = self.args["cpuct"] * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+                    self.nodes.move_to_end(child.key)
+                node = child
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+        if leaves:
+            pis, vs = self.nnet.predictBatch([node.board for node in leaves])
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+            for (node, path), pi, v in zip(leaves.items(), pis, vs):
+                node.expand(pi, self.game.getValidMoves(node.board, 1))
+                self.removeVirtualLoss(path)
+                self.backup(path, -float(v[0]))
 
-        v = self.search(next_s)
+        self.evict(root)
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
+    def selectAction(self, node):
+        """
+        Returns the valid action with the highest upper confidence bound at
+        node, counting virtual losses as visits with value -1.
+        """
+        cpuct = self.args["cpuct"]
+        n = node.N + node.VL
+        ns = node.n + node.vl
 
-        else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+        q = (node.N * node.Q - node.VL) / np.maximum(n, 1)
+        u = np.where(
+            n > 0,
+            q + cpuct * node.P * np.sqrt(ns) / (1 + n),
+            cpuct * node.P * np.sqrt(ns + EPS)  # Q = 0 ?
+        )
+        u[~node.valids] = -np.inf
+
+        # pick the action with the highest upper confidence bound
+        return int(np.argmax(u))
 
-        self.Ns[s] += 1
-        return -v
\ No newline at end of file
+    def removeVirtualLoss(self, path):
+        for node, a in path:
+            node.VL[a] -= 1
+            node.vl -= 1
+
+    def backup(self, path, v):
+        """
+        Propagates the value v of the node at the end of path up the path.
+        v is the value for the player who made the last move of the path.
+        """
+        for node, a in reversed(path):
+            node.Q[a] = (node.N[a] * node.Q[a] + v) / (node.N[a] + 1)
+            node.N[a] += 1
+            node.n += 1
+            v = -v
@@ -7,7 +7,7 @@ from tensorflow.keras.layers import *
 from tensorflow.keras.optimizers import *
 
 class NNModel():
-    def __init__(self, game, args):
+    def __init__(self, game, args, training=True):
         # game params
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
@@ -28,4 +28,5 @@ class NNModel():
         self.v = Dense(1, activation='tanh', name='v')(s_fc2)                    # batch_size x 1
 
         self.model = Model(inputs=self.input_boards, outputs=[self.pi, self.v])
-        self.model.compile(loss=['categorical_crossentropy','mean_squared_error'], optimizer=Adam(args["lr"]))
+        if training:  # an inference-only model needs no loss or optimizer
+            self.model.compile(loss=['categorical_crossentropy','mean_squared_error'], optimizer=Adam(args["lr"]))
@@ -0,0 +1,174 @@
+import logging
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener
+from time import time
+
+import numpy as np
+
+from SelfPlay import InferenceServer
+
+log = logging.getLogger(__name__)
+
+# the socket is created next to the weights it serves
+SOCKET_FILE = "inference.sock"
+
+# agents/Group014/temp, wherever the server is started from; this is where
+# AlphaZeroAgent.MODEL_FOLDER looks for the weights and the socket
+MODEL_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp")
+
+args = {
+    'boardSize': 11,
+    'checkpoint': MODEL_FOLDER,
+    'checkpointFile': 'best.pth.tar',
+    'inferenceBatchSize': 256,  # Most boards evaluated at once.
+    'inferenceWaitMs': 5,       # Longest time a request waits for others to fill a batch.
+    'reloadSettleSeconds': 2,   # New weights are loaded once their file has not changed for this long.
+}
+
+
+class NetClient():
+    """
+    Stands in for NeuralNet in any process: predictions are requested from
+    a NetServer over its Unix socket. n is the board size of the server's
+    network.
+    """
+
+    def __init__(self, address):
+        self.conn = Client(address, family="AF_UNIX")
+        self.n = self.conn.recv()
+
+    def predict(self, board):
+        pi, v = self.predictBatch([board])
+        return pi[0], v[0]
+
+    def predictBatch(self, boards):
+        self.conn.send(np.stack(boards))
+        result, error = self.conn.recv()
+        if error is not None:
+            raise RuntimeError(f"Inference failed:\n{error}")
+        return result
+
+    def close(self):
+        self.conn.close()
+
+
+class ReloadingInferenceServer(InferenceServer):
+    """
+    An InferenceServer that loads the weights in folder/filename again when
+    the file changes, e.g. when Coach accepts a new network. A file is only
+    loaded once it has not changed for reloadSettleSeconds, so that it is
+    not read while being written.
+    """
+
+    POLL_SECONDS = 1
+
+    def __init__(self, nnet, requests, responses, args, folder, filename):
+        super().__init__(nnet, requests, responses, args)
+        self.folder = folder
+        self.filename = filename
+        self.path = nnet.checkpointPath(folder, filename)
+        self.settle = args.get("reloadSettleSeconds", 2)
+        self.loaded = None  # modification time of the weights in use
+        self.nextPoll = 0
+
+    def modified(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def poll(self):
+        now = time()
+        if now < self.nextPoll:
+            return
+        self.nextPoll = now + self.POLL_SECONDS
+
+        modified = self.modified()
+        if modified is None or modified == self.loaded or now - modified < self.settle:
+            return
+        try:
+            self.nnet.load_checkpoint(self.folder, self.filename)
+        except Exception as e:
+            log.warning(f'Could not load "{self.path}": {e}')
+            return
+        log.info(f'Loaded "{self.path}"')
+        self.loaded = modified
+
+
+class NetServer():
+    """
+    Serves the predictions of one network to NetClients in other processes,
+    e.g. agents or self-play workers, over a Unix socket. Each client is
+    handled by a thread that forwards its requests to a
+    ReloadingInferenceServer, so requests from all clients are batched
+    together and the weights live in memory once.
+    """
+
+    def __init__(self, nnet, n, address, args):
+        self.n = n
+        self.address = address
+        self.requests = queue.Queue()
+        self.responses = {}  # client id -> queue of its responses
+        self.server = ReloadingInferenceServer(
+            nnet, self.requests, self.responses, args, args["checkpoint"], args["checkpointFile"]
+        )
+
+        # a socket left behind by a server that did not shut down
+        if os.path.exists(address):
+            os.remove(address)
+        self.listener = Listener(address, family="AF_UNIX")
+        os.chmod(address, 0o600)
+
+    def serve(self):
+        """
+        Accepts clients until interrupted, then removes the socket.
+        """
+        self.server.start()
+        clientId = 0
+        try:
+            while True:
+                conn = self.listener.accept()
+                threading.Thread(target=self.handle, args=(clientId, conn), daemon=True).start()
+                clientId += 1
+        finally:
+            self.listener.close()
+            self.server.stop()
+
+    def handle(self, clientId, conn):
+        self.responses[clientId] = queue.Queue()
+        try:
+            conn.send(self.n)
+            while True:
+                boards = conn.recv()
+                self.requests.put((clientId, boards))
+                conn.send(self.responses[clientId].get())
+        except (EOFError, OSError):
+            pass  # the client went away
+        finally:
+            del self.responses[clientId]
+            conn.close()
+
+
+def main():
+    from Game import Game
+    from NeuralNet import NeuralNet
+
+    logging.basicConfig(level=logging.INFO)
+
+    g = Game(args["boardSize"])
+    nnet = NeuralNet(g, inference=True)
+    address = os.path.join(args["checkpoint"], SOCKET_FILE)
+    server = NetServer(nnet, g.n, address, args)
+    if server.server.modified() is None:
+        log.warning(f'No saved model found in "{server.server.path}", serving untrained weights until there is one.')
+    log.info(f'Serving {args["boardSize"]}x{args["boardSize"]} predictions on "{address}"')
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
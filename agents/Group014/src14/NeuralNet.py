@@ -16,8 +16,13 @@ args = {
 }
 
 class NeuralNet():
-    def __init__(self, game):
-        self.nnet = onnet(game, args)
+    def __init__(self, game, inference=False):
+        """
+        inference: build the network for predictions only, as agents need,
+                   without compiling it for training
+        """
+        self.inference = inference
+        self.nnet = onnet(game, args, training=not inference)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
 
@@ -31,32 +36,52 @@ class NeuralNet():
         target_vs = np.asarray(target_vs)
         self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args["batch_size"], epochs = args["epochs"])
 
+    def trainBuffer(self, buffer):
+        """
+        buffer: ReplayBuffer with the examples, streamed in shuffled batches
+        """
+        for epoch in range(args["epochs"]):
+            for input_boards, target_pis, target_vs in buffer.batches(args["batch_size"]):
+                self.nnet.model.train_on_batch(x = input_boards, y = [target_pis, target_vs])
+
     def predict(self, board):
         """
         board: np array with board
         """
+        pi, v = self.predictBatch([board])
+        return pi[0], v[0]
+
+    def predictBatch(self, boards):
+        """
+        boards: list of np arrays with boards
+
+        Evaluates all boards with a single call to the model. Returns the
+        policies and values as arrays with one row per board.
+        """
         # timing
         # start = time.time()
-        swap = board[-1][-1]
-        
-        if swap:
-            board *= -1
-        
-        board = np.delete(board, self.board_x, 0) # Delete last row before predicting from NN
 
-        # preparing input
-        board = board[np.newaxis, :, :]
-        
-        pi, v = self.nnet.model.predict(board, verbose=False)
+        # preparing input: flip swapped boards and drop their last row
+        batch = np.stack([board[:self.board_x] * (-1 if board[-1][-1] else 1) for board in boards])
+
+        if self.inference:
+            # calling the model skips the batching machinery of predict
+            pi, v = self.nnet.model(batch.astype(np.float32), training=False)
+            pi, v = pi.numpy(), v.numpy()
+        else:
+            pi, v = self.nnet.model.predict(batch, verbose=False)
 
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
-        return pi[0], v[0]
+        return pi, v
 
-    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+    @staticmethod
+    def checkpointPath(folder, filename):
         # change extension
         filename = filename.split(".")[0] + ".h5"
-        
-        filepath = os.path.join(folder, filename)
+        return os.path.join(folder, filename)
+
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        filepath = self.checkpointPath(folder, filename)
         if not os.path.exists(folder):
             print("Checkpoint Directory does not exist! Making directory {}".format(folder))
             os.mkdir(folder)
@@ -65,11 +90,8 @@ class NeuralNet():
         self.nnet.model.save_weights(filepath)
 
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
-        # change extension
-        filename = filename.split(".")[0] + ".h5"
-        
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
-        filepath = os.path.join(folder, filename)
+        filepath = self.checkpointPath(folder, filename)
         if not os.path.exists(filepath):
             raise("No model in path {}".format(filepath))
         self.nnet.model.load_weights(filepath)
@@ -0,0 +1,123 @@
+import logging
+import os
+import re
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class ReplayBuffer():
+    """
+    On-disk buffer of training examples (board, pi, v), one shard per
+    self-play iteration. A shard is three NumPy files of fixed dtype, opened
+    memory-mapped, so only the examples being trained on are ever in memory.
+    Adding an iteration writes only its own shard, and the oldest shards are
+    deleted once there are more than maxShards.
+    """
+
+    SHARD = re.compile(r"shard_(\d+)_boards\.npy$")
+
+    def __init__(self, folder, maxShards):
+        self.folder = folder
+        self.maxShards = maxShards
+        os.makedirs(folder, exist_ok=True)
+
+    def shardPath(self, iteration, part):
+        return os.path.join(self.folder, f"shard_{iteration:06d}_{part}.npy")
+
+    def iterations(self):
+        """
+        Returns the iterations stored in the buffer, oldest first.
+        """
+        found = [self.SHARD.match(name) for name in os.listdir(self.folder)]
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def add(self, examples):
+        """
+        Writes the examples of one iteration as a new shard, then evicts the
+        oldest shards beyond maxShards.
+        """
+        if not examples:
+            return
+        iterations = self.iterations()
+        iteration = iterations[-1] + 1 if iterations else 0
+
+        boards, pis, vs = list(zip(*examples))
+        parts = {
+            'pis': np.asarray(pis, dtype=np.float32),
+            'vs': np.asarray(vs, dtype=np.float32),
+            # written last, as the file that marks a complete shard
+            'boards': np.asarray(boards, dtype=np.int8),
+        }
+        for part, array in parts.items():
+            path = self.shardPath(iteration, part)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+        iterations.append(iteration)
+        for old in iterations[:max(len(iterations) - self.maxShards, 0)]:
+            log.info(f"Removing the oldest shard of training examples, iteration {old}")
+            for part in ('boards', 'pis', 'vs'):
+                os.remove(self.shardPath(old, part))
+
+    def boardShape(self):
+        """
+        Returns the shape of the boards in the buffer, or None if it is
+        empty.
+        """
+        iterations = self.iterations()
+        if not iterations:
+            return None
+        return np.load(self.shardPath(iterations[-1], 'boards'), mmap_mode='r').shape[1:]
+
+    def clear(self):
+        """
+        Deletes every shard.
+        """
+        for iteration in self.iterations():
+            for part in ('boards', 'pis', 'vs'):
+                os.remove(self.shardPath(iteration, part))
+
+    def shards(self):
+        """
+        Returns the (boards, pis, vs) arrays of every shard, memory-mapped.
+        """
+        return [
+            tuple(np.load(self.shardPath(i, part), mmap_mode='r') for part in ('boards', 'pis', 'vs'))
+            for i in self.iterations()
+        ]
+
+    def __len__(self):
+        return sum(len(boards) for boards, _, _ in self.shards())
+
+    def batches(self, batchSize, chunkSize=65536):
+        """
+        Yields (boards, pis, vs) batches covering every example once, in a
+        random order. Examples are gathered from the shards chunkSize at a
+        time in a random order, reading each chunk in file order, so memory
+        use is bounded by the chunk size rather than by the buffer.
+        """
+        shards = self.shards()
+        sizes = [len(boards) for boards, _, _ in shards]
+        offsets = np.cumsum([0] + sizes)
+        order = np.random.permutation(offsets[-1])
+
+        for start in range(0, len(order), chunkSize):
+            chunk = np.sort(order[start:start + chunkSize])
+            shardIds = np.searchsorted(offsets, chunk, side='right') - 1
+
+            boards, pis, vs = [], [], []
+            for shardId in np.unique(shardIds):
+                rows = chunk[shardIds == shardId] - offsets[shardId]
+                boards.append(shards[shardId][0][rows])
+                pis.append(shards[shardId][1][rows])
+                vs.append(shards[shardId][2][rows])
+            boards, pis, vs = np.concatenate(boards), np.concatenate(pis), np.concatenate(vs)
+
+            # the chunk was read in file order; shuffle it again
+            perm = np.random.permutation(len(boards))
+            for b in range(0, len(perm), batchSize):
+                rows = perm[b:b + batchSize]
+                yield boards[rows], pis[rows], vs[rows]
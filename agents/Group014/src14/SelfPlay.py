@@ -0,0 +1,255 @@
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import traceback
+from time import perf_counter
+
+import numpy as np
+
+from Game import Game
+from MCTS import MCTS
+
+log = logging.getLogger(__name__)
+
+
+def playEpisode(game, mcts, args):
+    """
+    This function executes one episode of self-play, starting with player 1.
+    As the game is played, each turn is added as a training example to
+    trainExamples. The game is played till the game ends. After the game
+    ends, the outcome of the game is used to assign values to each example
+    in trainExamples.
+
+    It uses a temp=1 if episodeStep < tempThreshold, and thereafter
+    uses temp=0.
+
+    Returns:
+        trainExamples: a list of examples of the form (canonicalBoard, pi, v)
+                       pi is the MCTS informed policy vector, v is +1 if
+                       the player eventually won the game, else -1.
+    """
+    trainExamples = []
+    board = game.getInitBoard()
+    curPlayer = 1
+    episodeStep = 0
+
+    while True:
+        episodeStep += 1
+        canonicalBoard = game.getCanonicalForm(board, curPlayer)
+        temp = int(episodeStep < args["tempThreshold"])
+
+        pi = mcts.getActionProb(canonicalBoard, temp=temp)
+        sym = game.getSymmetries(canonicalBoard, pi)
+        for b, p in sym:
+            trainExamples.append([b, curPlayer, p, None])
+
+        action = np.random.choice(len(pi), p=pi)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+
+        r = game.getGameEnded(board, curPlayer)
+
+        if r != 0:
+            return [(x[0], x[2], r * ((-1) ** (x[1] != curPlayer))) for x in trainExamples]
+
+        # keep the subtree of the move played for the next search
+        mcts.reroot(game.getCanonicalForm(board, curPlayer))
+
+
+class RemoteNet():
+    """
+    Stands in for NeuralNet in a self-play worker: predictions are requested
+    from the inference server of the coach process.
+    """
+
+    def __init__(self, workerId, requests, responses):
+        self.workerId = workerId
+        self.requests = requests
+        self.responses = responses
+
+    def predict(self, board):
+        pi, v = self.predictBatch([board])
+        return pi[0], v[0]
+
+    def predictBatch(self, boards):
+        self.requests.put((self.workerId, np.stack(boards)))
+        result, error = self.responses.get()
+        if error is not None:
+            raise RuntimeError(f"Inference failed:\n{error}")
+        return result
+
+
+def selfPlayWorker(workerId, n, args, tasks, requests, responses, results):
+    """
+    Main function of a self-play worker process. Plays one episode for every
+    task until it is sent None, and sends back the examples of each episode
+    as soon as it ends, see getResult.
+    """
+    game = Game(n)
+    nnet = RemoteNet(workerId, requests, responses)
+
+    while tasks.get() is not None:
+        mcts = MCTS(game, nnet, args)  # reset search tree
+        try:
+            results.put((playEpisode(game, mcts, args), None))
+        except Exception:
+            results.put((None, traceback.format_exc()))
+            return
+
+
+def getResult(results, workers, pollSeconds=1):
+    """
+    Returns the next result sent by a worker process as a (result, error)
+    pair, where error is the traceback of an exception the worker raised
+    instead. Raises RuntimeError if the worker failed, or if a worker died
+    without sending anything, e.g. when killed for running out of memory.
+    """
+    while True:
+        try:
+            result, error = results.get(timeout=pollSeconds)
+        except queue.Empty:
+            for w in workers:
+                if w.exitcode is not None:
+                    raise RuntimeError(f"Worker process {w.name} exited with code {w.exitcode}")
+            continue
+
+        if error is not None:
+            raise RuntimeError(f"A worker process failed:\n{error}")
+        return result
+
+
+class InferenceServer():
+    """
+    Answers the prediction requests of the self-play workers with the
+    coach's network. Requests are gathered until inferenceBatchSize boards
+    are waiting, every worker has asked, or inferenceWaitMs has passed since
+    the first one, and are then evaluated with one call to the network.
+    Between batches, poll() is called, which subclasses can use to update
+    the network.
+
+    Responses are (result, error) pairs like those of the workers, see
+    getResult: if evaluating a batch raises, every request in it is
+    answered with the traceback, and the server goes on with the next.
+    """
+
+    def __init__(self, nnet, requests, responses, args):
+        self.nnet = nnet
+        self.requests = requests
+        self.responses = responses
+        self.maxBatch = args.get("inferenceBatchSize", 256)
+        self.maxWait = args.get("inferenceWaitMs", 5) / 1000
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def poll(self):
+        pass
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.poll()
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            size = len(batch[0][1])
+            deadline = perf_counter() + self.maxWait
+            while size < self.maxBatch and len(batch) < len(self.responses):
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                size += len(batch[-1][1])
+
+            try:
+                pis, vs = self.nnet.predictBatch(np.concatenate([boards for _, boards in batch]))
+            except Exception:
+                # the waiting workers raise it, so it reaches the coach
+                error = traceback.format_exc()
+                log.error(f"Inference of {size} boards failed:\n{error}")
+                for workerId, _ in batch:
+                    self.responses[workerId].put((None, error))
+                continue
+
+            start = 0
+            for workerId, boards in batch:
+                end = start + len(boards)
+                self.responses[workerId].put(((pis[start:end], vs[start:end]), None))
+                start = end
+
+
+class SelfPlayPool():
+    """
+    numSelfPlayWorkers processes that play self-play episodes concurrently,
+    with their leaf evaluations batched together by an InferenceServer
+    running on nnet in this process. The workers keep running between
+    iterations: they never hold weights, so a retrained nnet is used as soon
+    as it is in place.
+    """
+
+    def __init__(self, game, nnet, args):
+        # the network lives in this process, so workers are spawned rather
+        # than forked from it
+        ctx = mp.get_context("spawn")
+        numWorkers = args["numSelfPlayWorkers"]
+
+        self.tasks = ctx.Queue()
+        self.requests = ctx.Queue()
+        self.results = ctx.Queue()
+        self.responses = [ctx.Queue() for _ in range(numWorkers)]
+
+        self.server = InferenceServer(nnet, self.requests, self.responses, args)
+        self.server.start()
+
+        self.workers = [
+            ctx.Process(
+                target=selfPlayWorker,
+                args=(i, game.n, args, self.tasks, self.requests, self.responses[i], self.results),
+                daemon=True
+            )
+            for i in range(numWorkers)
+        ]
+        for w in self.workers:
+            w.start()
+
+    def playEpisodes(self, numEps):
+        """
+        Plays numEps episodes and yields the examples of each episode as soon
+        as it ends, in the order they finish. If a worker fails, the pool is
+        shut down and the error raised.
+        """
+        for _ in range(numEps):
+            self.tasks.put(True)
+        try:
+            for _ in range(numEps):
+                yield getResult(self.results, self.workers)
+        except RuntimeError:
+            self.terminate()
+            raise
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for w in self.workers:
+            w.join()
+        self.server.stop()
+
+    def terminate(self):
+        """
+        Stops the workers without waiting for their episodes to end.
+        """
+        for w in self.workers:
+            w.terminate()
+        for w in self.workers:
+            w.join()
+        self.server.stop()
@@ -0,0 +1,171 @@
+import numpy as np
+
+from Board import HASH, TURNED_HASH, PLACED, NEXT_PIECE
+from Game import I_DISPLACEMENTS, J_DISPLACEMENTS
+from Zobrist import zobrist_table
+
+
+class VectorHexEnv():
+    """
+    Plays batchSize games of Game at once, in lock-step. The boards are kept
+    in one array, each board laid out as in Game, rows below the cells
+    included, so that boards[i] can be handed to MCTS or to
+    NeuralNet.predictBatch as it is. Every operation works on all games with
+    a few NumPy operations, without looping over the games.
+
+    A game that ends is reset in place, so that every slot always holds a
+    game in progress.
+    """
+
+    def __init__(self, game, batchSize):
+        self.game = game
+        self.n = game.n
+        self.batchSize = batchSize
+
+        self.initBoard = game.getInitBoard()
+        self.boards = np.repeat(self.initBoard[None], batchSize, axis=0)
+        self.players = np.ones(batchSize, dtype=int)  # curPlayer of each game, as in Game.getNextState
+
+        z = zobrist_table(self.n)
+        self.redKeys = np.array(z.red, dtype=np.int64)
+        self.blueKeys = np.array(z.blue, dtype=np.int64)
+        self.swapKey = np.int64(z.swap)
+
+        # (target, source) slices of the board for each neighbour
+        # displacement: a cell is next to a reached cell if the cell at the
+        # displacement from it was reached
+        self.shifts = []
+        for di, dj in zip(I_DISPLACEMENTS, J_DISPLACEMENTS):
+            self.shifts.append((
+                (slice(None), slice(max(0, -di), self.n - max(0, di)), slice(max(0, -dj), self.n - max(0, dj))),
+                (slice(None), slice(max(0, di), self.n - max(0, -di)), slice(max(0, dj), self.n - max(0, -dj))),
+            ))
+
+    def reset(self, which=None):
+        """
+        Starts new games in the slots where which is True, or in all slots.
+        """
+        if which is None:
+            which = np.ones(self.batchSize, dtype=bool)
+        self.boards[which] = self.initBoard
+        self.players[which] = 1
+
+    def info(self):
+        """
+        Returns the rows below the cells of every board as a
+        (batchSize, k) view, see Board.info.
+        """
+        return self.boards[:, self.n:].reshape(self.batchSize, -1)
+
+    def getValidMoves(self):
+        """
+        Returns:
+            valids: a (batchSize, n*n+1) array, as Game.getValidMoves for
+                    each board
+        """
+        n = self.n
+        valids = np.zeros((self.batchSize, n * n + 1), dtype=int)
+        valids[:, :-1] = self.boards[:, :n].reshape(self.batchSize, -1) == 0
+        valids[:, -1] = (self.boards[:, -1, -1] == 0) & (self.info()[:, PLACED] == 1)
+        return valids
+
+    def connected(self, stones, vertical):
+        """
+        Returns, for each board of the (batchSize, n, n) boolean array
+        stones, whether they join the top and bottom rows if vertical, else
+        the left and right columns. The boards are flooded together from
+        their starting edge until none grows any more. Only boards with a
+        stone in every row (column) can hold a chain, so only those are
+        flooded.
+        """
+        result = np.zeros(len(stones), dtype=bool)
+        candidates = np.flatnonzero(stones.any(axis=2 if vertical else 1).all(axis=1))
+        if not len(candidates):
+            return result
+        stones = stones[candidates]
+
+        reached = np.zeros_like(stones)
+        if vertical:
+            reached[:, 0] = stones[:, 0]
+        else:
+            reached[:, :, 0] = stones[:, :, 0]
+
+        while True:
+            grown = reached.copy()
+            for target, source in self.shifts:
+                grown[target] |= reached[source]
+            grown &= stones
+            if np.array_equal(grown, reached):
+                break
+            reached = grown
+
+        if vertical:
+            result[candidates] = reached[:, -1].any(axis=1)
+        else:
+            result[candidates] = reached[:, :, -1].any(axis=1)
+        return result
+
+    def getGameEnded(self):
+        """
+        Returns:
+            results: a (batchSize,) array, as Game.getGameEnded for each
+                     board and its player
+        """
+        n = self.n
+        swapped = self.boards[:, -1, -1] != 0
+
+        # after a swap the stones are stored negated
+        red = np.where(swapped, -1, 1)[:, None, None]
+        players = np.where(swapped, -self.players, self.players)
+
+        cells = self.boards[:, :n]
+        redWins = self.connected(cells == red, True)
+        blueWins = self.connected(cells == -red, False)
+        return np.where(redWins, players, np.where(blueWins, -players, 0))
+
+    def step(self, actions):
+        """
+        Plays actions[i], which must be valid, in game i, as
+        Game.getNextState. Games that end are reset in place.
+
+        Returns:
+            results: a (batchSize,) array with Game.getGameEnded of each
+                     game after the move, for the player to move next; 0
+                     where the game goes on, otherwise the game was reset
+            valids: the valid moves of the boards now in the slots
+        """
+        n = self.n
+        actions = np.asarray(actions)
+        swap = actions == n * n
+        last = self.info()
+
+        # placements
+        games = np.flatnonzero(~swap)
+        cells = actions[games]
+        x, y = np.divmod(cells, n)
+        assert not self.boards[games, x, y].any()
+        pieces = last[games, NEXT_PIECE]
+        red = pieces == 1
+        self.boards[games, x, y] = pieces
+        last[games, HASH] ^= np.where(red, self.redKeys[cells], self.blueKeys[cells])
+        turnedCells = n * n - 1 - cells
+        last[games, TURNED_HASH] ^= np.where(red, self.redKeys[turnedCells], self.blueKeys[turnedCells])
+        last[games, PLACED] += 1
+        last[games, NEXT_PIECE] = -pieces
+
+        # swaps: the stones are negated, so change colour keys, see Board.swap
+        games = np.flatnonzero(swap)
+        if len(games):
+            stones = self.boards[games, :n].reshape(len(games), -1) != 0
+            flips = self.redKeys ^ self.blueKeys
+            last[games, HASH] ^= np.bitwise_xor.reduce(np.where(stones, flips, 0), axis=1) ^ self.swapKey
+            last[games, TURNED_HASH] ^= np.bitwise_xor.reduce(np.where(stones, flips[::-1], 0), axis=1) ^ self.swapKey
+            self.boards[games, :n] *= -1
+            last[games, -1] = 1
+            last[games, NEXT_PIECE] *= -1
+
+        self.players *= -1
+
+        results = self.getGameEnded()
+        self.reset(results != 0)
+        return results, self.getValidMoves()
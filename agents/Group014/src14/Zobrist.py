@@ -0,0 +1,37 @@
+import random
+
+# the same keys as the engine's src/Zobrist.py, which this copies so that
+# src14 does not need the engine: keep SEED and the key generation equal
+SEED = 0x4E58
+
+# keys are 63 bits, so that a key and any XOR of keys fits in a board cell
+KEY_BITS = 63
+
+# key tables are shared between all boards of the same size
+_TABLES = {}
+
+
+class ZobristTable():
+    """
+    Random keys for Zobrist hashing of an n x n board. A board's key is the
+    XOR of red[idx] or blue[idx] for the stone at flat index idx = x*n+y,
+    and of swap once the swap has been played. The empty board has key 0.
+    """
+
+    __slots__ = ("board_size", "red", "blue", "swap")
+
+    def __init__(self, board_size):
+        rng = random.Random(SEED * 1000 + board_size)
+        cells = board_size * board_size
+
+        self.board_size = board_size
+        self.red = tuple(rng.getrandbits(KEY_BITS) for _ in range(cells))
+        self.blue = tuple(rng.getrandbits(KEY_BITS) for _ in range(cells))
+        self.swap = rng.getrandbits(KEY_BITS)
+
+
+def zobrist_table(board_size):
+    # the key table for the board size, created on first use
+    if board_size not in _TABLES:
+        _TABLES[board_size] = ZobristTable(board_size)
+    return _TABLES[board_size]
@@ -2,10 +2,6 @@ import logging
 
 import coloredlogs
 
-from Coach import Coach
-from Game import Game
-from NeuralNet import NeuralNet as nn
-
 log = logging.getLogger(__name__)
 # Set the logging level
 logging.basicConfig(level=logging.INFO)
@@ -19,7 +15,14 @@ args = {
     'updateThreshold': 0.6,     # During arena playoff, new neural net will be accepted if threshold or more of games are won.
     'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
     'numMCTSSims': 25,          # Number of games moves for MCTS to simulate.
+    'mctsBatchSize': 8,         # Number of MCTS leaves evaluated by the neural network at once.
+    'mctsMaxNodes': 50000,      # Most boards kept in the MCTS transposition table (least recently used are evicted).
+    'numSelfPlayWorkers': 4,    # Number of processes playing self-play games at once (1 plays them in this process).
+    'inferenceBatchSize': 256,  # Most boards the self-play inference server evaluates at once.
+    'inferenceWaitMs': 5,       # Longest time the inference server waits to fill a batch.
     'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
+    'numArenaWorkers': 4,       # Number of processes playing arena games at once (1 plays them in this process).
+    'arenaSPRTDelta': 0.1,      # Arena play stops once the new net's win rate is known to be above or below updateThreshold by this much.
     'cpuct': 1,
 
     'checkpoint': './temp/',
@@ -29,6 +32,12 @@ args = {
 }
 
 def main():
+    # imported here, not at the top: self-play and arena workers are spawned,
+    # which imports this module again, and they must not load TensorFlow
+    from Coach import Coach
+    from Game import Game
+    from NeuralNet import NeuralNet as nn
+
     log.info('Loading %s...', Game.__name__)
     g = Game(11)
 
@@ -35,7 +35,7 @@ g = Game(11)
 hp = HumanPlayer(g).play
 nn = NNet(g)
 
-args1 = {'numMCTSSims': 50, 'cpuct':1.0}
+args1 = {'numMCTSSims': 50, 'mctsBatchSize': 8, 'cpuct':1.0}
 mcts1 = MCTS(g, nn, args1)
 nnp = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
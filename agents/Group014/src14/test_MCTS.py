@@ -0,0 +1,75 @@
+"""Tests that the MCTS transposition table only evicts nodes between
+batches, so that no leaf waiting for evaluation is lost.
+
+Run from the repository root with:
+python -m unittest discover -s agents/Group014/src14
+"""
+import unittest
+
+import numpy as np
+
+from Game import Game
+from MCTS import MCTS
+
+
+class CheckingNet():
+    """Predicts a uniform policy, checking first that the node of every
+    board to evaluate is still in the table of mcts.
+    """
+
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+        self.mcts = None
+        self.lost = 0
+
+    def predictBatch(self, boards):
+        nodes = self.mcts.nodes.values()
+        for board in boards:
+            if not any(node.board is board for node in nodes):
+                self.lost += 1
+        pis = np.full((len(boards), self.actionSize), 1 / self.actionSize)
+        return pis, np.zeros((len(boards), 1))
+
+
+def search(maxNodes, batches, n=5, batchSize=16):
+    game = Game(n)
+    nnet = CheckingNet(game)
+    args = {'cpuct': 1, 'mctsBatchSize': batchSize, 'mctsMaxNodes': maxNodes}
+    mcts = MCTS(game, nnet, args)
+    nnet.mcts = mcts
+    board = game.getInitBoard()
+    for _ in range(batches):
+        mcts.searchBatch(board, batchSize)
+    return game, mcts, nnet, board
+
+
+class TestEviction(unittest.TestCase):
+
+    def test_pending_leaves_are_not_evicted(self):
+        for maxNodes in (1, 2, 8, 64):
+            with self.subTest(maxNodes=maxNodes):
+                _, mcts, nnet, _ = search(maxNodes, batches=20)
+                self.assertEqual(nnet.lost, 0)
+
+    def test_table_is_bounded_between_batches(self):
+        for maxNodes in (1, 8, 64):
+            _, mcts, _, _ = search(maxNodes, batches=20)
+            self.assertLessEqual(len(mcts.nodes), maxNodes)
+
+    def test_root_is_kept(self):
+        game, mcts, _, board = search(4, batches=20)
+        root = mcts.getNode(board)
+
+        self.assertIsNotNone(root.N)
+        self.assertGreater(root.n, 0)
+        # every visit of the root was backed up into the node in the table
+        self.assertEqual(root.N.sum(), root.n)
+        self.assertTrue((root.VL == 0).all())
+
+    def test_unbounded_table_keeps_every_node(self):
+        _, mcts, _, _ = search(None, batches=5)
+        self.assertGreater(len(mcts.nodes), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
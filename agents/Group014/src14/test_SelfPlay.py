@@ -0,0 +1,112 @@
+"""Tests that a failed prediction of the inference server reaches the
+workers waiting for it and the coach, instead of blocking them.
+
+Run from the repository root with:
+python -m unittest discover -s agents/Group014/src14
+"""
+import queue
+import unittest
+
+import numpy as np
+
+from Game import Game
+from SelfPlay import InferenceServer, RemoteNet, SelfPlayPool
+
+args = {
+    'tempThreshold': 15,
+    'numMCTSSims': 4,
+    'mctsBatchSize': 2,
+    'cpuct': 1,
+    'numSelfPlayWorkers': 2,
+    'inferenceBatchSize': 256,
+    'inferenceWaitMs': 5,
+}
+
+
+class UniformNet():
+    """Predicts the same policy for every board, or raises once failing
+    is set.
+    """
+
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+        self.failing = False
+
+    def predictBatch(self, boards):
+        if self.failing:
+            raise MemoryError("out of memory")
+        pis = np.full((len(boards), self.actionSize), 1 / self.actionSize)
+        return pis, np.zeros((len(boards), 1))
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    def setUp(self):
+        self.game = Game(3)
+        self.nnet = UniformNet(self.game)
+        self.requests = queue.Queue()
+        self.responses = [queue.Queue(), queue.Queue()]
+        self.server = InferenceServer(self.nnet, self.requests, self.responses, args)
+        self.server.start()
+        self.clients = [RemoteNet(i, self.requests, self.responses[i]) for i in range(2)]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_predictions(self):
+        board = self.game.getInitBoard()
+        pis, vs = self.clients[0].predictBatch([board, board])
+
+        self.assertEqual(pis.shape, (2, self.game.getActionSize()))
+        self.assertEqual(vs.shape, (2, 1))
+
+    def test_failed_batch_is_raised_by_its_workers(self):
+        self.nnet.failing = True
+        board = self.game.getInitBoard()
+
+        with self.assertRaisesRegex(RuntimeError, "MemoryError: out of memory"):
+            self.clients[0].predict(board)
+
+        # the server is still running
+        self.nnet.failing = False
+        pi, v = self.clients[1].predict(board)
+        self.assertEqual(len(pi), self.game.getActionSize())
+
+    def test_batch_of_mixed_shapes_fails_for_every_worker(self):
+        # both requests are waiting, so they go into one batch
+        self.requests.put((0, np.zeros((1, 4, 3))))
+        self.requests.put((1, np.zeros((1, 5, 5))))
+
+        for i in range(2):
+            result, error = self.responses[i].get(timeout=5)
+            self.assertIsNone(result)
+            self.assertIn("ValueError", error)
+
+
+class TestSelfPlayPool(unittest.TestCase):
+
+    def test_episodes(self):
+        game = Game(3)
+        pool = SelfPlayPool(game, UniformNet(game), args)
+        try:
+            episodes = list(pool.playEpisodes(2))
+        finally:
+            pool.close()
+
+        self.assertEqual(len(episodes), 2)
+        self.assertTrue(all(len(examples) > 0 for examples in episodes))
+
+    def test_failed_inference_shuts_the_pool_down(self):
+        game = Game(3)
+        nnet = UniformNet(game)
+        nnet.failing = True
+        pool = SelfPlayPool(game, nnet, args)
+
+        with self.assertRaisesRegex(RuntimeError, "out of memory"):
+            list(pool.playEpisodes(2))
+        self.assertTrue(all(w.exitcode is not None for w in pool.workers))
+        self.assertFalse(pool.server.thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
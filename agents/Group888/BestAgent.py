@@ -1,3 +1,4 @@
+import os
 import socket
 from random import choice
 from time import sleep
@@ -9,7 +10,7 @@ class NaiveAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     def __init__(self, board_size=11):
         self.s = socket.socket(
@@ -18,6 +19,11 @@ class NaiveAgent():
 
         self.s.connect((self.HOST, self.PORT))
 
+        # a shared engine tells its agents apart by this token
+        token = os.environ.get("HEX_TOKEN")
+        if (token):
+            self.s.sendall(bytes(token + "\n", "utf-8"))
+
         self.board_size = board_size
         self.board = []
         self.colour = ""
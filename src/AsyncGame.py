@@ -0,0 +1,203 @@
+import asyncio
+from time import time_ns as time
+
+from Colour import Colour
+from EndState import EndState
+from Game import Game
+from AsyncProtocol import AsyncProtocol
+
+
+class AsyncGame(Game):
+    """A game of Hex played on an asyncio event loop.
+
+    The rules, logs and printed results are those of Game; only waiting
+    for agents is done with coroutines, so that many games can share one
+    event loop (and one AsyncListener) in a single process.
+    """
+
+    PROTOCOL = AsyncProtocol
+
+    async def run(self):
+        """Runs the match. Returns the short-form results that are also
+        printed to stderr.
+        """
+        try:
+            await self._play()
+        except BaseException as e:
+            await self._end_game(None)
+            print(f"Exception raised: {e}")
+        finally:
+            self._close_log()
+
+        return self._summary
+
+    async def _play(self):
+        """Main method for a match. Follows Game._play."""
+
+        # connect to the agents
+        await self._start_protocol(
+            self._players[Colour.RED]['run string'],
+            self._players[Colour.RED]['name'],
+            self._players[Colour.BLUE]['run string'],
+            self._players[Colour.BLUE]['name']
+        )
+        # test the connection
+        if (not self._has_connected):
+            await self._end_game(EndState.TIMEOUT)
+            return
+
+        # start the game
+        await self._send_message(
+            verbose_message=("Started game of Hex. Board is " +
+                             f"{self._board.get_size()}x" +
+                             f"{self._board.get_size()}."),
+            protocol_message="START",
+            start=True
+        )
+
+        self._start_time = time()
+        end_state = EndState.WIN
+
+        while (not self._board.has_ended()):
+            # get a move from the agents
+            m, move_time = await self._get_move()
+
+            # sent after reading the move to keep move times accurate
+            await self._send_message(
+                verbose_message=self._board.print_board(bnf=False)
+            )
+
+            # timeout
+            if (move_time == -1):
+                end_state = EndState.TIMEOUT
+                self._players[self._player]['time'] = Game.MAXIMUM_TIME
+                break
+
+            # illegal move
+            if (not m.is_valid_move(self)):
+                end_state = EndState.BAD_MOVE
+                self._flip_turn(move_time)
+                break
+
+            # If all checks passed, proceed normally
+            await self._make_move(m)
+            self._flip_turn(move_time)
+
+        await self._end_game(end_state)
+
+    async def _make_move(self, m):
+        """Performs a valid move on the board, then prints its
+        results.
+        """
+
+        await self._send_message(*self._apply_move(m))
+
+    async def _send_message(
+        self,
+        verbose_message="",
+        protocol_message="",
+        start=False
+    ):
+        """Sends messages to the shell or the agents through
+        standardised channels. This does not include CSV logging.
+        """
+
+        if (self._verbose and verbose_message != ""):
+            print(verbose_message)
+
+        if (protocol_message != ""):
+            if (start):
+                messages = {
+                    Colour.RED: self._start_message(Colour.RED),
+                    Colour.BLUE: self._start_message(Colour.BLUE)
+                }
+            elif (isinstance(protocol_message, str)):
+                messages = {
+                    Colour.RED: protocol_message,
+                    Colour.BLUE: protocol_message
+                }
+            else:
+                # one message per colour
+                messages = protocol_message
+            await self._protocol.send_messages(
+                messages, verbose=self._print_protocol
+            )
+
+    async def _get_move(self):
+        """Receives a move from the currently playing agent. Returns the
+        same tuple as Game._get_move().
+        """
+
+        time_left = Game.MAXIMUM_TIME - self._players[self._player]['time']
+        time_left = max(time_left, 0)
+
+        answer, move_time = await self._protocol.get_message(
+            self._player,
+            time_left,
+            self._print_protocol
+        )
+
+        # answer requests until the agent moves, on its own clock
+        while (self._is_request(answer, move_time)):
+            reply = self._request_reply(answer)
+            if (reply is not None):
+                await self._protocol.send_messages(
+                    {self._player: reply}, verbose=self._print_protocol
+                )
+            # move_time is the total so far, so it counts every wait once
+            answer, wait_time = await self._protocol.get_message(
+                self._player,
+                max(time_left - move_time, 0),
+                self._print_protocol
+            )
+            move_time = -1 if wait_time == -1 else move_time + wait_time
+
+        if (self._players[self._player]['delta'] is None):
+            # the offer of delta mode lapses with the first move
+            self._players[self._player]['delta'] = False
+        return self._read_move(answer, move_time)
+
+    async def _end_game(self, status):
+        """Wraps up the game and prints results to shell, log and
+        agents.
+        """
+
+        # print the board again
+        await self._send_message(
+            verbose_message=self._board.print_board(bnf=False)
+        )
+
+        verbose_message, protocol_message, log_message, final_message = \
+            self._results(status)
+
+        await self._send_message(verbose_message, protocol_message)
+        self._report(log_message, final_message)
+
+        # close communications
+        await self._protocol.close(
+            kill_children=self._kill_bots,
+            verbose=self._print_protocol
+        )
+
+    async def _start_protocol(self, s1, name1, s2, name2):
+        """Sets up the TCP server, then starts the agents and
+        connects to them. If either connection fails, the game
+        will not start.
+        """
+        await self._protocol.start()
+
+        self._has_connected = await self._protocol.accept_connection(
+            s1, name1, Game.MAXIMUM_TIME,
+            self._silent_bots, self._print_protocol
+        )
+        if (not self._has_connected):
+            self._players[Colour.RED]['time'] = Game.MAXIMUM_TIME
+            return
+
+        self._has_connected = await self._protocol.accept_connection(
+            s2, name2, Game.MAXIMUM_TIME,
+            self._silent_bots, self._print_protocol
+        )
+        if (not self._has_connected):
+            self._players[Colour.BLUE]['time'] = Game.MAXIMUM_TIME
+            self._player = self._player.opposite()
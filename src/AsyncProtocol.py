@@ -0,0 +1,308 @@
+import asyncio
+import secrets
+from time import time_ns
+
+from Colour import Colour
+from Protocol import TOKEN_TIMEOUT, Protocol, start_agent
+
+
+class AsyncListener():
+    """An asyncio TCP server that agents connect to. Like Listener, it can
+    be shared by many games, here running on the same event loop.
+
+    With tokens=False, incoming connections are queued by the server
+    callback, and starting an agent and taking the next connection from
+    the queue is done as one step under a lock. A shared listener must be
+    created with tokens=True: agents then send the token given to them in
+    HEX_TOKEN as their first line, and the server callback hands each
+    connection to the launch that gave out its token, as in Listener.
+
+    limit is the longest message its streams read at once; it must be at
+    least the longest message any of its games accepts.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1234, tokens=False,
+                 limit=Protocol.MAX_MESSAGE_LENGTH):
+        self.host = host
+        self.port = port
+        self.tokens = tokens
+        self.limit = limit
+        self.s = None
+        self._connections = asyncio.Queue()
+        self._lock = asyncio.Lock()
+        self._pending = {}  # token -> future of each launch's streams
+
+    async def start(self):
+        """Sets up the TCP server. asyncio enables address reuse on
+        Linux by default, which successive matches rely on.
+        """
+
+        self.s = await asyncio.start_server(
+            self._on_connection, self.host, self.port, limit=self.limit
+        )
+
+    async def _on_connection(self, reader, writer):
+        if (not self.tokens):
+            await self._connections.put((reader, writer))
+            return
+
+        try:
+            token = await asyncio.wait_for(
+                reader.readuntil(b"\n"), TOKEN_TIMEOUT
+            )
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ConnectionError):
+            token = b""
+
+        # a connection that arrives after its launch timed out is closed
+        future = self._pending.get(token.decode("utf-8", "replace").strip())
+        if (future is not None and not future.done()):
+            future.set_result((reader, writer))
+        else:
+            writer.close()
+
+    async def launch(self, run_s, timeout_ns=30*10**9, silent=True):
+        """Starts an agent and waits for it to connect. Returns the
+        process and the (reader, writer) pair, or None for the latter if
+        the agent did not connect in time.
+        """
+
+        if (self.tokens):
+            token = secrets.token_hex(16)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[token] = future
+            t = start_agent(run_s, self.port, silent, token)
+
+            try:
+                streams = await asyncio.wait_for(future, timeout_ns/10**9)
+            except asyncio.TimeoutError:
+                streams = None
+            finally:
+                del self._pending[token]
+
+            return t, streams
+
+        async with self._lock:
+            t = start_agent(run_s, self.port, silent)
+
+            try:
+                streams = await asyncio.wait_for(
+                    self._connections.get(), timeout_ns/10**9
+                )
+            except asyncio.TimeoutError:
+                streams = None
+
+        return t, streams
+
+    async def close(self):
+        self.s.close()
+        await self.s.wait_closed()
+
+
+class AsyncProtocol():
+    """Handles protocol communication between the engine and the two agents
+    of one game on an asyncio event loop. Mirrors Protocol, with coroutines
+    in place of its blocking methods.
+    """
+
+    def __init__(self, port=None, listener=None,
+                 max_length=Protocol.MAX_MESSAGE_LENGTH):
+        self.port = Protocol.PORT if port is None else port
+        self.s = listener  # created in start() unless shared
+        self.sockets = {Colour.RED: {}, Colour.BLUE: {}}
+        self.max_length = max_length
+
+        self._owns_listener = listener is None
+        if (listener is not None):
+            self.port = listener.port
+
+    async def start(self):
+        """Sets up the TCP server, unless this protocol uses a shared
+        listener.
+        """
+
+        if (self._owns_listener):
+            self.s = AsyncListener(
+                Protocol.HOST, self.port, limit=self.max_length
+            )
+            await self.s.start()
+
+    async def accept_connection(
+        self,
+        run_s,
+        name,
+        timeout_ns=30*10**9,
+        silent=True,
+        verbose=False
+    ):
+        """Starts a subprocess with the specified string then waits for the
+        new process to connect to the socket. Returns True if the connection
+        was made, False otherwise.
+        """
+
+        # determine the colour of the new agent
+        if len(self.sockets[Colour.RED].keys()) == 0:
+            colour = Colour.RED
+        elif len(self.sockets[Colour.BLUE].keys()) == 0:
+            colour = Colour.BLUE
+        else:
+            raise ValueError("Too many agents specified.")
+
+        t, streams = await self.s.launch(run_s, timeout_ns, silent)
+        reader, writer, addr = None, None, None
+        if (streams is not None):
+            reader, writer = streams
+            addr = writer.get_extra_info("peername")
+
+        if (verbose):
+            if (streams is not None):
+                print(f"Connected {name} at {addr}")
+            else:
+                print(f"{name} never connected.")
+
+        # set up associated arguments
+        self.sockets[colour]['name'] = name
+        self.sockets[colour]['thread'] = t
+        self.sockets[colour]['reader'] = reader
+        self.sockets[colour]['writer'] = writer
+        self.sockets[colour]['addr'] = addr
+
+        return streams is not None
+
+    async def get_message(self, colour, timeout_ns=30*10**9, verbose=False):
+        """Waits for a message from the given colour agent for the specified
+        length of time. Returns the text and the associated wait time.
+        Messages are framed by newlines as in Protocol.get_message.
+        """
+
+        agent = self.sockets[colour]
+        try:
+            move_time = time_ns()
+            data = await asyncio.wait_for(
+                self._read_message(agent['reader'], self.max_length),
+                timeout_ns/10**9
+            )
+            move_time = time_ns() - move_time
+
+        except asyncio.TimeoutError:
+            if verbose:
+                print(f"{agent['name']} timed out. Nothing received.")
+            return ("NO MESSAGE", -1)
+        except ConnectionResetError:
+            if verbose:
+                print(f"{agent['name']} disconnected early.")
+            return ("NO MESSAGE", -1)
+        except Exception:
+            if verbose:
+                print(f"{agent['name']} socket ended unexpectedly.")
+            return ("NO MESSAGE", -1)
+
+        if verbose:
+            print(
+                f"Received {data.decode('utf-8', 'replace').strip()} from " +
+                f"{agent['name']} in ~{int(move_time/10**4)/10**5}s."
+            )
+
+        return (data.decode("utf-8", "replace"), move_time)
+
+    @staticmethod
+    async def _read_message(reader, max_length):
+        """Reads one newline-terminated message. A message longer than
+        max_length is cut at max_length so that it can be rejected; the
+        stream limit, which a shared listener may set higher, is never
+        below it. If the connection closes, whatever was received is
+        returned.
+        """
+
+        try:
+            message = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            message = e.partial
+        except asyncio.LimitOverrunError:
+            message = await reader.read(max_length)
+        return message[:max_length]
+
+    async def send_messages(self, messages, verbose=False):
+        """Sends each agent its message from a {colour: message} dictionary,
+        writing to both before waiting for either to drain. Only messages
+        to Red are printed, as in the synchronous engine.
+        """
+
+        sent = []
+        for colour, message in messages.items():
+            try:
+                self.sockets[colour]['writer'].write(bytes(message, "utf-8"))
+                sent.append((colour, message))
+            except Exception:
+                if (verbose and colour == Colour.RED):
+                    print(
+                        f"Failed to send {message.strip()} to " +
+                        f"{self.sockets[colour]['name']}."
+                    )
+
+        results = await asyncio.gather(
+            *[self.sockets[colour]['writer'].drain() for colour, _ in sent],
+            return_exceptions=True
+        )
+        for (colour, message), result in zip(sent, results):
+            if (not verbose or colour != Colour.RED):
+                continue
+            if (isinstance(result, Exception)):
+                print(
+                    f"Failed to send {message.strip()} to " +
+                    f"{self.sockets[colour]['name']}."
+                )
+            else:
+                print("Sent", message, end="")
+
+    def swap(self):
+        """Switches the colours of the two agents."""
+
+        self.sockets[Colour.RED], self.sockets[Colour.BLUE] = \
+            self.sockets[Colour.BLUE], self.sockets[Colour.RED]
+
+    async def close(self, kill_children=True, verbose=False):
+        """Closes the connection. If kill_children=True, it will also forcibly
+        terminate the agents. Otherwise, it will wait until they have
+        terminated on their own. A shared listener is left open.
+        """
+
+        # close sockets and agents
+        for colour in Colour:
+            x = self.sockets[colour]
+            if (len(x.keys()) == 0):
+                continue
+
+            try:
+                if (kill_children):
+                    x['thread'].kill()
+                else:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, x['thread'].wait
+                    )
+            except Exception as e:
+                if (verbose):
+                    print(
+                        f"Couldn't close {x['name']} " +
+                        f"thread. Exception raised: {e}"
+                    )
+
+            try:
+                x['writer'].close()
+                if (verbose):
+                    print(
+                        f"Closed {x['name']} at {x['addr']}"
+                    )
+            except Exception:
+                if (verbose):
+                    print(
+                        f"{x['name']} connection was already closed.")
+
+        # close server
+        if (not self._owns_listener):
+            return
+        try:
+            await self.s.close()
+        except AttributeError:
+            if (verbose):
+                print("Socket was not open.")
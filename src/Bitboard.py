@@ -0,0 +1,173 @@
+from random import Random
+
+from Tile import Tile
+
+
+# cell codes, the same as Board's
+EMPTY = 0
+RED = 1
+BLUE = 2
+
+# geometries are shared between all bitboards of the same size
+_GEOMETRIES = {}
+
+
+class BitboardGeometry:
+    """Masks for the bitboards of one board size. Bit x*n+y stands for the
+    tile (x, y), as in Board's flat index.
+
+    The neighbours of every tile of a bitset are found at once by shifting
+    the whole set once per tile displacement: a displacement (di, dj) moves
+    bit x*n+y to bit (x+di)*n+(y+dj), i.e. shifts by di*n+dj. Tiles in the
+    column that would wrap around to the other side are masked out first,
+    and bits shifted off the top or bottom are cut by masking with the
+    stones, which lie on the board.
+    """
+
+    __slots__ = ("board_size", "full", "top", "bottom", "left", "right",
+                 "up", "down")
+
+    def __init__(self, board_size):
+        n = board_size
+        self.board_size = n
+        self.full = (1 << (n * n)) - 1
+        self.top = (1 << n) - 1
+        self.bottom = self.top << (n * (n - 1))
+        self.left = sum(1 << (x * n) for x in range(n))
+        self.right = self.left << (n - 1)
+
+        # (source mask, shift) of the displacements moving bits up and of
+        # those moving bits down, three each
+        self.up = []
+        self.down = []
+        for di, dj in zip(Tile.I_DISPLACEMENTS, Tile.J_DISPLACEMENTS):
+            source = self.full
+            if (dj > 0):
+                source &= ~self.right
+            elif (dj < 0):
+                source &= ~self.left
+            shift = di * n + dj
+            if (di > 0 or (di == 0 and dj > 0)):
+                self.up.append((source, shift))
+            else:
+                self.down.append((source, -shift))
+        self.up = tuple(self.up)
+        self.down = tuple(self.down)
+
+    def flood(self, seeds, stones, goal=0):
+        """Returns the tiles of stones connected to a tile of seeds & stones,
+        adding the neighbours of the whole set at once until it stops
+        growing. Stops as soon as the set reaches a tile of goal.
+        """
+
+        # unrolled, as this is the inner loop of every win check
+        (u0, us0), (u1, us1), (u2, us2) = self.up
+        (d0, ds0), (d1, ds1), (d2, ds2) = self.down
+
+        reached = seeds & stones
+        while (not reached & goal):
+            grown = (
+                reached |
+                (reached & u0) << us0 | (reached & u1) << us1 |
+                (reached & u2) << us2 |
+                (reached & d0) >> ds0 | (reached & d1) >> ds1 |
+                (reached & d2) >> ds2
+            ) & stones
+            if (grown == reached):
+                break
+            reached = grown
+        return reached
+
+    def connects(self, stones, start, end):
+        """Returns whether stones hold a chain from the edge start to the
+        edge end.
+        """
+
+        return bool(self.flood(start, stones, end) & end)
+
+    def winner(self, red, blue):
+        """Returns RED if red joins the top and bottom rows, BLUE if blue
+        joins the left and right columns, else EMPTY.
+        """
+
+        if (self.connects(red, self.top, self.bottom)):
+            return RED
+        if (self.connects(blue, self.left, self.right)):
+            return BLUE
+        return EMPTY
+
+
+def bitboard_geometry(board_size):
+    """Returns the masks for the board size, created on first use."""
+
+    if (board_size not in _GEOMETRIES):
+        _GEOMETRIES[board_size] = BitboardGeometry(board_size)
+
+    return _GEOMETRIES[board_size]
+
+
+class Bitboard:
+    """Hex position as one bitset per colour, held in Python ints."""
+
+    __slots__ = ("red", "blue", "_geometry")
+
+    def __init__(self, board_size=11):
+        self.red = 0
+        self.blue = 0
+        self._geometry = bitboard_geometry(board_size)
+
+    def set_tile(self, idx, code):
+        """Sets the tile at flat index idx to EMPTY, RED or BLUE."""
+
+        bit = 1 << idx
+        self.red &= ~bit
+        self.blue &= ~bit
+        if (code == RED):
+            self.red |= bit
+        elif (code == BLUE):
+            self.blue |= bit
+
+    def winner(self):
+        return self._geometry.winner(self.red, self.blue)
+
+
+def cross_check(board_size=11, games=200, seed=0):
+    """Plays random games on a Board with connectivity sets and on one with
+    the bitboard backend, checking after every move that both agree with
+    each other and with a full search of the board. Returns the number of
+    positions checked.
+    """
+
+    from Board import Board
+    from Colour import Colour
+
+    rng = Random(seed)
+    checked = 0
+    for _ in range(games):
+        sets = Board(board_size)
+        bits = Board(board_size, bitboard=True)
+        tiles = [(x, y) for x in range(board_size) for y in range(board_size)]
+        rng.shuffle(tiles)
+
+        # fill the board, then clear some tiles again, which rebuilds the
+        # connectivity sets; a won board stays won while filling, so fuller
+        # boards are checked too
+        moves = [(x, y, Colour.RED if i % 2 == 0 else Colour.BLUE)
+                 for i, (x, y) in enumerate(tiles)]
+        moves += [(x, y, None) for x, y in tiles[:board_size]]
+
+        for x, y, colour in moves:
+            sets.set_tile_colour(x, y, colour)
+            bits.set_tile_colour(x, y, colour)
+
+            winner = sets.find_winner()
+            assert sets.has_ended() == bits.has_ended() == (winner is not None)
+            assert sets.get_winner() == bits.get_winner() == winner
+            checked += 1
+
+    return checked
+
+
+if (__name__ == "__main__"):
+    for n in (1, 2, 3, 5, 11, 13):
+        print(f"{n}x{n}: {cross_check(n, games=50)} positions agree")
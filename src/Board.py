@@ -1,23 +1,80 @@
+from array import array
+
 from Tile import Tile
 from Colour import Colour
+from Bitboard import Bitboard
+from Zobrist import zobrist_table
+
+
+# byte codes used by the flat cell array
+EMPTY = 0
+RED = 1
+BLUE = 2
+
+_CODES = {None: EMPTY, Colour.RED: RED, Colour.BLUE: BLUE}
+_COLOURS = (None, Colour.RED, Colour.BLUE)
+_CHARS = bytes.maketrans(b"\x00\x01\x02", b"0RB")
+
+# neighbour tables are shared between all boards of the same size
+_NEIGHBOURS = {}
+
+
+def neighbour_table(board_size):
+    """Returns, for every flat index x*n+y, a tuple of the flat indices of
+    its neighbours on the board. Derived from the tile displacements and
+    cached per board size.
+    """
+
+    if (board_size not in _NEIGHBOURS):
+        table = []
+        for x in range(board_size):
+            for y in range(board_size):
+                neighbours = []
+                for idx in range(Tile.NEIGHBOUR_COUNT):
+                    x_n = x + Tile.I_DISPLACEMENTS[idx]
+                    y_n = y + Tile.J_DISPLACEMENTS[idx]
+                    if (x_n >= 0 and x_n < board_size and
+                            y_n >= 0 and y_n < board_size):
+                        neighbours.append(x_n * board_size + y_n)
+                table.append(tuple(neighbours))
+        _NEIGHBOURS[board_size] = tuple(table)
+
+    return _NEIGHBOURS[board_size]
 
 
 class Board:
-    """Class that describes the Hex board."""
+    """Class that describes the Hex board.
 
-    def __init__(self, board_size=11):
+    Tiles are stored in a single bytearray indexed by x*n+y, holding one of
+    EMPTY, RED or BLUE. Tile objects are only created as views on demand.
+
+    The winner is kept up to date with disjoint sets by default. With
+    bitboard=True, it is found instead by flooding a bitset per colour, see
+    Bitboard.py.
+    """
+
+    def __init__(self, board_size=11, bitboard=False):
         super().__init__()
 
         self._board_size = board_size
-
-        self._tiles = []
-        for i in range(board_size):
-            new_line = []
-            for j in range(board_size):
-                new_line.append(Tile(i, j))
-            self._tiles.append(new_line)
+        self._cells = bytearray(board_size * board_size)
+        self._neighbours = neighbour_table(board_size)
+        self._visited = None  # allocated on the first DFS
 
         self._winner = None
+        self._checksum = 0  # see checksum()
+        self._zobrist = zobrist_table(board_size)
+        self._keys = (None, self._zobrist.red, self._zobrist.blue)
+        self._hash = 0  # see hash()
+        self._bitboard = Bitboard(board_size) if bitboard else None
+
+        # disjoint-set forest over all tiles plus four virtual edge nodes,
+        # so that a win can be read off without searching the board
+        self._top = board_size * board_size
+        self._bottom = self._top + 1
+        self._left = self._top + 2
+        self._right = self._top + 3
+        self._reset_sets()
 
     def from_string(string_input, board_size=11, bnf=True):
         """Loads a board from a string representation. If bnf=True, it will
@@ -42,94 +99,196 @@ class Board:
         return b
 
     def has_ended(self):
-        """Checks if the game has ended. It will attempt to find a red chain
-        from top to bottom or a blue chain from left to right of the board.
+        """Checks if the game has ended. A red chain from top to bottom or a
+        blue chain from left to right joins the two virtual edge nodes of
+        that colour, which is kept up to date on every placement.
         """
 
-        # Red
-        # for all top tiles, check if they connect to bottom
-        for idx in range(self._board_size):
-            tile = self._tiles[0][idx]
-            if (not tile.is_visited() and
-                tile.get_colour() == Colour.RED and
-                    self._winner is None):
-                self.DFS_colour(0, idx, Colour.RED)
-        # Blue
-        # for all left tiles, check if they connect to right
-        for idx in range(self._board_size):
-            tile = self._tiles[idx][0]
-            if (not tile.is_visited() and
-                tile.get_colour() == Colour.BLUE and
-                    self._winner is None):
-                self.DFS_colour(idx, 0, Colour.BLUE)
-
-        # un-visit tiles
-        self.clear_tiles()
-
         return self._winner is not None
 
+    def _reset_sets(self):
+        """Rebuilds the disjoint-set forest from the current tiles."""
+
+        self._parent = array("i", range(self._top + 4))
+        self._set_size = array("i", [1]) * (self._top + 4)
+        self._winner = None
+
+        for idx, code in enumerate(self._cells):
+            if (code != EMPTY):
+                self._join_neighbours(idx)
+
+    def _find(self, idx):
+        """Returns the representative of the set containing idx, halving
+        the path on the way up.
+        """
+
+        parent = self._parent
+        while (parent[idx] != idx):
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    def _union(self, a, b):
+        """Merges the sets containing a and b, smaller under larger."""
+
+        a = self._find(a)
+        b = self._find(b)
+        if (a == b):
+            return
+
+        if (self._set_size[a] < self._set_size[b]):
+            a, b = b, a
+        self._parent[b] = a
+        self._set_size[a] += self._set_size[b]
+
+    def _join_neighbours(self, idx):
+        """Merges a newly coloured tile with its same-colour neighbours and
+        the edges it touches, then records the winner if its colour now
+        connects its two sides.
+        """
+
+        cells = self._cells
+        code = cells[idx]
+        x, y = divmod(idx, self._board_size)
+
+        for n_idx in self._neighbours[idx]:
+            if (cells[n_idx] == code):
+                self._union(idx, n_idx)
+
+        if (code == RED):
+            if (x == 0):
+                self._union(idx, self._top)
+            if (x == self._board_size-1):
+                self._union(idx, self._bottom)
+            if (self._find(self._top) == self._find(self._bottom)):
+                self._winner = Colour.RED
+        elif (code == BLUE):
+            if (y == 0):
+                self._union(idx, self._left)
+            if (y == self._board_size-1):
+                self._union(idx, self._right)
+            if (self._find(self._left) == self._find(self._right)):
+                self._winner = Colour.BLUE
+
     def clear_tiles(self):
-        """Clears the visited status from all tiles."""
+        """Clears the visited status from all tiles. The visited buffer is
+        stamped with a search number, so clearing only bumps the stamp.
+        """
 
-        for line in self._tiles:
-            for tile in line:
-                tile.clear_visit()
+        if (self._visited is None):
+            self._visited = [0] * len(self._cells)
+            self._visit_mark = 0
+        self._visit_mark += 1
 
     def DFS_colour(self, x, y, colour):
-        """A recursive DFS method that iterates through connected same-colour
-        tiles until it finds a bottom tile (Red) or a right tile (Blue).
+        """An iterative DFS method that iterates through connected
+        same-colour tiles until it finds a bottom tile (Red) or a right
+        tile (Blue). Tiles visited by earlier searches since the last
+        clear_tiles() are skipped.
         """
 
-        self._tiles[x][y].visit()
+        if (self._visited is None):
+            self.clear_tiles()
 
-        # win conditions
         if (colour == Colour.RED):
-            if (x == self._board_size-1):
-                self._winner = colour
+            goal = self._top - self._board_size  # first bottom row index
         elif (colour == Colour.BLUE):
-            if (y == self._board_size-1):
-                self._winner = colour
+            goal = None
         else:
             return
 
-        # end condition
-        if (self._winner is not None):
-            return
+        code = _CODES[colour]
+        cells = self._cells
+        visited = self._visited
+        mark = self._visit_mark
+        n = self._board_size
+
+        idx = x * n + y
+        visited[idx] = mark
+        stack = [idx]
+        while (stack):
+            idx = stack.pop()
+
+            # win conditions
+            if ((goal is not None and idx >= goal) or
+                    (goal is None and idx % n == n-1)):
+                self._winner = colour
+                return
+
+            # visit neighbours
+            for n_idx in self._neighbours[idx]:
+                if (visited[n_idx] != mark and cells[n_idx] == code):
+                    visited[n_idx] = mark
+                    stack.append(n_idx)
+
+    def find_winner(self):
+        """Searches the whole board for a winning chain without using the
+        connectivity sets. Runs in time linear in the number of tiles and
+        does not change the recorded winner.
+        """
+
+        winner = self._winner
+        self._winner = None
+        self.clear_tiles()
+
+        found = None
+        n = self._board_size
+        for colour, starts in ((Colour.RED, range(n)),
+                               (Colour.BLUE, range(0, n*n, n))):
+            for idx in starts:
+                if (self._visited[idx] != self._visit_mark and
+                        self._cells[idx] == _CODES[colour]):
+                    self.DFS_colour(*divmod(idx, n), colour)
+                if (self._winner is not None):
+                    break
+            if (self._winner is not None):
+                found = self._winner
+                break
 
-        # visit neighbours
-        for idx in range(Tile.NEIGHBOUR_COUNT):
-            x_n = x + Tile.I_DISPLACEMENTS[idx]
-            y_n = y + Tile.J_DISPLACEMENTS[idx]
-            if (x_n >= 0 and x_n < self._board_size and
-                    y_n >= 0 and y_n < self._board_size):
-                neighbour = self._tiles[x_n][y_n]
-                if (not neighbour.is_visited() and
-                        neighbour.get_colour() == colour):
-                    self.DFS_colour(x_n, y_n, colour)
+        self._winner = winner
+        return found
 
     def print_board(self, bnf=True):
         """Returns the string representation of a board. If bnf=True, the
         string will be formatted according to the communication protocol.
         """
 
+        n = self._board_size
+        rows = [self._cells[i:i+n].translate(_CHARS).decode("ascii")
+                for i in range(0, n*n, n)]
+
         output = ""
         if (bnf):
-            for line in self._tiles:
-                for tile in line:
-                    output += Colour.get_char(tile.get_colour())
-                output += ","
-            output = output[:-1]
+            output = ",".join(rows)
         else:
-            leading_spaces = ""
-            for line in self._tiles:
-                output += leading_spaces
-                leading_spaces += " "
-                for tile in line:
-                    output += Colour.get_char(tile.get_colour()) + " "
-                output += "\n"
+            for idx, line in enumerate(rows):
+                output += " " * idx + " ".join(line) + " \n"
 
         return output
 
+    def checksum(self):
+        """Returns the sum of (x*n + y + 1) * c over all stones, where c is
+        1 for Red and 2 for Blue, modulo 2**32. Kept up to date on every
+        change, so agents can cheaply check their copy of the board.
+        """
+
+        return self._checksum
+
+    def hash(self):
+        """Returns the 63-bit Zobrist key of the position, see Zobrist.py.
+        Kept up to date on every change, so positions can key dictionaries
+        without building a string of the board.
+        """
+
+        return self._hash
+
+    def swap(self):
+        """Records that the players swapped colours. The tiles stay as
+        they are, only the key of the position changes.
+        """
+
+        self._hash ^= self._zobrist.swap
+
     def get_winner(self):
         return self._winner
 
@@ -137,10 +296,59 @@ class Board:
         return self._board_size
 
     def get_tiles(self):
-        return self._tiles
+        """Returns an n x n grid of Tile views onto this board. Reading
+        single tiles through get_tile_colour() is much cheaper.
+        """
+
+        return [
+            [Tile(x, y, board=self) for y in range(self._board_size)]
+            for x in range(self._board_size)
+        ]
+
+    def get_tile_colour(self, x, y):
+        return _COLOURS[self._cells[x * self._board_size + y]]
+
+    def is_visited(self, x, y):
+        return (self._visited is not None and
+                self._visited[x * self._board_size + y] == self._visit_mark)
+
+    def visit(self, x, y):
+        if (self._visited is None):
+            self.clear_tiles()
+        self._visited[x * self._board_size + y] = self._visit_mark
+
+    def clear_visit(self, x, y):
+        if (self._visited is not None):
+            self._visited[x * self._board_size + y] = 0
 
     def set_tile_colour(self, x, y, colour):
-        self._tiles[x][y].set_colour(colour)
+        """Colours a tile and updates the winner. With connectivity sets,
+        placing a stone on an empty tile is incremental; recolouring or
+        clearing an occupied tile rebuilds the sets from scratch. With a
+        bitboard, the winner is found again by flooding from the edges.
+        """
+
+        idx = x * self._board_size + y
+        previous = self._cells[idx]
+        code = _CODES[colour]
+        if (previous == code):
+            return
+
+        self._cells[idx] = code
+        self._checksum = (
+            self._checksum + (idx + 1) * (code - previous)
+        ) % 2**32
+        if (previous != EMPTY):
+            self._hash ^= self._keys[previous][idx]
+        if (code != EMPTY):
+            self._hash ^= self._keys[code][idx]
+        if (self._bitboard is not None):
+            self._bitboard.set_tile(idx, code)
+            self._winner = _COLOURS[self._bitboard.winner()]
+        elif (previous == EMPTY):
+            self._join_neighbours(idx)
+        else:
+            self._reset_sets()
 
 
 if (__name__ == "__main__"):
@@ -1,15 +1,14 @@
 from sys import stderr
 from time import time_ns as time
 from os.path import realpath, sep
-from os.path import exists
-from datetime import datetime
-from pathlib import Path
 
 from Colour import Colour
 from Board import Board
 from Move import Move
 from Protocol import Protocol
 from EndState import EndState
+from MatchLog import MatchLog
+from Record import GameRecord, RecordWriter
 
 
 class Game():
@@ -21,6 +20,9 @@ class Game():
     # 1 second in nanoseconds
     # MAXIMUM_TIME = 10**9
 
+    # class of the protocol each game creates; AsyncGame uses AsyncProtocol
+    PROTOCOL = Protocol
+
     def __init__(
         self,
         board_size=11,
@@ -36,7 +38,13 @@ class Game():
         log=True,
         print_protocol=False,
         kill_bots=True,
-        silent_bots=True
+        silent_bots=True,
+        port=None,
+        listener=None,
+        print_summary=True,
+        record=None,
+        delta=False,
+        resync=0
     ):
         self._turn = 1  # current turn count
         self._board = Board(board_size)
@@ -49,13 +57,15 @@ class Game():
                 'name': None,
                 'run string': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'delta': None  # whether it accepted delta mode, once known
             },
             Colour.BLUE: {
                 'name': None,
                 'run string': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'delta': None
             }
         }
         self._players[Colour.RED]['name'] = player1['name']
@@ -65,19 +75,48 @@ class Game():
 
         self._kill_bots = kill_bots
         self._silent_bots = silent_bots
+        self._print_summary = print_summary
+        self._summary = None  # short-form results, set when the game ends
+
+        # each game owns its protocol; games hosted by the same process
+        # can share one listener instead of binding a port each
+        self._protocol = self.PROTOCOL(
+            port, listener, Protocol.message_limit(board_size)
+        )
+
+        # delta mode: agents that accept it get CHANGE messages with the
+        # turn number and board checksum instead of the board, which is
+        # sent in full only every resync turns (never if 0) or when an
+        # agent asks for it
+        self._delta = delta
+        self._resync = resync
 
         self._verbose = verbose
         self._print_protocol = print_protocol
         self._log = log
         self._start_log()
 
+        # binary record of the match, appended to this archive at the end
+        self._record_path = record
+        self._record = None
+        if (record is not None):
+            self._record = GameRecord(
+                board_size, (player1['name'], player2['name'])
+            )
+
     def run(self):
-        """Runs the match."""
+        """Runs the match. Returns the short-form results that are also
+        printed to stderr.
+        """
         try:
             self._play()
         except BaseException as e:
             self._end_game(None)
             print(f"Exception raised: {e}")
+        finally:
+            self._close_log()
+
+        return self._summary
 
     def _play(self):
         """Main method for a match.
@@ -109,7 +148,7 @@ class Game():
             verbose_message=("Started game of Hex. Board is " +
                              f"{self._board.get_size()}x" +
                              f"{self._board.get_size()}."),
-            protocol_message=f"START;{self._board.get_size()};",
+            protocol_message="START",
             start=True
         )
 
@@ -151,6 +190,13 @@ class Game():
         results.
         """
 
+        self._send_message(*self._apply_move(m))
+
+    def _apply_move(self, m):
+        """Performs a valid move on the board. Returns the messages
+        that announce it to the user and to the agents.
+        """
+
         verbose_message = ""  # for the user
         protocol_message = "CHANGE;"  # for the agents
 
@@ -171,9 +217,69 @@ class Game():
         verbose_message = (
             f"{self._players[self._player]['name']} {verbose_message}"
         )
-        protocol_message += f"{self._board.print_board()};{next_player}\n"
+        # the board field depends on whether each agent is in delta mode
+        protocol_message = {
+            colour: f"{protocol_message}{self._board_state(colour)};" +
+                    f"{next_player}\n"
+            for colour in Colour
+        }
 
-        self._send_message(verbose_message, protocol_message)
+        return (verbose_message, protocol_message)
+
+    def _board_state(self, colour):
+        """Returns the board field of a CHANGE message for the agent of the
+        given colour: the board, or if that agent accepted delta mode the
+        turn number and checksum of the board as <turn>:<checksum> on all
+        turns but the resync ones.
+        """
+
+        if (self._players[colour]['delta'] and
+                (self._resync == 0 or self._turn % self._resync != 0)):
+            return f"{self._turn}:{self._board.checksum()}"
+        return self._board.print_board()
+
+    def _start_message(self, colour):
+        """Returns the START message for the agent of the given colour,
+        offering delta mode if it is enabled. An agent accepts the offer by
+        sending DELTA before its first move.
+        """
+
+        message = f"START;{self._board.get_size()};{colour.get_char()}"
+        if (self._delta):
+            message += ";DELTA"
+        return message + "\n"
+
+    def _resync_message(self):
+        """Returns the full board with the number of moves made so far and
+        their checksum, sent to an agent that asks for it in delta mode.
+        """
+
+        return (
+            f"BOARD;{self._board.print_board()};" +
+            f"{self._turn - 1}:{self._board.checksum()}\n"
+        )
+
+    def _is_request(self, answer, move_time):
+        """Returns whether an answer is a request rather than a move: in
+        delta mode, BOARD asks for the board, and DELTA accepts delta mode
+        if the agent has not moved yet.
+        """
+
+        if (not self._delta or move_time == -1):
+            return False
+        answer = answer.strip()
+        undecided = self._players[self._player]['delta'] is None
+        return (answer == "BOARD" or (answer == "DELTA" and undecided))
+
+    def _request_reply(self, answer):
+        """Carries out a request of the current agent. Returns the message
+        to answer it with, or None if it needs no answer.
+        """
+
+        if (answer.strip() == "DELTA"):
+            self._players[self._player]['delta'] = True
+            return None
+        return self._resync_message()
 
     def get_next_player(self):
         """Returns END if the game is over or the opposite player
@@ -200,20 +306,26 @@ class Game():
 
         if (protocol_message != ""):
             if (start):
-                Protocol.send_message(
-                    Colour.RED, f"{protocol_message}R\n",
+                self._protocol.send_message(
+                    Colour.RED, self._start_message(Colour.RED),
                     verbose=self._print_protocol
                 )
-                Protocol.send_message(
-                    Colour.BLUE, f"{protocol_message}B\n"
+                self._protocol.send_message(
+                    Colour.BLUE, self._start_message(Colour.BLUE)
                 )
             else:
-                Protocol.send_message(
-                    Colour.RED, protocol_message,
+                # a single message for both agents, or one per colour
+                if (isinstance(protocol_message, str)):
+                    protocol_message = {
+                        Colour.RED: protocol_message,
+                        Colour.BLUE: protocol_message
+                    }
+                self._protocol.send_message(
+                    Colour.RED, protocol_message[Colour.RED],
                     verbose=self._print_protocol
                 )
-                Protocol.send_message(
-                    Colour.BLUE, protocol_message
+                self._protocol.send_message(
+                    Colour.BLUE, protocol_message[Colour.BLUE]
                 )
 
     def _get_move(self):
@@ -229,12 +341,37 @@ class Game():
         time_left = Game.MAXIMUM_TIME - self._players[self._player]['time']
         time_left = max(time_left, 0)
 
-        answer, move_time = Protocol.get_message(
+        answer, move_time = self._protocol.get_message(
             self._player,
             time_left,
             self._print_protocol
         )
 
+        # answer requests until the agent moves, on its own clock
+        while (self._is_request(answer, move_time)):
+            reply = self._request_reply(answer)
+            if (reply is not None):
+                self._protocol.send_message(
+                    self._player, reply, verbose=self._print_protocol
+                )
+            # move_time is the total so far, so it counts every wait once
+            answer, wait_time = self._protocol.get_message(
+                self._player,
+                max(time_left - move_time, 0),
+                self._print_protocol
+            )
+            move_time = -1 if wait_time == -1 else move_time + wait_time
+
+        if (self._players[self._player]['delta'] is None):
+            # the offer of delta mode lapses with the first move
+            self._players[self._player]['delta'] = False
+        return self._read_move(answer, move_time)
+
+    def _read_move(self, answer, move_time):
+        """Parses an agent's answer into a Move and logs it. Returns the
+        same tuple as _get_move().
+        """
+
         move, log_message = None, 0
         try:
             answer = answer.strip().split(",")
@@ -269,6 +406,8 @@ class Game():
             move = Move(self._player, -2, -2)
 
         self._write_log(log_message)
+        if (self._record is not None):
+            self._record.add_move(move.get_x(), move.get_y(), move_time)
         return (move, move_time)
 
     def _swap(self):
@@ -279,9 +418,10 @@ class Game():
         )
 
         self._has_swapped = True
+        self._board.swap()
         self._player = Colour.opposite(self._player)
 
-        Protocol.swap()
+        self._protocol.swap()
 
     def _flip_turn(self, move_time):
         """Increments the statistics of the current player, then
@@ -304,6 +444,23 @@ class Game():
             verbose_message=self._board.print_board(bnf=False)
         )
 
+        verbose_message, protocol_message, log_message, final_message = \
+            self._results(status)
+
+        self._send_message(verbose_message, protocol_message)
+        self._report(log_message, final_message)
+
+        # close communications
+        self._protocol.close(
+            kill_children=self._kill_bots,
+            verbose=self._print_protocol
+        )
+
+    def _results(self, status):
+        """Works out the end of game statistics. Returns the messages for
+        the user, the agents and the log, and the short-form results.
+        """
+
         # calculate total time elapsed
         total_time = time() - self._start_time
 
@@ -404,12 +561,6 @@ class Game():
                 f"{self._players[colour]['time']},{means[colour]}\n"
             )
 
-        self._send_message(verbose_message, protocol_message)
-        self._write_log(log_message)
-
-        if (self._log):
-            print(f"Saved log to {self._log_path}")
-
         # short-form results; easier to read than verbose option
         red_end_s = (str(self._player == Colour.RED) + " " +
                      str(self._players[Colour.RED]['time']) + " " +
@@ -422,22 +573,44 @@ class Game():
         final_message = (
             f"{EndState.get_text(status)}\n{red_end_s}\n{blue_end_s}"
         )
-        print(final_message, file=stderr)
 
-        # close communications
-        Protocol.close(
-            kill_children=self._kill_bots,
-            verbose=self._print_protocol
-        )
+        if (self._record is not None):
+            self._record.swapped = self._has_swapped
+            if (status is not None):
+                self._record.end_state = status
+                # the first player started as Red, and is Blue after a swap
+                self._record.winner = (
+                    1 if (self._player == Colour.RED) != self._has_swapped
+                    else 2
+                )
+
+        return (verbose_message, protocol_message, log_message, final_message)
+
+    def _report(self, log_message, final_message):
+        """Writes the end of game statistics to the log and the
+        short-form results to stderr.
+        """
+
+        # the log is closed by run, so an error after this point can
+        # still be written to it
+        self._write_log(log_message)
+
+        if (self._log):
+            print(f"Saved log to {self._log_path}")
+        self._write_record()
+
+        self._summary = final_message
+        if (self._print_summary):
+            print(final_message, file=stderr)
 
     def _start_protocol(self, s1, name1, s2, name2):
         """Sets up the TCP server, then starts the agents and
         connects to them. If either connection fails, the game
         will not start.
         """
-        Protocol.start()
+        self._protocol.start()
 
-        self._has_connected = Protocol.accept_connection(
+        self._has_connected = self._protocol.accept_connection(
             s1, name1, Game.MAXIMUM_TIME,
             self._silent_bots, self._print_protocol
         )
@@ -445,7 +618,7 @@ class Game():
             self._players[Colour.RED]['time'] = Game.MAXIMUM_TIME
             return
 
-        self._has_connected = Protocol.accept_connection(
+        self._has_connected = self._protocol.accept_connection(
             s2, name2, Game.MAXIMUM_TIME,
             self._silent_bots, self._print_protocol
         )
@@ -463,32 +636,31 @@ class Game():
         log_path = sep.join(log_path.split(sep)[:-2])
         log_path += f"{sep}logs{sep}"
 
-        # create the log directory if it doesn't exist
-        Path(log_path).mkdir(parents=True, exist_ok=True)
-
-        # create a new log file
-        self._log_path = log_path + "log.csv"
-        idx = 1
-        while exists(self._log_path):
-            self._log_path = log_path + f"log{idx}.csv"
-            idx += 1
-
-        # submit the start message
-        with open(self._log_path, "w") as f:
-            f.write(f"Start log at {datetime.now()}\n")
-            f.write(
-                f"Board is {self._board.get_size()}x" +
-                f"{self._board.get_size()}.\n"
-            )
-            f.write("No,Player,X,Y,Time\n")
+        self._match_log = MatchLog(log_path, self._board.get_size())
+        self._log_path = self._match_log.path
 
     def _write_log(self, message):
         """Writes the specified message and a newline to the log file."""
         if (not self._log):
             return
 
-        with open(self._log_path, "a") as f:
-            f.write(message + "\n")
+        self._match_log.write(message)
+
+    def _close_log(self):
+        """Flushes the log file to disk."""
+        if (not self._log):
+            return
+
+        self._match_log.close()
+
+    def _write_record(self):
+        """Appends the binary record of the match to its archive."""
+        if (self._record is None):
+            return
+
+        with RecordWriter(self._record_path) as w:
+            w.write(self._record)
+        self._record = None
 
     def get_board(self):
         return self._board
@@ -0,0 +1,62 @@
+from datetime import datetime
+from os import getpid
+from os.path import join
+from pathlib import Path
+from uuid import uuid4
+
+
+class MatchLog():
+    """A buffered CSV log for one match.
+
+    The file is opened once and written through a buffer, which is
+    flushed every FLUSH_LINES lines and when the log is closed at the end
+    of the game, so a killed engine loses at most the last few moves.
+    File names are unique without looking at the directory, so many
+    engines can log into it at once.
+    """
+
+    # bytes kept in memory before writing to disk
+    BUFFER_SIZE = 64 * 1024
+    # lines written between flushes
+    FLUSH_LINES = 16
+
+    def __init__(self, directory, board_size):
+        """Creates the log file in directory and writes the start
+        message.
+        """
+
+        # create the log directory if it doesn't exist
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+        self.path = join(directory, MatchLog.new_name())
+        self._f = open(self.path, "x", buffering=MatchLog.BUFFER_SIZE)
+        self._unflushed = 0
+
+        self.write(f"Start log at {datetime.now()}")
+        self.write(f"Board is {board_size}x{board_size}.")
+        self.write("No,Player,X,Y,Time")
+
+    @staticmethod
+    def new_name():
+        """Returns a fresh log file name. Names sort by creation time; the
+        process id and a random suffix tell apart logs started in the same
+        microsecond.
+        """
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return f"log-{stamp}-{getpid()}-{uuid4().hex[:8]}.csv"
+
+    def write(self, message):
+        """Writes the specified message and a newline to the log."""
+
+        self._f.write(message + "\n")
+        self._unflushed += 1
+        if (self._unflushed >= MatchLog.FLUSH_LINES):
+            self._f.flush()
+            self._unflushed = 0
+
+    def close(self):
+        """Flushes the log to disk and closes it. Safe to call twice."""
+
+        if (not self._f.closed):
+            self._f.close()
@@ -27,17 +27,16 @@ class Move():
             return False
 
         # tile is empty and colour corresponds to current player
-        tile = b.get_tiles()[self.x][self.y]
-        return tile.get_colour() is None and colour == self.colour
+        return (b.get_tile_colour(self.x, self.y) is None and
+                colour == self.colour)
 
     def is_swap(self):
         # a swap move is defined as -1,-1
         return self.x == -1 and self.y == -1
 
     def move(self, b):
-        # fill the tile
-        tile = b.get_tiles()[self.x][self.y]
-        tile.set_colour(self.colour)
+        # fill the tile through the board so its win tracking stays current
+        b.set_tile_colour(self.x, self.y, self.colour)
 
     def get_x(self):
         return self.x
@@ -1,36 +1,265 @@
+import os
+import secrets
 import socket
 import subprocess
 from sys import platform, stdout
+from threading import Event, Lock, Thread
 from time import time_ns
 from Colour import Colour
 import shlex
 
 
-class Protocol():
-    """Static class that handles protocol communication between engine and
-    agents. Uses a TCP socket.
+# longest time a connection may take to send its token, in seconds
+TOKEN_TIMEOUT = 5
+
+
+def start_agent(run_s, port, silent=True, token=None):
+    """Starts an agent subprocess from its run string, telling it which
+    port to connect to through the HEX_PORT environment variable, and
+    the token to send once connected, if any, through HEX_TOKEN.
     """
 
-    HOST = "127.0.0.1"
-    PORT = 1234
-    s = None
-    sockets = {Colour.RED: {}, Colour.BLUE: {}}
+    # separate run_s into a list of arguments to be used in a linux shell
+    if (platform != "win32"):
+        run_s = shlex.split(run_s)
 
-    @staticmethod
-    def start():
+    # whether to throw out all output of the agent
+    # used to ease the screen clutter during the tournament
+    output = stdout
+    if (silent):
+        output = subprocess.DEVNULL
+
+    env = dict(os.environ, HEX_PORT=str(port))
+    env.pop("HEX_TOKEN", None)
+    if (token is not None):
+        env["HEX_TOKEN"] = token
+    return subprocess.Popen(
+        run_s, stdout=output, stderr=output, shell=False, env=env
+    )
+
+
+class MessageReader():
+    """Reads newline-terminated messages from one connection.
+
+    Data is received in large chunks into a buffer, so several messages
+    sent back to back cost a single recv() and a message split across
+    reads is put back together. Anything left after the first newline is
+    kept for the next read.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, conn, max_length=1024):
+        self.conn = conn
+        self.max_length = max_length
+        self._buffer = bytearray()
+        self._chunk = bytearray(MessageReader.CHUNK_SIZE)
+
+    def read(self, timeout_ns=30*10**9):
+        """Returns the next message with its newline, waiting at most
+        timeout_ns for it. A message longer than max_length is returned as
+        soon as that many bytes are in, cut at max_length, so that it can
+        be rejected. If the connection closes, whatever was received is
+        returned, possibly nothing. Raises socket.timeout if no complete
+        message arrives in time.
+        """
+
+        deadline = time_ns() + timeout_ns
+        buffer = self._buffer
+        start = 0  # where to look for a newline
+        while True:
+            end = buffer.find(b"\n", start)
+            if (end != -1 and end < self.max_length):
+                return self._take(end + 1)
+            if (len(buffer) >= self.max_length):
+                return self._take(self.max_length)
+            start = len(buffer)
+
+            remaining = deadline - time_ns()
+            if (remaining <= 0):
+                raise socket.timeout()
+            self.conn.settimeout(remaining/10**9)
+            size = self.conn.recv_into(self._chunk)
+            if (size == 0):
+                return self._take(len(buffer))
+            buffer += memoryview(self._chunk)[:size]
+
+    def _take(self, size):
+        message = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return message
+
+
+class Listener():
+    """A TCP server socket that agents connect to. One listener can be
+    shared by the protocols of many games in the same process.
+
+    A listener created with tokens=False hands the next connection to the
+    agent launched last, so it must not launch an agent before the
+    previous one connected or timed out: launches are done one at a time
+    under a lock. This is what a game with its own listener needs, and
+    agents are not required to do anything but connect.
+
+    A shared listener must be created with tokens=True. Every agent it
+    launches is then given a random token in the HEX_TOKEN environment
+    variable, and must send it as its first line once connected. A thread
+    accepts all connections and hands each one to the launch that gave
+    out its token, so launches run concurrently and a connection can only
+    reach the game that started its agent. Connections with an unknown
+    token, or that arrive after their launch timed out, are closed.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1234, tokens=False):
         """Sets up a TCP server. The socket reuse address option is
         enabled because Linux does not close sockets immediately on
         application exit. This would cause issues with successive
         matches.
         """
 
-        Protocol.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        Protocol.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        Protocol.s.bind((Protocol.HOST, Protocol.PORT))
-        Protocol.s.listen()
+        self.host = host
+        self.port = port
+        self.tokens = tokens
+        self._lock = Lock()
+        self._pending = {}  # token -> [event, conn, addr] of each launch
+
+        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.s.bind((host, port))
+        self.s.listen()
+
+        if (tokens):
+            Thread(target=self._accept_loop, daemon=True).start()
+
+    def launch(self, run_s, timeout_ns=30*10**9, silent=True):
+        """Starts a subprocess with the specified string then waits for
+        the new process to connect. Returns the process, the connection and
+        the address, with the connection and address set to None if the
+        agent did not connect in time.
+        """
+
+        if (self.tokens):
+            return self._launch_with_token(run_s, timeout_ns, silent)
+
+        with self._lock:
+            t = start_agent(run_s, self.port, silent)
+
+            # wait for a connection
+            try:
+                self.s.settimeout(timeout_ns/10**9)
+                conn, addr = self.s.accept()
+            except socket.timeout:
+                conn, addr = None, None
+            finally:
+                self.s.settimeout(socket.getdefaulttimeout())
+
+        return t, conn, addr
+
+    def _launch_with_token(self, run_s, timeout_ns, silent):
+        token = secrets.token_hex(16)
+        pending = [Event(), None, None]
+        with self._lock:
+            self._pending[token] = pending
+
+        t = start_agent(run_s, self.port, silent, token)
+        pending[0].wait(timeout_ns/10**9)
+
+        # a connection identified from now on is closed as late
+        with self._lock:
+            del self._pending[token]
+
+        return t, pending[1], pending[2]
+
+    def _accept_loop(self):
+        """Accepts connections until the listener is closed, identifying
+        each one on its own thread.
+        """
+
+        while True:
+            try:
+                conn, addr = self.s.accept()
+            except OSError:
+                return
+            Thread(target=self._identify, args=(conn, addr), daemon=True).start()
+
+    def _identify(self, conn, addr):
+        """Reads the token a connection sends first and hands the
+        connection to its launch, or closes it. The token is read byte by
+        byte so that nothing sent after it is taken from the game.
+        """
+
+        token = bytearray()
+        try:
+            conn.settimeout(TOKEN_TIMEOUT)
+            while (len(token) <= 64):
+                byte = conn.recv(1)
+                if (byte in (b"", b"\n")):
+                    break
+                token += byte
+            conn.settimeout(socket.getdefaulttimeout())
+        except OSError:
+            pass
+
+        with self._lock:
+            pending = self._pending.get(token.decode("utf-8", "replace").strip())
+            if (pending is not None and pending[1] is None):
+                pending[1], pending[2] = conn, addr
+                pending[0].set()
+                return
+        conn.close()
+
+    def close(self):
+        if (self.tokens):
+            # wakes up the accept loop, which closing alone does not
+            try:
+                self.s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.s.close()
+
+
+class Protocol():
+    """Handles protocol communication between the engine and the two agents
+    of one game. Uses a TCP socket, either its own or a listener shared
+    with other games.
+    """
+
+    HOST = "127.0.0.1"
+    PORT = 1234
+    # longest message accepted from an agent, newline included, on boards
+    # small enough for it; see message_limit()
+    MAX_MESSAGE_LENGTH = 1024
+
+    def __init__(self, port=None, listener=None,
+                 max_length=MAX_MESSAGE_LENGTH):
+        self.port = Protocol.PORT if port is None else port
+        self.s = listener  # created in start() unless shared
+        self.sockets = {Colour.RED: {}, Colour.BLUE: {}}
+        self.max_length = max_length
+
+        self._owns_listener = listener is None
+        if (listener is not None):
+            self.port = listener.port
 
     @staticmethod
+    def message_limit(board_size):
+        """Returns the longest message accepted from an agent on a board of
+        the given size, newline included: MAX_MESSAGE_LENGTH, or on large
+        boards enough for a message carrying the whole board, which has
+        n*n tiles and n-1 commas, with 64 bytes to spare for other fields.
+        """
+
+        return max(Protocol.MAX_MESSAGE_LENGTH, board_size*(board_size+1) + 64)
+
+    def start(self):
+        """Sets up the TCP server, unless this protocol uses a shared
+        listener.
+        """
+
+        if (self._owns_listener):
+            self.s = Listener(Protocol.HOST, self.port)
+
     def accept_connection(
+        self,
         run_s,
         name,
         timeout_ns=30*10**9,
@@ -42,97 +271,74 @@ class Protocol():
         was made, False otherwise.
         """
 
-        # separate run_s into a list of arguments to be used in a linux shell
-        if (platform != "win32"):
-            run_s = shlex.split(run_s)
-
         # determine the colour of the new agent
-        if len(Protocol.sockets[Colour.RED].keys()) == 0:
+        if len(self.sockets[Colour.RED].keys()) == 0:
             colour = Colour.RED
-        elif len(Protocol.sockets[Colour.BLUE].keys()) == 0:
+        elif len(self.sockets[Colour.BLUE].keys()) == 0:
             colour = Colour.BLUE
         else:
             raise ValueError("Too many agents specified.")
 
-        # whether to throw out all output of the agent
-        # used to ease the screen clutter during the tournament
-        output = stdout
-        if (silent):
-            output = subprocess.DEVNULL
-
-        # start the agent
-        t = subprocess.Popen(run_s, stdout=output, stderr=output, shell=False)
-
-        # wait for a connection
-        try:
-            Protocol.s.settimeout(timeout_ns/10**9)
-            conn, addr = Protocol.s.accept()
-            Protocol.s.settimeout(socket.getdefaulttimeout())
-            if verbose:
+        t, conn, addr = self.s.launch(run_s, timeout_ns, silent)
+        if (verbose):
+            if (conn is not None):
                 print(f"Connected {name} at {addr}")
-        except socket.timeout:
-            conn, addr = None, None
-            if (verbose):
+            else:
                 print(f"{name} never connected.")
 
         # set up associated arguments
-        Protocol.sockets[colour]['name'] = name
-        Protocol.sockets[colour]['thread'] = t
-        Protocol.sockets[colour]['conn'] = conn
-        Protocol.sockets[colour]['addr'] = addr
+        self.sockets[colour]['name'] = name
+        self.sockets[colour]['thread'] = t
+        self.sockets[colour]['conn'] = conn
+        self.sockets[colour]['addr'] = addr
+        self.sockets[colour]['reader'] = None
+        if (conn is not None):
+            self.sockets[colour]['reader'] = MessageReader(
+                conn, self.max_length
+            )
 
         return conn is not None
 
-    @staticmethod
-    def get_message(colour, timeout_ns=30*10**9, verbose=False):
+    def get_message(self, colour, timeout_ns=30*10**9, verbose=False):
         """Waits for a message from the given colour agent for the specified
         length of time. Returns the text and the associated wait time.
+        Messages end with a newline; one that was already received, such
+        as a move sent ahead of time, is returned at once.
         """
 
+        agent = self.sockets[colour]
         try:
-            Protocol.sockets[colour]['conn'].settimeout(timeout_ns/10**9)
             move_time = time_ns()
-            data = Protocol.sockets[colour]['conn'].recv(1024)
+            data = agent['reader'].read(timeout_ns)
             move_time = time_ns() - move_time
-            Protocol.sockets[colour]['conn'].settimeout(
-                socket.getdefaulttimeout()
-            )
+            agent['conn'].settimeout(socket.getdefaulttimeout())
 
         except socket.timeout:
             if verbose:
-                print(
-                    f"{Protocol.sockets[colour]['name']} timed out. " +
-                    "Nothing received."
-                )
+                print(f"{agent['name']} timed out. Nothing received.")
             return ("NO MESSAGE", -1)
         except ConnectionResetError:
             if verbose:
-                print(
-                    f"{Protocol.sockets[colour]['name']} disconnected early.")
+                print(f"{agent['name']} disconnected early.")
             return ("NO MESSAGE", -1)
         except Exception:
             if verbose:
-                print(
-                    f"{Protocol.sockets[colour]['name']} socket " +
-                    "ended unexpectedly."
-                )
+                print(f"{agent['name']} socket ended unexpectedly.")
             return ("NO MESSAGE", -1)
 
         if verbose:
             print(
-                f"Received {data.decode('utf-8').strip()} from " +
-                f"{Protocol.sockets[colour]['name']} in " +
-                f"~{int(move_time/10**4)/10**5}s."
+                f"Received {data.decode('utf-8', 'replace').strip()} from " +
+                f"{agent['name']} in ~{int(move_time/10**4)/10**5}s."
             )
 
-        return (data.decode("utf-8"), move_time)
+        return (data.decode("utf-8", "replace"), move_time)
 
-    @staticmethod
-    def send_message(colour, message, verbose=False):
+    def send_message(self, colour, message, verbose=False):
         """Sends the specified message to the specified colour agent."""
 
         try:
-            Protocol.sockets[colour]['conn'].sendall(bytes(message, "utf-8"))
+            self.sockets[colour]['conn'].sendall(bytes(message, "utf-8"))
             if verbose:
                 print("Sent", message, end="")
 
@@ -140,26 +346,24 @@ class Protocol():
             if verbose:
                 print(
                     f"Failed to send {message.strip()} to " +
-                    f"{Protocol.sockets[colour]['name']}."
+                    f"{self.sockets[colour]['name']}."
                 )
 
-    @staticmethod
-    def swap():
+    def swap(self):
         """Switches the colours of the two agents."""
 
-        Protocol.sockets[Colour.RED], Protocol.sockets[Colour.BLUE] = \
-            Protocol.sockets[Colour.BLUE], Protocol.sockets[Colour.RED]
+        self.sockets[Colour.RED], self.sockets[Colour.BLUE] = \
+            self.sockets[Colour.BLUE], self.sockets[Colour.RED]
 
-    @staticmethod
-    def close(kill_children=True, verbose=False):
+    def close(self, kill_children=True, verbose=False):
         """Closes the connection. If kill_children=True, it will also forcibly
         terminate the agents. Otherwise, it will block the thread until they
-        have terminated on their own.
+        have terminated on their own. A shared listener is left open.
         """
 
         # close sockets and agents
         for colour in Colour:
-            x = Protocol.sockets[colour]
+            x = self.sockets[colour]
             if (len(x.keys()) == 0):
                 continue
 
@@ -187,8 +391,10 @@ class Protocol():
                         f"{x['name']} connection was already closed.")
 
         # close server
+        if (not self._owns_listener):
+            return
         try:
-            Protocol.s.close()
+            self.s.close()
         except AttributeError:
             if (verbose):
                 print("Socket was not open.")
@@ -201,14 +407,15 @@ if __name__ == "__main__":
         "python agents/NaiveAgent.py"
     ]
 
-    Protocol.start()
+    p = Protocol()
+    p.start()
 
-    Protocol.accept_connection(commands[2], verbose=True)
-    Protocol.accept_connection(commands[2], verbose=True)
-    Protocol.send_message(Colour.RED, "START;2;R", verbose=True)
-    Protocol.get_message(Colour.RED, verbose=True)
-    Protocol.send_message(Colour.BLUE, "START;2;B", verbose=True)
-    Protocol.send_message(Colour.RED, "END", verbose=True)
-    Protocol.send_message(Colour.BLUE, "END", verbose=True)
+    p.accept_connection(commands[2], "Alice", verbose=True)
+    p.accept_connection(commands[2], "Bob", verbose=True)
+    p.send_message(Colour.RED, "START;2;R", verbose=True)
+    p.get_message(Colour.RED, verbose=True)
+    p.send_message(Colour.BLUE, "START;2;B", verbose=True)
+    p.send_message(Colour.RED, "END", verbose=True)
+    p.send_message(Colour.BLUE, "END", verbose=True)
 
-    Protocol.close()
+    p.close()
@@ -0,0 +1,369 @@
+"""Compact binary records of Hex matches.
+
+An archive is a file holding a short header followed by any number of
+game records, one after another. All numbers are little-endian.
+
+* Archive header: the magic bytes "HEXR" followed by a version byte and
+three zero bytes.
+* Record header (16 bytes): board size (uint16), flags (uint8, bit 0 set
+if a swap took place), end state (uint8, see END_STATES), winner (uint8:
+0 for none, 1 for the first player, 2 for the second), one zero byte, the
+byte lengths of both player names (uint16 each), and the number of moves
+(uint32).
+* The two player names, UTF-8 encoded. The first player started as Red.
+* One uint16 per move: the cell index x*n+y, SWAP for a swap or ILLEGAL
+for a message that was not a move. Players alternate, starting with
+the first player.
+* One int64 per move: the time taken by the move in nanoseconds.
+
+Run as a script to convert CSV logs or to print an archive:
+    python src/Record.py convert archive.hexr logs/*.csv
+    python src/Record.py dump archive.hexr
+"""
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from sys import argv, byteorder
+
+from EndState import EndState
+
+
+MAGIC = b"HEXR"
+VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<4sB3x")
+RECORD_HEADER = struct.Struct("<HBBBxHHI")
+
+# move codes that are not cells; cells fit below them up to 255x255
+SWAP = 0xFFFF
+ILLEGAL = 0xFFFE
+MAX_BOARD_SIZE = 255
+
+END_STATES = (None, EndState.WIN, EndState.TIMEOUT, EndState.BAD_MOVE)
+
+
+class GameRecord():
+    """The record of one match: who played, every move with its time, and
+    how the match ended.
+    """
+
+    __slots__ = (
+        "board_size", "players", "moves", "times", "swapped", "end_state",
+        "winner"
+    )
+
+    def __init__(
+        self,
+        board_size,
+        players,
+        moves=None,
+        times=None,
+        swapped=False,
+        end_state=None,
+        winner=None
+    ):
+        self.board_size = board_size
+        self.players = tuple(players)  # (first player, second player)
+        self.moves = array("H", moves or [])  # cell indices or codes
+        self.times = array("q", times or [])  # nanoseconds per move
+        self.swapped = swapped
+        self.end_state = end_state  # an EndState, or None if unknown
+        # 1 if the first player won, 2 if the second, None if unknown; a
+        # number, as both players may have the same name
+        self.winner = winner
+
+    def add_move(self, x, y, move_time):
+        """Appends a move given as in the protocol: -1,-1 for a swap and
+        anything off the board for an illegal message.
+        """
+
+        n = self.board_size
+        if (x == -1 and y == -1):
+            code = SWAP
+        elif (0 <= x < n and 0 <= y < n):
+            code = x * n + y
+        else:
+            code = ILLEGAL
+
+        self.moves.append(code)
+        self.times.append(max(move_time, 0))
+
+    def get_moves(self):
+        """Returns the moves as (player, x, y, time) tuples, with x,y being
+        -1,-1 for a swap and -2,-2 for an illegal message.
+        """
+
+        n = self.board_size
+        moves = []
+        for idx, (code, t) in enumerate(zip(self.moves, self.times)):
+            if (code == SWAP):
+                x, y = -1, -1
+            elif (code == ILLEGAL):
+                x, y = -2, -2
+            else:
+                x, y = divmod(code, n)
+            moves.append((self.players[idx % 2], x, y, t))
+        return moves
+
+    def to_bytes(self):
+        """Packs the record in the archive format."""
+
+        if (self.board_size > MAX_BOARD_SIZE):
+            raise ValueError(
+                f"Boards above {MAX_BOARD_SIZE}x{MAX_BOARD_SIZE} " +
+                "cannot be recorded."
+            )
+
+        names = [name.encode("utf-8") for name in self.players]
+        winner = 0 if self.winner is None else self.winner
+
+        moves, times = self.moves, self.times
+        if (byteorder != "little"):
+            moves, times = array("H", moves), array("q", times)
+            moves.byteswap()
+            times.byteswap()
+
+        return b"".join([
+            RECORD_HEADER.pack(
+                self.board_size, int(self.swapped),
+                END_STATES.index(self.end_state), winner,
+                len(names[0]), len(names[1]), len(self.moves)
+            ),
+            names[0], names[1], moves.tobytes(), times.tobytes()
+        ])
+
+    @staticmethod
+    def from_buffer(buffer, offset=0):
+        """Unpacks the record that starts at offset in a bytes-like
+        buffer. Returns the record and the offset of the next one.
+        """
+
+        (board_size, flags, end_state, winner, len1, len2,
+         n_moves) = RECORD_HEADER.unpack_from(buffer, offset)
+        offset += RECORD_HEADER.size
+
+        view = memoryview(buffer)
+        players = (
+            bytes(view[offset:offset+len1]).decode("utf-8"),
+            bytes(view[offset+len1:offset+len1+len2]).decode("utf-8")
+        )
+        offset += len1 + len2
+
+        moves = array("H")
+        moves.frombytes(view[offset:offset + 2*n_moves])
+        offset += 2*n_moves
+        times = array("q")
+        times.frombytes(view[offset:offset + 8*n_moves])
+        offset += 8*n_moves
+        if (byteorder != "little"):
+            moves.byteswap()
+            times.byteswap()
+
+        record = GameRecord(
+            board_size, players, swapped=bool(flags & 1),
+            end_state=END_STATES[end_state],
+            winner=None if winner == 0 else winner
+        )
+        record.moves, record.times = moves, times
+        return record, offset
+
+
+class RecordWriter():
+    """Appends game records to an archive, creating it if needed.
+
+    Each record is written with a single write to a file opened in append
+    mode, so several engines can add to the same archive at once. A new
+    archive is written with its header to a temporary file first, then
+    linked into place, which fails if another engine created the archive
+    meanwhile; so an archive never exists without its header, and gets it
+    only once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if (not os.path.exists(path)):
+            RecordWriter._create(path)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    @staticmethod
+    def _create(path):
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path))
+        )
+        try:
+            os.write(fd, ARCHIVE_HEADER.pack(MAGIC, VERSION))
+            os.close(fd)
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass  # created by another engine
+        finally:
+            os.remove(temp_path)
+
+    def write(self, record):
+        os.write(self._fd, record.to_bytes())
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _check_header(buffer):
+    magic, version = ARCHIVE_HEADER.unpack_from(buffer, 0)
+    if (magic != MAGIC or version != VERSION):
+        raise ValueError("Not a Hex record archive.")
+
+
+def read_records(path):
+    """Streams the records of an archive one at a time, reading only as
+    much of the file as each record needs.
+    """
+
+    with open(path, "rb") as f:
+        _check_header(f.read(ARCHIVE_HEADER.size))
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if (len(header) < RECORD_HEADER.size):
+                return
+
+            fields = RECORD_HEADER.unpack(header)
+            n_moves = fields[-1]
+            body = f.read(fields[-3] + fields[-2] + 10*n_moves)
+            yield GameRecord.from_buffer(header + body)[0]
+
+
+class RecordArchive():
+    """Random access to the records of an archive through a memory map.
+    Opening the archive only scans the record headers to find where each
+    record starts; records are unpacked when they are indexed.
+    """
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._map = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self._map)
+
+        self._offsets = []
+        offset = ARCHIVE_HEADER.size
+        while (offset + RECORD_HEADER.size <= len(self._map)):
+            self._offsets.append(offset)
+            fields = RECORD_HEADER.unpack_from(self._map, offset)
+            offset += (
+                RECORD_HEADER.size + fields[-3] + fields[-2] + 10*fields[-1]
+            )
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, idx):
+        return GameRecord.from_buffer(self._map, self._offsets[idx])[0]
+
+    def __iter__(self):
+        for offset in self._offsets:
+            yield GameRecord.from_buffer(self._map, offset)[0]
+
+    def close(self):
+        self._map.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def from_csv(path):
+    """Converts a CSV match log written by the engine into a record."""
+
+    with open(path) as f:
+        lines = [line.rstrip("\n") for line in f]
+
+    board_size = int(lines[1].split(" ")[2].split("x")[0])
+    players = []
+    totals = []  # names in the per-player totals
+    moves = []
+    swapped = False
+    end_state = None
+    winner = None
+
+    for line in lines[3:]:
+        if (line == ""):
+            continue
+        row = line.split(",")
+        if (row[0] != "0"):
+            # No,Player,X,Y,Time; an illegal message may contain commas
+            name, x, y, t = row[1], row[2], ",".join(row[3:-1]), row[-1]
+            # players alternate, so the first two moves name both players
+            if (len(moves) < 2):
+                players.append(name)
+            if (x == "-1" and y == "SWAP"):
+                moves.append((-1, -1, int(t)))
+            elif (x == "-2"):
+                moves.append((-2, -2, int(t)))
+            else:
+                moves.append((int(x), int(y), int(t)))
+        elif (len(row) > 2 and row[2] == "End"):
+            for state in EndState:
+                if (EndState.get_text(state) == row[3]):
+                    end_state = state
+            if (end_state is not None):
+                winner = row[1]
+            swapped = len(row) > 4 and row[4] == "True"
+        elif (row[1] != "Total"):
+            totals.append(row[1])
+
+    # per-player totals name players that never moved
+    for name in players:
+        if (name in totals):
+            totals.remove(name)
+    players += totals[:2 - len(players)]
+
+    # the log names the winner; if both players have that name, the
+    # winner made the last move of a win, and the loser the last move
+    # (or the message that timed out) otherwise
+    if (winner is not None):
+        if (players[0] != players[1]):
+            winner = players.index(winner) + 1
+        elif (end_state == EndState.WIN):
+            winner = (len(moves) - 1) % 2 + 1
+        else:
+            winner = len(moves) % 2 + 1
+
+    # the player who moved first started as Red
+    record = GameRecord(
+        board_size, players, swapped=swapped, end_state=end_state,
+        winner=winner
+    )
+    for x, y, t in moves:
+        record.add_move(x, y, t)
+    return record
+
+
+if (__name__ == "__main__"):
+    if (len(argv) >= 3 and argv[1] == "convert"):
+        with RecordWriter(argv[2]) as w:
+            for log in argv[3:]:
+                w.write(from_csv(log))
+        print(f"Converted {len(argv) - 3} logs into {argv[2]}")
+
+    elif (len(argv) == 3 and argv[1] == "dump"):
+        for record in read_records(argv[2]):
+            print(
+                f"{record.board_size}x{record.board_size} " +
+                f"{record.players[0]} vs {record.players[1]}: " +
+                f"{EndState.get_text(record.end_state)}, " +
+                "winner " + (
+                    "None" if record.winner is None
+                    else record.players[record.winner - 1]
+                ) + f", {len(record.moves)} moves, " +
+                f"swap {record.swapped}"
+            )
+
+    else:
+        print(__doc__)
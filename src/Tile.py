@@ -2,7 +2,13 @@ from Colour import Colour
 
 
 class Tile:
-    """The class representation of a tile on a board of Hex."""
+    """The class representation of a tile on a board of Hex.
+
+    A tile created with a board is a lightweight view: its colour and
+    visited status are read from and written to that board's cell arrays.
+    """
+
+    __slots__ = ("x", "y", "_colour", "_visited", "_board")
 
     # number of neighbours a tile has
     NEIGHBOUR_COUNT = 6
@@ -11,14 +17,15 @@ class Tile:
     I_DISPLACEMENTS = [-1, -1, 0, 1, 1, 0]
     J_DISPLACEMENTS = [0, 1, 1, 0, -1, -1]
 
-    def __init__(self, x, y, colour=None):
+    def __init__(self, x, y, colour=None, board=None):
         super().__init__()
 
         self.x = x
         self.y = y
-        self.colour = colour
+        self._board = board
 
-        self.visited = False
+        self._colour = colour
+        self._visited = False
 
     def get_x(self):
         return self.x
@@ -27,16 +34,29 @@ class Tile:
         return self.y
 
     def set_colour(self, colour):
-        self.colour = colour
+        if (self._board is not None):
+            self._board.set_tile_colour(self.x, self.y, colour)
+        else:
+            self._colour = colour
 
     def get_colour(self):
-        return self.colour
+        if (self._board is not None):
+            return self._board.get_tile_colour(self.x, self.y)
+        return self._colour
 
     def visit(self):
-        self.visited = True
+        if (self._board is not None):
+            self._board.visit(self.x, self.y)
+        else:
+            self._visited = True
 
     def is_visited(self):
-        return self.visited
+        if (self._board is not None):
+            return self._board.is_visited(self.x, self.y)
+        return self._visited
 
     def clear_visit(self):
-        self.visited = False
+        if (self._board is not None):
+            self._board.clear_visit(self.x, self.y)
+        else:
+            self._visited = False
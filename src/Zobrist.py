@@ -0,0 +1,56 @@
+import random
+
+
+# fixed, so that every process and every copy of a board use the same keys;
+# agents/Group014/src14/Zobrist.py copies this module and must stay equal
+SEED = 0x4E58
+
+# keys are 63 bits, so that a key and any XOR of keys fits in a signed
+# 64-bit integer, as in a NumPy int64 array
+KEY_BITS = 63
+
+# key tables are shared between all boards of the same size
+_TABLES = {}
+
+
+class ZobristTable:
+    """Random keys for Zobrist hashing of a Hex board of one size.
+
+    A position's key is the XOR of the keys of its stones, red[idx] or
+    blue[idx] for the stone at flat index idx = x*n+y, and of the swap key
+    once the pie rule has been used. Placing a stone or swapping XORs a
+    single key into the position's key, so boards keep theirs up to date
+    in constant time. The empty board has key 0.
+    """
+
+    __slots__ = ("board_size", "red", "blue", "swap")
+
+    def __init__(self, board_size):
+        rng = random.Random(SEED * 1000 + board_size)
+        cells = board_size * board_size
+
+        self.board_size = board_size
+        self.red = tuple(rng.getrandbits(KEY_BITS) for _ in range(cells))
+        self.blue = tuple(rng.getrandbits(KEY_BITS) for _ in range(cells))
+        self.swap = rng.getrandbits(KEY_BITS)
+
+    def position_key(self, red_cells, blue_cells, swapped=False):
+        """Returns the key of the position with stones on the given flat
+        indices, computed from scratch.
+        """
+
+        key = self.swap if swapped else 0
+        for idx in red_cells:
+            key ^= self.red[idx]
+        for idx in blue_cells:
+            key ^= self.blue[idx]
+        return key
+
+
+def zobrist_table(board_size):
+    """Returns the key table for the board size, created on first use."""
+
+    if (board_size not in _TABLES):
+        _TABLES[board_size] = ZobristTable(board_size)
+
+    return _TABLES[board_size]
@@ -3,12 +3,21 @@
 This is effectively what starts the game. This script may work when run
 directly, with the same specification as Hex.py, but it is not recommended.
 """
+import signal
 from sys import argv, platform
 from os.path import realpath, sep
 
 from Game import Game
 
 
+def terminate(signum, frame):
+    """Turns SIGTERM into an exception, so that the game ends through its
+    error path and the log is saved before the engine exits.
+    """
+
+    raise SystemExit(f"Terminated by signal {signum}")
+
+
 def main():
     verbose = ("-v" in argv or "-verbose" in argv)
     log = ("-l" in argv or "-log" in argv)
@@ -17,8 +26,13 @@ def main():
     silent_bots = ("-sb" in argv or "-silent_bots" in argv)
     java_ref_agent = ("-j" in argv or "-java" in argv)
     double = ("-d" in argv or "-double" in argv)
+    use_async = ("-async" in argv)
+    delta = ("-delta" in argv)
 
     board_size = 11
+    port = None
+    record = None
+    resync = 0
     agents = []
 
     for argument in argv:
@@ -35,6 +49,26 @@ def main():
                     "format. Aborted."
                 )
                 return
+        if (argument.startswith("port=")):
+            try:
+                port = int(argument.split("=")[1])
+                if (port < 1 or port > 65535):
+                    raise Exception("Port out of range.")
+            except Exception as e:
+                print("ERROR: Port argument is not in valid format. Aborted.")
+                return
+        if (argument.startswith("record=")):
+            record = argument.split("=", 1)[1]
+        if (argument.startswith("resync=")):
+            try:
+                resync = int(argument.split("=")[1])
+                if (resync < 0):
+                    raise Exception("Negative resync interval.")
+            except Exception as e:
+                print(
+                    "ERROR: Resync argument is not in valid format. Aborted."
+                )
+                return
 
     if (len(agents) > 2):
         print("ERROR: Too many agents specified. Aborted.")
@@ -73,7 +107,8 @@ def main():
                 print("NOTICE: Java reference agent was selected.")
                 agent_dir = sep.join(realpath(__file__).split(sep)[:-2])
                 agent_dir += f"{sep}agents{sep}DefaultAgents"
-                agent_cmd = f"java -classpath {agent_dir} NaiveAgent"
+                # run from source (JDK 11+) so no stale .class is used
+                agent_cmd = f"java {agent_dir}{sep}NaiveAgent.java"
 
             
             for idx in range(2-len(agents)):
@@ -95,16 +130,30 @@ def main():
     if ("-switch" in argv or "-s" in argv):
         player1, player2 = player2, player1
 
-    g = Game(
+    game_class = Game
+    if (use_async):
+        # asyncio is only loaded for asynchronous games
+        from AsyncGame import AsyncGame
+        game_class = AsyncGame
+    g = game_class(
         board_size=board_size,
         player1=player1, player2=player2,
         verbose=verbose,
         log=log,
         print_protocol=print_protocol,
         kill_bots=kill_bots,
-        silent_bots=silent_bots
+        silent_bots=silent_bots,
+        port=port,
+        record=record,
+        delta=delta,
+        resync=resync
     )
-    g.run()
+    signal.signal(signal.SIGTERM, terminate)
+    if (use_async):
+        import asyncio
+        asyncio.run(g.run())
+    else:
+        g.run()
 
 
 if __name__ == "__main__":
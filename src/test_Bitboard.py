@@ -0,0 +1,34 @@
+"""Tests that the bitboard backend of Board agrees with the connectivity
+sets and with a full search of the board, see Bitboard.cross_check.
+
+Run from the repository root with: python -m unittest discover -s src
+"""
+import unittest
+
+from Bitboard import cross_check
+from Board import Board
+from Colour import Colour
+
+
+class TestBitboard(unittest.TestCase):
+
+    def test_cross_check(self):
+        for n in (1, 2, 3, 5, 11):
+            with self.subTest(board_size=n):
+                self.assertGreater(cross_check(n, games=10, seed=n), 0)
+
+    def test_edges(self):
+        # Red joins top and bottom, Blue left and right
+        for colour, tiles in (
+            (Colour.RED, [(x, 1) for x in range(3)]),
+            (Colour.BLUE, [(1, y) for y in range(3)])
+        ):
+            b = Board(3, bitboard=True)
+            for x, y in tiles:
+                self.assertFalse(b.has_ended())
+                b.set_tile_colour(x, y, colour)
+            self.assertEqual(b.get_winner(), colour)
+
+
+if (__name__ == "__main__"):
+    unittest.main()
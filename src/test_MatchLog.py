@@ -0,0 +1,84 @@
+"""Tests for MatchLog: unique file names when many engines log into the
+same directory at once, and flushing during the game.
+
+Run from the repository root with: python -m unittest discover -s src
+"""
+import multiprocessing as mp
+import os
+import tempfile
+import unittest
+
+from MatchLog import MatchLog
+
+
+def write_logs(directory, count, board_size):
+    """Creates count logs in directory, as one engine process would."""
+
+    for i in range(count):
+        log = MatchLog(directory, board_size)
+        log.write(f"{i},{os.getpid()}")
+        log.close()
+
+
+class TestMatchLog(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.directory = self._dir.name
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_concurrent_engines_get_their_own_files(self):
+        processes, count = 8, 25
+        workers = [
+            mp.Process(target=write_logs, args=(self.directory, count, 11))
+            for _ in range(processes)
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), processes * count)
+        for name in names:
+            with open(os.path.join(self.directory, name)) as f:
+                lines = f.read().split("\n")
+            # the three start lines, one line of the match and the newline
+            self.assertEqual(len(lines), 5)
+            self.assertEqual(lines[1], "Board is 11x11.")
+
+    def test_names_sort_by_creation(self):
+        logs = [MatchLog(self.directory, 5) for _ in range(20)]
+        for log in logs:
+            log.close()
+
+        paths = [log.path for log in logs]
+        self.assertEqual(len(set(paths)), len(paths))
+        stamps = [os.path.basename(p).split("-")[1:4] for p in paths]
+        self.assertEqual(stamps, sorted(stamps))
+
+    def test_flushed_during_the_game(self):
+        log = MatchLog(self.directory, 5)
+        # the three start lines count towards the first flush
+        moves = MatchLog.FLUSH_LINES - 3
+        for i in range(moves):
+            log.write(f"{i},Red,0,0,1")
+
+        # on disk before the log is closed
+        with open(log.path) as f:
+            lines = f.read().split("\n")
+        self.assertEqual(len(lines), MatchLog.FLUSH_LINES + 1)
+        self.assertEqual(lines[-2], f"{moves - 1},Red,0,0,1")
+
+        log.write(f"{moves},Red,0,0,1")
+        log.close()
+        with open(log.path) as f:
+            self.assertIn(f"{moves},Red", f.read())
+        log.close()  # closing twice is allowed
+
+
+if (__name__ == "__main__"):
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Tests for the newline-framed readers of Protocol and AsyncProtocol and
+for the message length limit.
+
+Run from the repository root with: python -m unittest discover -s src
+"""
+import asyncio
+import socket
+import unittest
+
+from AsyncProtocol import AsyncProtocol
+from Board import Board
+from Protocol import MessageReader, Protocol
+
+
+class CountingSocket():
+    """Wraps a socket, counting the calls to recv_into."""
+
+    def __init__(self, s):
+        self.s = s
+        self.reads = 0
+
+    def recv_into(self, buffer):
+        self.reads += 1
+        return self.s.recv_into(buffer)
+
+    def settimeout(self, timeout):
+        self.s.settimeout(timeout)
+
+
+class TestMessageReader(unittest.TestCase):
+
+    def setUp(self):
+        self.agent, engine = socket.socketpair()
+        self.engine = CountingSocket(engine)
+        self.reader = MessageReader(self.engine, 1024)
+
+    def tearDown(self):
+        self.agent.close()
+        self.engine.s.close()
+
+    def test_message_in_pieces(self):
+        self.agent.sendall(b"1")
+        self.agent.sendall(b"0,")
+        self.assertRaises(socket.timeout, self.reader.read, 10**7)
+
+        self.agent.sendall(b"3\n")
+        self.assertEqual(self.reader.read(10**9), b"10,3\n")
+
+    def test_messages_sent_together_cost_one_read(self):
+        self.agent.sendall(b"BOARD\n1,2\nSWAP\n")
+
+        self.assertEqual(self.reader.read(10**9), b"BOARD\n")
+        self.assertEqual(self.reader.read(10**9), b"1,2\n")
+        self.assertEqual(self.reader.read(10**9), b"SWAP\n")
+        self.assertEqual(self.engine.reads, 1)
+
+    def test_too_long_message_is_cut_without_waiting(self):
+        self.agent.sendall(b"X" * 2048)
+
+        self.assertEqual(self.reader.read(10**9), b"X" * 1024)
+
+    def test_newline_past_the_limit(self):
+        self.agent.sendall(b"X" * 1024 + b"\n")
+
+        self.assertEqual(self.reader.read(10**9), b"X" * 1024)
+
+    def test_closed_connection(self):
+        self.agent.sendall(b"1,")
+        self.agent.close()
+
+        self.assertEqual(self.reader.read(10**9), b"1,")
+        self.assertEqual(self.reader.read(10**9), b"")
+
+
+class TestAsyncReader(unittest.TestCase):
+
+    def read_all(self, data, max_length, count, limit=1024):
+        """Feeds data to a stream and reads count messages from it."""
+
+        async def read():
+            reader = asyncio.StreamReader(limit=limit)
+            reader.feed_data(data)
+            reader.feed_eof()
+            return [
+                await AsyncProtocol._read_message(reader, max_length)
+                for _ in range(count)
+            ]
+
+        return asyncio.run(read())
+
+    def test_messages_sent_together(self):
+        self.assertEqual(
+            self.read_all(b"BOARD\n1,2\n3", 1024, 3),
+            [b"BOARD\n", b"1,2\n", b"3"]
+        )
+
+    def test_too_long_message_is_cut(self):
+        self.assertEqual(self.read_all(b"X" * 3000, 1024, 1), [b"X" * 1024])
+
+    def test_game_limit_below_listener_limit(self):
+        # a shared listener reads up to its limit, the game cuts at its own
+        self.assertEqual(
+            self.read_all(b"X" * 1500 + b"\n", 1024, 1, limit=4096),
+            [b"X" * 1024]
+        )
+
+
+class TestMessageLimit(unittest.TestCase):
+
+    def test_small_boards_keep_the_limit(self):
+        for n in (1, 11, 30):
+            self.assertEqual(Protocol.message_limit(n), 1024)
+
+    def test_board_message_fits_on_large_boards(self):
+        for n in (31, 50, 100):
+            board = Board(n).print_board()
+            message = f"BOARD;{board};{n*n}:{2**32 - 1}\n"
+            self.assertLessEqual(len(message), Protocol.message_limit(n))
+
+            agent, engine = socket.socketpair()
+            with agent, engine:
+                agent.sendall(message.encode())
+                reader = MessageReader(engine, Protocol.message_limit(n))
+                self.assertEqual(reader.read(10**9), message.encode())
+
+
+if (__name__ == "__main__"):
+    unittest.main()
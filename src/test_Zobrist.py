@@ -0,0 +1,81 @@
+"""Tests that the Zobrist key a Board keeps up to date move by move is
+the key of its position computed from scratch.
+
+Run from the repository root with: python -m unittest discover -s src
+"""
+import importlib.util
+import unittest
+from os.path import dirname, join, realpath
+from random import Random
+
+from Board import Board
+from Colour import Colour
+from Zobrist import zobrist_table
+
+
+def recomputed(board, swapped):
+    """Returns the key of the board's position computed from its tiles."""
+
+    n = board.get_size()
+    red, blue = [], []
+    for x in range(n):
+        for y in range(n):
+            colour = board.get_tile_colour(x, y)
+            if (colour == Colour.RED):
+                red.append(x*n + y)
+            elif (colour == Colour.BLUE):
+                blue.append(x*n + y)
+    return zobrist_table(n).position_key(red, blue, swapped)
+
+
+class TestZobrist(unittest.TestCase):
+
+    def test_incremental_key_is_recomputed_key(self):
+        rng = Random(0)
+        for n in (1, 2, 5, 11):
+            b = Board(n)
+            swapped = False
+            self.assertEqual(b.hash(), 0)
+
+            # placements, recolourings, clearings and swaps in any order
+            for _ in range(20 * n * n):
+                if (rng.random() < 0.05):
+                    b.swap()
+                    swapped = not swapped
+                else:
+                    colour = rng.choice([Colour.RED, Colour.BLUE, None])
+                    b.set_tile_colour(
+                        rng.randrange(n), rng.randrange(n), colour
+                    )
+                self.assertEqual(b.hash(), recomputed(b, swapped))
+
+    def test_key_does_not_depend_on_move_order(self):
+        tiles = [(x, y) for x in range(5) for y in range(5)][:12]
+        keys = set()
+        for seed in range(5):
+            order = list(enumerate(tiles))
+            Random(seed).shuffle(order)
+            b = Board(5)
+            for i, (x, y) in order:
+                b.set_tile_colour(x, y, Colour.RED if i % 2 else Colour.BLUE)
+            keys.add(b.hash())
+        self.assertEqual(len(keys), 1)
+
+    def test_agent_copy_has_the_same_keys(self):
+        path = join(
+            dirname(dirname(realpath(__file__))),
+            "agents", "Group014", "src14", "Zobrist.py"
+        )
+        spec = importlib.util.spec_from_file_location("src14_zobrist", path)
+        copy = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(copy)
+
+        for n in (1, 5, 11):
+            engine, agent = zobrist_table(n), copy.zobrist_table(n)
+            self.assertEqual(engine.red, agent.red)
+            self.assertEqual(engine.blue, agent.blue)
+            self.assertEqual(engine.swap, agent.swap)
+
+
+if (__name__ == "__main__"):
+    unittest.main()
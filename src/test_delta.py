@@ -0,0 +1,177 @@
+"""Tests for the delta mode handshake of Game, played against scripted
+agents instead of sockets.
+
+Run from the repository root with: python -m unittest discover -s src
+"""
+import unittest
+
+from Board import Board
+from Colour import Colour
+from Game import Game
+
+
+class ScriptedProtocol():
+    """Stands in for Protocol: each agent answers from a list of messages,
+    and everything sent to it is kept.
+    """
+
+    def __init__(self, port=None, listener=None, max_length=None):
+        self.answers = {'first': [], 'second': []}
+        self.sent = {'first': [], 'second': []}
+        self._agents = {Colour.RED: 'first', Colour.BLUE: 'second'}
+
+    def start(self):
+        pass
+
+    def accept_connection(self, *args):
+        return True
+
+    def send_message(self, colour, message, verbose=False):
+        self.sent[self._agents[colour]].append(message)
+
+    def get_message(self, colour, timeout_ns=0, verbose=False):
+        answers = self.answers[self._agents[colour]]
+        if (not answers):
+            return ("NO MESSAGE", -1)
+        return (answers.pop(0) + "\n", 1000)
+
+    def swap(self):
+        self._agents[Colour.RED], self._agents[Colour.BLUE] = (
+            self._agents[Colour.BLUE], self._agents[Colour.RED]
+        )
+
+    def close(self, kill_children=True, verbose=False):
+        pass
+
+
+class ScriptedGame(Game):
+    PROTOCOL = ScriptedProtocol
+
+
+def play(first, second, **kwargs):
+    """Plays a 3x3 game in which the two agents answer with the given
+    messages. Returns the game and the messages each agent received.
+    """
+
+    g = ScriptedGame(
+        board_size=3,
+        player1={'name': "first", 'run string': None},
+        player2={'name': "second", 'run string': None},
+        log=False,
+        print_summary=False,
+        **kwargs
+    )
+    g._protocol.answers = {'first': list(first), 'second': list(second)}
+    g.run()
+    return g, g._protocol.sent
+
+
+def changes(messages):
+    """Returns the board field of every CHANGE message."""
+
+    return [m.split(";")[2] for m in messages if m.startswith("CHANGE")]
+
+
+def boards(moves):
+    """Replays the moves, Red first, on an engine board. Returns the
+    board string and the checksum after each move.
+    """
+
+    b = Board(3)
+    colour = Colour.RED
+    states = []
+    for x, y in moves:
+        b.set_tile_colour(x, y, colour)
+        colour = colour.opposite()
+        states.append((b.print_board(), b.checksum()))
+    return states
+
+
+# Red wins down the first column; Blue plays along the top row
+RED = ["0,0", "1,0", "2,0"]
+BLUE = ["0,1", "0,2"]
+MOVES = [(0, 0), (0, 1), (1, 0), (0, 2), (2, 0)]
+
+
+class TestDeltaHandshake(unittest.TestCase):
+
+    def test_offer_only_in_delta_mode(self):
+        _, sent = play(RED, BLUE)
+        self.assertEqual(sent['first'][0], "START;3;R\n")
+
+        _, sent = play(RED, BLUE, delta=True)
+        self.assertEqual(sent['first'][0], "START;3;R;DELTA\n")
+        self.assertEqual(sent['second'][0], "START;3;B;DELTA\n")
+
+    def test_only_accepting_agent_gets_checksums(self):
+        g, sent = play(["DELTA"] + RED, BLUE, delta=True)
+        states = boards(MOVES)
+
+        self.assertEqual(g._summary.split("\n")[0], "Win")
+        self.assertEqual(
+            changes(sent['first']),
+            [f"{t}:{c}" for t, (_, c) in enumerate(states, 1)]
+        )
+        self.assertEqual(changes(sent['second']), [b for b, _ in states])
+
+    def test_acceptance_of_second_agent(self):
+        g, sent = play(RED, ["DELTA"] + BLUE, delta=True)
+        states = boards(MOVES)
+
+        self.assertEqual(g._summary.split("\n")[0], "Win")
+        # the acceptance is read on its first turn, after the first CHANGE
+        self.assertEqual(
+            changes(sent['second']),
+            [states[0][0]] +
+            [f"{t}:{c}" for t, (_, c) in enumerate(states[1:], 2)]
+        )
+
+    def test_acceptance_after_first_move_is_illegal(self):
+        g, sent = play(["0,0", "DELTA"], BLUE, delta=True)
+
+        self.assertEqual(g._summary.split("\n")[0], "Illegal move")
+        self.assertTrue(all(":" not in c for c in changes(sent['first'])))
+
+    def test_acceptance_without_offer_is_illegal(self):
+        g, _ = play(["DELTA"] + RED, BLUE)
+
+        self.assertEqual(g._summary.split("\n")[0], "Illegal move")
+
+    def test_board_request(self):
+        first = ["DELTA", "0,0", "BOARD", "BOARD", "1,0", "2,0"]
+        g, sent = play(first, BLUE, delta=True)
+        board, checksum = boards(MOVES[:2])[-1]
+
+        self.assertEqual(g._summary.split("\n")[0], "Win")
+        self.assertEqual(
+            [m for m in sent['first'] if m.startswith("BOARD")],
+            [f"BOARD;{board};2:{checksum}\n"] * 2
+        )
+        # every answer takes 1000ns and requests count as part of the move
+        self.assertEqual(g._players[Colour.RED]['time'], 6 * 1000)
+
+    def test_resync_turns_carry_the_board(self):
+        _, sent = play(["DELTA"] + RED, BLUE, delta=True, resync=2)
+        states = boards(MOVES)
+
+        self.assertEqual(
+            changes(sent['first']),
+            [
+                b if t % 2 == 0 else f"{t}:{c}"
+                for t, (b, c) in enumerate(states, 1)
+            ]
+        )
+
+    def test_acceptance_moves_with_the_agent_on_a_swap(self):
+        # the first agent accepts, is swapped and then plays Blue
+        g, sent = play(["DELTA", "1,1", "0,1"], ["SWAP", "0,0", "2,2"],
+                       delta=True)
+
+        self.assertTrue(g._players[Colour.BLUE]['delta'])
+        self.assertFalse(g._players[Colour.RED]['delta'])
+        self.assertTrue(all(":" in c for c in changes(sent['first'])))
+        self.assertTrue(all(":" not in c for c in changes(sent['second'])))
+
+
+if (__name__ == "__main__"):
+    unittest.main()